@@ -0,0 +1,41 @@
+from __future__ import print_function
+
+import sys
+import timeit
+
+from secureconfig.cryptkeeper import CryptKeeper
+
+# Micro-benchmarks of the str-based CryptKeeper API against the bytes-native
+# one (encrypt_bytes / decrypt_bytes / decrypt_into) for small secrets and
+# large blobs.
+#
+# usage: python benchmarks/bench_bytes_api.py [blob_mb]
+
+TEST_KEYSTRING = 'sFbO-GbipIFIpj64S2_AZBIPBvX80Yozszw7PR2dVFg='
+
+
+def report(label, func, number, nbytes):
+    best = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print('  %-28s %10.2f us  %8.1f MB/s' % (label, best * 1e6, nbytes / best / 1e6))
+
+
+def main(blob_mb=10):
+    ck = CryptKeeper(key=TEST_KEYSTRING)
+
+    for label, size, number in [('small secret (32 B)', 32, 2000), ('large blob (%d MB)' % blob_mb, blob_mb * 2 ** 20, 3)]:
+        text = 'x' * size
+        data = text.encode()
+        token = ck.encrypt(text)
+        token_bytes = token.encode()
+        out = bytearray(size + 16)
+
+        print(label)
+        report('encrypt(str)', lambda: ck.encrypt(text), number, size)
+        report('encrypt_bytes(bytes)', lambda: ck.encrypt_bytes(data), number, size)
+        report('decrypt(str)', lambda: ck.decrypt(token), number, size)
+        report('decrypt_bytes(bytes)', lambda: ck.decrypt_bytes(token_bytes), number, size)
+        report('decrypt_into(bytes, buf)', lambda: ck.decrypt_into(token_bytes, out), number, size)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,43 @@
+from __future__ import print_function
+
+import sys
+import timeit
+
+from secureconfig.cryptkeeper import CryptKeeper
+
+# Throughput and size overhead of each cipher backend: Fernet against the AEAD
+# backends (AES-256-GCM, ChaCha20-Poly1305), as base64 text tokens and as binary
+# envelopes, for small secrets and large blobs.
+#
+# usage: python benchmarks/bench_ciphers.py [blob_mb]
+
+TEST_KEYSTRING = 'sFbO-GbipIFIpj64S2_AZBIPBvX80Yozszw7PR2dVFg='
+CIPHERS = ['FERNET', 'AESGCM', 'CHACHA20']
+
+
+def best(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def report(label, enc, dec, size, out_size):
+    print('  %-20s encrypt %9.1f MB/s   decrypt %9.1f MB/s   size +%d B' % (
+        label, size / enc / 1e6, size / dec / 1e6, out_size - size))
+
+
+def main(blob_mb=10):
+    for label, size, number in [('small secret (32 B)', 32, 2000), ('large blob (%d MB)' % blob_mb, blob_mb * 2 ** 20, 3)]:
+        data = b'x' * size
+        print(label)
+        for cipher in CIPHERS:
+            ck = CryptKeeper(key=TEST_KEYSTRING, cipher=cipher)
+            token = ck.encrypt_bytes(data)
+            report('%s token' % cipher, best(lambda: ck.encrypt_bytes(data), number),
+                   best(lambda: ck.decrypt_bytes(token, cipher), number), size, len(token))
+            if cipher != 'FERNET':
+                blob = ck.encrypt_envelope(data)
+                report('%s envelope' % cipher, best(lambda: ck.encrypt_envelope(data), number),
+                       best(lambda: ck.decrypt_envelope(blob), number), size, len(blob))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,53 @@
+from __future__ import print_function
+
+import io
+import sys
+import timeit
+
+from secureconfig import SecureJson
+from secureconfig.cryptkeeper import CryptKeeper
+
+# Size of the written token, and time to write (serialize, compress, encrypt)
+# and load (decrypt, decompress, parse) a SecureJson config, for each
+# compression method against none.
+#
+# usage: python benchmarks/bench_compression.py [num_options ...]
+
+TEST_KEYSTRING = 'sFbO-GbipIFIpj64S2_AZBIPBvX80Yozszw7PR2dVFg='
+
+
+def make_cfg(num_options):
+    cfg = {}
+    for i in range(num_options):
+        cfg.setdefault('section%d' % (i // 100), {})['option%d' % i] = 'value-%d-%s' % (i, 'x' * 16)
+    return cfg
+
+
+def measure(func, min_time=0.5):
+    timer = timeit.Timer(func)
+    number = timer.autorange()[0]
+    rounds = max(3, int(min_time / (timer.timeit(number) / number) / number) or 1)
+    return min(timer.repeat(repeat=min(rounds, 20), number=number)) / number
+
+
+def main(sizes=(100, 10000, 100000)):
+    ck = CryptKeeper(key=TEST_KEYSTRING)
+    for num_options in sizes:
+        cfg = make_cfg(num_options)
+        print('%d options:' % num_options)
+        for method in (None, 'zlib', 'lzma', 'zstd'):
+            sj = SecureJson(ck=ck, compress=method)
+            sj.cfg = cfg
+            try:
+                token = sj._encrypt_changed()
+            except ImportError as exc:
+                print('  %-5s skipped (%s)' % (method, exc))
+                continue
+            write = measure(lambda: (sj._dirty.add(None), sj.write(io.StringIO())))
+            load = measure(lambda: SecureJson(rawtxt=token, ck=ck))
+            print('  %-5s %10d bytes   write %8.2f ms   load %8.2f ms' % (
+                method or 'none', len(token), write * 1e3, load * 1e3))
+
+
+if __name__ == '__main__':
+    main(*[[int(arg) for arg in sys.argv[1:]]] if sys.argv[1:] else [])
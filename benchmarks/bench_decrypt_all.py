@@ -0,0 +1,51 @@
+from __future__ import print_function
+
+import sys
+import timeit
+
+from secureconfig import SecureConfigParser
+from secureconfig.cryptkeeper import CryptKeeper
+
+# Compares SecureConfigParser.decrypt_all() against looping over .get()
+# for a synthetic config with many encrypted options.
+#
+# usage: python benchmarks/bench_decrypt_all.py [num_sections] [options_per_section]
+
+TEST_KEYSTRING = 'sFbO-GbipIFIpj64S2_AZBIPBvX80Yozszw7PR2dVFg='
+
+
+def build_config(ck, num_sections, num_options):
+    scfg = SecureConfigParser(ck=ck)
+    for s in range(num_sections):
+        sec = 'section%d' % s
+        scfg.add_section(sec)
+        for o in range(num_options):
+            if o % 2:
+                scfg.raw_set(sec, 'plain%d' % o, 'value%d' % o)
+            else:
+                scfg.raw_set(sec, 'secret%d' % o, ck.sigil + ck.encrypt('password%d' % o))
+    return scfg
+
+
+def loop_get(scfg):
+    snapshot = {}
+    for sec in scfg.sections():
+        snapshot[sec] = dict((key, scfg.get(sec, key)) for key in scfg.options(sec))
+    return snapshot
+
+
+def main(num_sections=10, num_options=100, repeat=5):
+    ck = CryptKeeper(key=TEST_KEYSTRING)
+    scfg = build_config(ck, num_sections, num_options)
+    assert loop_get(scfg) == scfg.decrypt_all()
+
+    total = num_sections * num_options
+    print('%d sections x %d options (%d values, half encrypted)' % (num_sections, num_options, total))
+    for name, func in [('loop over get()', lambda: loop_get(scfg)),
+                       ('decrypt_all()', scfg.decrypt_all)]:
+        best = min(timeit.repeat(func, number=1, repeat=repeat))
+        print('%-18s %8.2f ms  (%.1f us/value)' % (name, best * 1000, best * 1e6 / total))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,75 @@
+from __future__ import print_function
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# Import time of the secureconfig package, measured with `python -X importtime`
+# in fresh interpreters (median of several runs), plus a check that plain
+# imports don't drag in the heavy modules that are meant to load lazily.
+#
+# usage: python benchmarks/bench_import.py [--runs N] [--max-ms MS]
+#
+# Exits non-zero if a statement is slower than --max-ms or imports one of the
+# modules listed in MUST_NOT_IMPORT, so it can guard against regressions in CI.
+
+STATEMENTS = [
+    'import secureconfig',
+    'from secureconfig import SecureJson',
+    'from secureconfig import SecureConfig',
+    'from secureconfig import SecureConfigParser',
+    'from secureconfig.cryptkeeper import CryptKeeper',
+]
+
+# none of these may be imported by the statements above.
+MUST_NOT_IMPORT = ['cryptography.fernet', 'asyncio', 'concurrent.futures.process', 'multiprocessing',
+                   'secureconfig.zeromem']
+
+_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+
+def measure(statement):
+    """returns (cumulative microseconds of top-level imports, set of modules imported)."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                          env=env, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    total, modules = 0, set()
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        modules.add(match.group(4))
+        if match.group(3) == ' ':   # top level, i.e. not a nested import
+            total += int(match.group(2))
+    return total, modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='secureconfig import-time benchmark')
+    parser.add_argument('--runs', type=int, default=7, help='interpreters to start per statement')
+    parser.add_argument('--max-ms', type=float, help='fail if any statement takes longer than this')
+    args = parser.parse_args(argv)
+
+    # the interpreter's own startup imports (site etc.) are not our business.
+    baseline = statistics.median(measure('pass')[0] for _ in range(args.runs))
+
+    failures = 0
+    for statement in STATEMENTS:
+        runs = [measure(statement) for _ in range(args.runs)]
+        ms = (statistics.median(total for total, _ in runs) - baseline) / 1e3
+        unwanted = sorted(set(MUST_NOT_IMPORT) & runs[0][1])
+        flag = ''
+        if unwanted:
+            flag += '  IMPORTS %s' % ', '.join(unwanted)
+        if args.max_ms is not None and ms > args.max_ms:
+            flag += '  SLOW'
+        failures += bool(flag)
+        print('%-50s %8.1f ms%s' % (statement, ms, flag))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+from __future__ import print_function
+
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from secureconfig import SecureJson
+from secureconfig.cryptkeeper import CryptKeeper
+
+# Peak RSS of loading one large encrypted SecureJson file, with and without
+# use_mmap=True.  Each load runs in a fresh subprocess so that ru_maxrss
+# reflects that load alone.
+#
+# usage: python benchmarks/bench_mmap_load.py [size_mb]
+
+TEST_KEYSTRING = 'sFbO-GbipIFIpj64S2_AZBIPBvX80Yozszw7PR2dVFg='
+
+
+def make_file(path, size_mb):
+    ck = CryptKeeper(key=TEST_KEYSTRING)
+    value = 'x' * 1000
+    cfg = dict(('tenant%d' % i, {'secret': value}) for i in range(size_mb * 1000))
+    with open(path, 'w') as fh:
+        fh.write(ck.encrypt(json.dumps(cfg)))
+
+
+def load(path, use_mmap):
+    ck = CryptKeeper(key=TEST_KEYSTRING)
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    SecureJson(filepath=path, ck=ck, use_mmap=use_mmap)
+    elapsed = time.time() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'use_mmap': use_mmap, 'seconds': elapsed, 'peak_rss_kb': peak, 'delta_rss_kb': peak - base}))
+
+
+def main(size_mb=50):
+    fd, path = tempfile.mkstemp(suffix='.json.enc')
+    os.close(fd)
+    try:
+        # build the file in a subprocess too: ru_maxrss survives fork/exec.
+        subprocess.check_call([sys.executable, __file__, '--make', path, str(size_mb)])
+        print('%.1f MB encrypted file' % (os.path.getsize(path) / 1e6))
+        for use_mmap in (False, True):
+            out = subprocess.check_output([sys.executable, __file__, '--load', path, str(int(use_mmap))])
+            result = json.loads(out)
+            print('use_mmap=%-5s %6.2f s  peak RSS %7.1f MB  (+%.1f MB during load)' % (
+                use_mmap, result['seconds'], result['peak_rss_kb'] / 1024., result['delta_rss_kb'] / 1024.))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--load']:
+        load(sys.argv[2], bool(int(sys.argv[3])))
+    elif sys.argv[1:2] == ['--make']:
+        make_file(sys.argv[2], int(sys.argv[3]))
+    else:
+        main(*[int(arg) for arg in sys.argv[1:2]])
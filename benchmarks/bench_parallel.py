@@ -0,0 +1,41 @@
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+
+from secureconfig.cryptkeeper import CryptKeeper
+from secureconfig.parallel import decrypt_tokens
+
+# Scaling benchmark for parallel decryption across worker counts, for both
+# thread and process pools.
+#
+# usage: python benchmarks/bench_parallel.py [num_tokens] [value_size]
+
+TEST_KEYSTRING = 'sFbO-GbipIFIpj64S2_AZBIPBvX80Yozszw7PR2dVFg='
+
+
+def worker_counts():
+    counts = [1]
+    while counts[-1] * 2 <= (os.cpu_count() or 1):
+        counts.append(counts[-1] * 2)
+    return counts
+
+
+def main(num_tokens=20000, value_size=64, repeat=3):
+    ck = CryptKeeper(key=TEST_KEYSTRING)
+    tokens = [ck.encrypt('x' * value_size) for _ in range(num_tokens)]
+
+    print('%d tokens of %d plaintext bytes, %s cpus' % (num_tokens, value_size, os.cpu_count()))
+    for processes in (False, True):
+        baseline = None
+        for workers in worker_counts():
+            best = min(timeit.repeat(lambda: decrypt_tokens(ck, tokens, workers, processes),
+                                     number=1, repeat=repeat))
+            baseline = baseline or best
+            print('%-9s workers=%-3d %8.2f ms  speedup %.2fx' % (
+                'processes' if processes else 'threads', workers, best * 1000, baseline / best))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,62 @@
+from __future__ import print_function
+
+import builtins
+import os
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+
+from secureconfig import SecureConfigParser
+from secureconfig.cryptkeeper import CryptKeeper
+
+# SecureConfigParser.read of a stack of layered config files, serially and on
+# thread pools of several sizes.  To stand in for a network filesystem, every
+# open() of one of the files first sleeps for latency_ms.
+#
+# usage: python benchmarks/bench_parallel_read.py [num_files] [latency_ms] [options_per_file]
+
+TEST_KEYSTRING = 'sFbO-GbipIFIpj64S2_AZBIPBvX80Yozszw7PR2dVFg='
+
+
+def make_files(tmpdir, ck, num_files, num_options):
+    paths = []
+    for num in range(num_files):
+        path = os.path.join(tmpdir, 'layer%03d.ini' % num)
+        with open(path, 'w') as fh:
+            fh.write('[layer%d]\n' % num)
+            for opt in range(num_options):
+                fh.write('option%d = %s\n' % (opt, ck.sigil + ck.encrypt('value %d' % opt) if opt % 2 else 'x' * 32))
+        paths.append(path)
+    return paths
+
+
+def main(num_files=48, latency_ms=5, num_options=200):
+    ck = CryptKeeper(key=TEST_KEYSTRING)
+    tmpdir = tempfile.mkdtemp()
+    real_open = builtins.open
+
+    def slow_open(file, *args, **kwargs):
+        if isinstance(file, str) and file.startswith(tmpdir):
+            time.sleep(latency_ms / 1000.)
+        return real_open(file, *args, **kwargs)
+
+    try:
+        paths = make_files(tmpdir, ck, num_files, num_options)
+        builtins.open = slow_open
+        print('%d files of %d options, %d ms latency per open, %s cpus' % (
+            num_files, num_options, latency_ms, os.cpu_count()))
+        baseline = None
+        for workers in (None, 2, 4, 8, 16):
+            best = min(timeit.repeat(lambda: SecureConfigParser(ck=ck).read(paths, workers=workers),
+                                     number=1, repeat=3))
+            baseline = baseline or best
+            print('workers=%-4s %8.2f ms  speedup %.2fx' % (workers or '-', best * 1000, baseline / best))
+    finally:
+        builtins.open = real_open
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:4]])
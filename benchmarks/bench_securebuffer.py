@@ -0,0 +1,38 @@
+from __future__ import print_function
+
+import sys
+import timeit
+
+from secureconfig import SecureBuffer, SecureString
+from secureconfig.cryptkeeper import CryptKeeper
+
+# Time to decrypt a short secret and then burn it: as a plain str, as a
+# SecureString, and into a SecureBuffer (whose slots are reused from the pool).
+#
+# usage: python benchmarks/bench_securebuffer.py [number]
+
+TEST_KEYSTRING = 'sFbO-GbipIFIpj64S2_AZBIPBvX80Yozszw7PR2dVFg='
+
+
+def main(number=20000):
+    for cipher in ('FERNET', 'AESGCM'):
+        ck = CryptKeeper(key=TEST_KEYSTRING, cipher=cipher)
+        token = ck.encrypt('lame_password')
+
+        def securestring():
+            SecureString(ck.decrypt(token)).burn()
+
+        def securebuffer():
+            with SecureBuffer() as secret:
+                ck.decrypt_into(token, secret)
+
+        print('%s:' % cipher)
+        for name, func in (('str', lambda: ck.decrypt(token)),
+                           ('SecureString', securestring),
+                           ('SecureBuffer', securebuffer)):
+            best = min(timeit.repeat(func, number=number, repeat=5))
+            print('  %-13s %8.2f us' % (name, best / number * 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
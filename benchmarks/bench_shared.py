@@ -0,0 +1,83 @@
+from __future__ import print_function
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+from secureconfig import SecureJson
+from secureconfig.cryptkeeper import CryptKeeper
+from secureconfig.shared import SharedConfig
+
+# Pre-fork workers each loading the same encrypted SecureJson file, against
+# workers attaching to a SharedConfig the master decrypted once.  Reports each
+# worker's load CPU time and private memory (Private_Clean + Private_Dirty from
+# /proc/self/smaps_rollup, so Linux only) after reading every value.
+#
+# usage: python benchmarks/bench_shared.py [workers] [size_mb]
+
+TEST_KEYSTRING = 'sFbO-GbipIFIpj64S2_AZBIPBvX80Yozszw7PR2dVFg='
+
+
+def private_kb():
+    total = 0
+    with open('/proc/self/smaps_rollup') as fh:
+        for line in fh:
+            if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                total += int(line.split()[1])
+    return total
+
+
+def worker(load, write_fd):
+    base = private_kb()
+    start = time.process_time()
+    config = load()
+    for section in config.sections():
+        config.get(section, 'secret')
+    elapsed = time.process_time() - start
+    os.write(write_fd, ('%f %d\n' % (elapsed, private_kb() - base)).encode())
+
+
+def run(label, load, workers):
+    read_fd, write_fd = os.pipe()
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                worker(load, write_fd)
+            finally:
+                os._exit(0)
+        pids.append(pid)
+    os.close(write_fd)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    with os.fdopen(read_fd) as fh:
+        results = [line.split() for line in fh]
+    seconds = sum(float(s) for s, _ in results) / workers
+    private = sum(int(kb) for _, kb in results)
+    print('%-10s %8.1f ms CPU per worker   %8.1f MB private across %d workers' % (
+        label, seconds * 1e3, private / 1024., workers))
+
+
+def main(workers=8, size_mb=10):
+    ck = CryptKeeper(key=TEST_KEYSTRING)
+    cfg = dict(('tenant%d' % i, {'secret': 'x' * 1000}) for i in range(size_mb * 1000))
+    fd, path = tempfile.mkstemp(suffix='.json.enc')
+    with os.fdopen(fd, 'w') as fh:
+        fh.write(ck.encrypt(json.dumps(cfg)))
+    del cfg
+    try:
+        run('per-worker', lambda: SecureJson(filepath=path, ck=ck), workers)
+        start = time.perf_counter()
+        shared = SharedConfig.from_config(SecureJson(filepath=path, ck=ck))
+        print('(master: shared %.1f MB in %.1f ms)' % (shared.size / 1e6, (time.perf_counter() - start) * 1e3))
+        run('shared', shared.view, workers)
+        shared.close()
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,336 @@
+from __future__ import print_function
+
+import argparse
+import io
+import itertools
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import cryptography
+
+from secureconfig import SecureConfig, SecureConfigParser, SecureJson
+from secureconfig._version import __version__
+from secureconfig.cryptkeeper import CryptKeeper, EnvCryptKeeper, FileCryptKeeper
+
+# Benchmark suite covering every load, get, set and write path.
+#
+# Each benchmark is a function taking (tmpdir, param) which does its setup
+# and returns the callable to be timed.  Results are printed as a table and
+# can be written as JSON for tracking regressions across versions:
+#
+#   python benchmarks/suite.py --json results.json
+#   python benchmarks/suite.py --quick --filter scp_
+#   python benchmarks/suite.py --compare results.json   # flag regressions
+#
+# Parameters: blob benchmarks run from 1 KB to 100 MB, config benchmarks from
+# 10 to 100k options (100 options per section).  --quick caps both.
+
+TEST_KEYSTRING = 'sFbO-GbipIFIpj64S2_AZBIPBvX80Yozszw7PR2dVFg='
+
+KB = 1024
+MB = 1024 * KB
+
+BLOB_SIZES = [1 * KB, 64 * KB, 1 * MB, 10 * MB, 100 * MB]
+OPTION_COUNTS = [10, 1000, 10000, 100000]
+QUICK_BLOB_MAX = 1 * MB
+QUICK_OPTIONS_MAX = 1000
+
+BENCHMARKS = []
+
+
+def benchmark(params=(None, ), kind=None):
+    """registers func(tmpdir, param) -> callable as a benchmark."""
+    def register(func):
+        BENCHMARKS.append((func.__name__, func, list(params), kind))
+        return func
+    return register
+
+
+def _ck():
+    return CryptKeeper(key=TEST_KEYSTRING)
+
+
+def _cfg_dict(num_options):
+    cfg = {}
+    for i in range(num_options):
+        cfg.setdefault('section%d' % (i // 100), {})['option%d' % i] = 'value-%d-%s' % (i, 'x' * 16)
+    return cfg
+
+
+def _write_text(path, txt):
+    with open(path, 'w') as fh:
+        fh.write(txt)
+    return path
+
+
+def _scp(num_options, encrypted=True):
+    ck = _ck()
+    scfg = SecureConfigParser(ck=ck)
+    for sec, options in _cfg_dict(num_options).items():
+        scfg.add_section(sec)
+        for key, val in options.items():
+            if encrypted and int(key[6:]) % 2 == 0:
+                val = ck.sigil + ck.encrypt(val)
+            scfg.raw_set(sec, key, val)
+    return scfg
+
+
+def _scp_file(tmpdir, num_options):
+    path = os.path.join(tmpdir, 'scp_%d.ini' % num_options)
+    if not os.path.exists(path):
+        with open(path, 'w') as fh:
+            _scp(num_options).write(fh)
+    return path
+
+
+# CryptKeeper
+
+
+@benchmark(BLOB_SIZES, kind='blob')
+def ck_encrypt(tmpdir, size):
+    ck, data = _ck(), b'x' * size
+    return lambda: ck.encrypt_bytes(data)
+
+
+@benchmark(BLOB_SIZES, kind='blob')
+def ck_decrypt(tmpdir, size):
+    ck = _ck()
+    token = ck.encrypt_bytes(b'x' * size)
+    return lambda: ck.decrypt_bytes(token)
+
+
+@benchmark(BLOB_SIZES, kind='blob')
+def ck_decrypt_str(tmpdir, size):
+    ck = _ck()
+    token = ck.encrypt('x' * size)
+    return lambda: ck.decrypt(token)
+
+
+@benchmark()
+def ck_construct_key(tmpdir, _):
+    return lambda: CryptKeeper(key=TEST_KEYSTRING)
+
+
+@benchmark()
+def ck_construct_file(tmpdir, _):
+    path = _write_text(os.path.join(tmpdir, 'bench_key'), TEST_KEYSTRING)
+    return lambda: FileCryptKeeper(path)
+
+
+@benchmark()
+def ck_construct_env(tmpdir, _):
+    os.environ['SECURECONFIG_BENCH_KEY'] = TEST_KEYSTRING
+    return lambda: EnvCryptKeeper('SECURECONFIG_BENCH_KEY')
+
+
+# SecureJson / SecureConfig
+
+
+@benchmark(OPTION_COUNTS, kind='options')
+def securejson_load(tmpdir, num_options):
+    ck = _ck()
+    path = _write_text(os.path.join(tmpdir, 'sj_%d.enc' % num_options), ck.encrypt(json.dumps(_cfg_dict(num_options))))
+    return lambda: SecureJson(filepath=path, ck=ck)
+
+
+@benchmark(OPTION_COUNTS, kind='options')
+def securejson_load_snapshot(tmpdir, num_options):
+    ck = _ck()
+    path = _write_text(os.path.join(tmpdir, 'sj_snap_%d.enc' % num_options), ck.encrypt(json.dumps(_cfg_dict(num_options))))
+    return lambda: SecureJson(filepath=path, ck=ck, snapshot=True)
+
+
+@benchmark(OPTION_COUNTS, kind='options')
+def securejson_write(tmpdir, num_options):
+    sj = SecureJson(ck=_ck())
+    sj.cfg = _cfg_dict(num_options)
+    # mark as changed so every write re-encrypts, as a first write would.
+    return lambda: (sj._dirty.add(None), sj.write(io.StringIO()))
+
+
+@benchmark(OPTION_COUNTS, kind='options')
+def secureconfig_load(tmpdir, num_options):
+    ck = _ck()
+    path = _write_text(os.path.join(tmpdir, 'sc_%d.enc' % num_options), ck.encrypt('%r' % _cfg_dict(num_options)))
+    return lambda: SecureConfig(filepath=path, ck=ck)
+
+
+def _secureconfig_load_as(tmpdir, num_options, serializer):
+    ck = _ck()
+    sc = SecureConfig(ck=ck, serializer=serializer)
+    sc.cfg = _cfg_dict(num_options)
+    path = _write_text(os.path.join(tmpdir, 'sc_%s_%d.enc' % (serializer, num_options)), sc._encrypt_changed())
+    return lambda: SecureConfig(filepath=path, ck=ck)
+
+
+@benchmark(OPTION_COUNTS, kind='options')
+def secureconfig_load_json(tmpdir, num_options):
+    return _secureconfig_load_as(tmpdir, num_options, 'json')
+
+
+@benchmark(OPTION_COUNTS, kind='options')
+def secureconfig_load_binary(tmpdir, num_options):
+    return _secureconfig_load_as(tmpdir, num_options, 'binary')
+
+
+@benchmark(OPTION_COUNTS, kind='options')
+def secureconfig_write(tmpdir, num_options):
+    sc = SecureConfig(ck=_ck())
+    sc.cfg = _cfg_dict(num_options)
+    return lambda: (sc._dirty.add(None), sc.write(io.StringIO()))
+
+
+# SecureConfigParser (half of all values encrypted)
+
+
+@benchmark(OPTION_COUNTS, kind='options')
+def scp_read(tmpdir, num_options):
+    path, ck = _scp_file(tmpdir, num_options), _ck()
+    return lambda: SecureConfigParser(ck=ck).read(path)
+
+
+@benchmark(OPTION_COUNTS, kind='options')
+def scp_read_snapshot(tmpdir, num_options):
+    path, ck = _scp_file(tmpdir, num_options), _ck()
+    return lambda: SecureConfigParser(ck=ck, snapshot=True).read(path)
+
+
+@benchmark(OPTION_COUNTS, kind='options')
+def scp_get(tmpdir, num_options):
+    scfg = _scp(num_options)
+    keys = [(sec, key) for sec in scfg.sections() for key in scfg.options(sec)]
+    return lambda: [scfg.get(sec, key) for (sec, key) in keys]
+
+
+@benchmark(OPTION_COUNTS, kind='options')
+def scp_items(tmpdir, num_options):
+    scfg = _scp(num_options)
+    return lambda: [list(scfg.items(sec)) for sec in scfg.sections()]
+
+
+@benchmark(OPTION_COUNTS, kind='options')
+def scp_decrypt_all(tmpdir, num_options):
+    scfg = _scp(num_options)
+    return scfg.decrypt_all
+
+
+@benchmark(OPTION_COUNTS, kind='options')
+def scp_set(tmpdir, num_options):
+    scfg = _scp(num_options, encrypted=False)
+    keys = [(sec, key) for sec in scfg.sections() for key in scfg.options(sec)]
+    rounds = itertools.count()
+
+    def target():
+        # a new value every round, or set() would keep the existing ciphertext.
+        val = 'new value %d' % next(rounds)
+        return [scfg.set(sec, key, val, encrypt=True) for (sec, key) in keys]
+    return target
+
+
+@benchmark(OPTION_COUNTS, kind='options')
+def scp_set_many(tmpdir, num_options):
+    scfg = _scp(num_options, encrypted=False)
+    keys = [(sec, key) for sec in scfg.sections() for key in scfg.options(sec)]
+    rounds = itertools.count()
+
+    def target():
+        val = 'new value %d' % next(rounds)
+        return scfg.set_many([(sec, key, val) for (sec, key) in keys], encrypt=True)
+    return target
+
+
+@benchmark(OPTION_COUNTS, kind='options')
+def scp_write(tmpdir, num_options):
+    scfg = _scp(num_options)
+    return lambda: scfg.write(io.StringIO())
+
+
+def run(func, tmpdir, param, repeat, min_time):
+    """times func's callable; returns a dict of timing stats in seconds."""
+    target = func(tmpdir, param)
+    target()   # warm up (and make sure it works)
+
+    times = []
+    start = time.perf_counter()
+    while len(times) < repeat or (time.perf_counter() - start < min_time and len(times) < 1000):
+        t0 = time.perf_counter()
+        target()
+        times.append(time.perf_counter() - t0)
+    return {'min': min(times), 'median': statistics.median(times), 'mean': statistics.mean(times),
+            'stdev': statistics.stdev(times) if len(times) > 1 else 0.0, 'rounds': len(times)}
+
+
+def machine_info():
+    return {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+            'platform': platform.platform(), 'machine': platform.machine(), 'cpus': os.cpu_count(),
+            'cryptography': cryptography.__version__, 'secureconfig': __version__}
+
+
+def compare(results, baseline_path, threshold):
+    """prints min-time ratios against a previous --json run; returns the number of
+    benchmarks slower than threshold."""
+    with open(baseline_path) as fh:
+        baseline = dict(((r['name'], r['param']), r) for r in json.load(fh)['results'])
+    regressions = 0
+    print('\ncompared to %s:' % baseline_path)
+    for result in results:
+        old = baseline.get((result['name'], result['param']))
+        if old is None:
+            continue
+        ratio = result['min'] / old['min']
+        flag = ''
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print('%-20s %-10s %6.2fx%s' % (result['name'], '' if result['param'] is None else result['param'], ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='secureconfig benchmark suite')
+    parser.add_argument('--json', help='write results to this file as JSON')
+    parser.add_argument('--filter', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('--quick', action='store_true', help='cap blob and config sizes for a fast run')
+    parser.add_argument('--repeat', type=int, default=3, help='minimum rounds per benchmark')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum seconds per benchmark')
+    parser.add_argument('--compare', help='previous --json results to compare against')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='slowdown ratio reported as a regression by --compare (default: 1.2)')
+    args = parser.parse_args(argv)
+
+    results = []
+    tmpdir = tempfile.mkdtemp(prefix='secureconfig-bench-')
+    try:
+        for name, func, params, kind in BENCHMARKS:
+            if args.filter not in name:
+                continue
+            for param in params:
+                if args.quick and ((kind == 'blob' and param > QUICK_BLOB_MAX) or
+                                   (kind == 'options' and param > QUICK_OPTIONS_MAX)):
+                    continue
+                stats = run(func, tmpdir, param, args.repeat, args.min_time)
+                stats.update(name=name, param=param, kind=kind)
+                results.append(stats)
+                print('%-20s %-10s %12.3f ms  (median %.3f ms, %d rounds)' % (
+                    name, '' if param is None else param, stats['min'] * 1e3, stats['median'] * 1e3, stats['rounds']))
+                sys.stdout.flush()
+    finally:
+        shutil.rmtree(tmpdir)
+
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump({'machine': machine_info(), 'unit': 'seconds', 'results': results}, fh, indent=2)
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
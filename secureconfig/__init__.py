@@ -5,9 +5,30 @@ __path__ = extend_path(__path__, __name__)
 
 __author__ = 'nthmost'
 
-from .baseclass import SecureConfig
-from .securestring import SecureString
-from .zeromem import zeromem
-from .secureconfigparser import SecureConfigParser
-from .securejson import SecureJson
-from .exceptions import ReadOnlyConfigError, SecureConfigException
+# Top-level names are imported on first use (PEP 562), so that e.g. a script
+# only needing SecureJson doesn't also pay for configparser, the zeromem
+# extension and everything else at import time.
+_lazy = {
+    'SecureConfig': 'baseclass',
+    'SecureString': 'securestring',
+    'SecureBuffer': 'securebuffer',
+    'zeromem': 'zeromem',
+    'SecureConfigParser': 'secureconfigparser',
+    'SecureJson': 'securejson',
+    'ReadOnlyConfigError': 'exceptions',
+    'SecureConfigException': 'exceptions',
+}
+
+
+def __getattr__(name):
+    modname = _lazy.get(name)
+    if modname is None:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    from importlib import import_module
+    value = getattr(import_module('.' + modname, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy))
@@ -1,8 +1,10 @@
 from __future__ import absolute_import
-from ast import literal_eval
+import hmac
+import os
 
-from .cryptkeeper import CryptKeeper, EnvCryptKeeper, FileCryptKeeper, cryptkeeper_access_methods
+from .cryptkeeper import CryptKeeper, EnvCryptKeeper, FileCryptKeeper, cryptkeeper_access_methods, run_blocking
 from .exceptions import ReadOnlyConfigError, SecureConfigException
+from . import compression, instrument
 
 __doc__ = '''SecureConfig base class for simplifying load of encrypted config files (default: serialized dict).
 
@@ -14,12 +16,24 @@ __doc__ = '''SecureConfig base class for simplifying load of encrypted config fi
     * .write(filehandle) method serializes dictionary, encrypts, and writes to open filehandle
     * Supply readonly=True to protect configuration from .set and .write
     
-    SecureConfig base class uses only serialized python dictionaries.
+    SecureConfig base class uses serialized python dictionaries by default; pass
+    serializer='json', 'binary' or 'msgpack' to store them another way (see
+    secureconfig.serializers).  Files in any format load regardless.
 
     For JSON, use SecureJson.
     For .ini-style files, use SecureConfigParser.
 '''
 
+# per-process key for fingerprinting plaintext, so unchanged data can be spotted
+# at write time without keeping a copy of it (or an unkeyed hash) around.
+_DIGEST_KEY = os.urandom(32)
+
+
+def _digest(txt):
+    if not isinstance(txt, (bytes, bytearray)):
+        txt = txt.encode()
+    return hmac.new(_DIGEST_KEY, txt, 'sha256').digest()
+
 
 class SecureConfig(cryptkeeper_access_methods):
     """Builds a SecureConfig object.
@@ -47,24 +61,61 @@ class SecureConfig(cryptkeeper_access_methods):
         :param rawtxt:     string containing encrypted configuration string.
         :param readonly:   protects source config from .write() (default: False)
         :param ck:         CryptKeeper object (see secureconfig.cryptkeeper)
+        :param use_mmap:   decrypt straight from a memory-mapped filepath, avoiding
+                           extra copies of large files (default: False)
+        :param envelope:   .write() a compact binary envelope rather than a base64
+                           token; needs a filehandle opened 'wb' (default: False,
+                           or True if the file loaded was an envelope)
+        :param snapshot:   keep the parsed config in an encrypted snapshot next to
+                           filepath and load from it while filepath is unchanged,
+                           skipping the text parsing (see secureconfig.snapshot)
+        :param serializer: format for .write() (default: the class's own format, or
+                           whatever format the file loaded was in); see
+                           secureconfig.serializers.  Binary formats need a
+                           filehandle opened 'wb' when there is no ck.
+        :param compress:   compress before encrypting on .write(): 'zlib', 'lzma' or
+                           'zstd' (default: None, or the method of the file
+                           loaded); see secureconfig.compression
 
         :return: SecureConfig object with .cfg dictionary.
     """
 
+    default_serializer = 'repr'
+
     def __init__(self, filepath='', rawtxt='', readonly=False, **kwargs):
 
         self.cfg = {}
         self.readonly = readonly
         self.ck = kwargs.get('ck', None)
+        self.envelope = kwargs.get('envelope', False)
+        self.snapshot = kwargs.get('snapshot', False)
+        self.serializer = kwargs.get('serializer', None) or self.default_serializer
+        self.compress = kwargs.get('compress', None)
+
+        # sections changed through set/add_section/remove_section since the last
+        # load or write, and (digest, writer, token) of the last loaded or written
+        # plaintext (see _writer).
+        self._dirty = set()
+        self._clean = None
 
         if filepath and rawtxt:
             raise SecureConfigException('Supply either filepath or rawtxt (not both).')
 
+        if filepath and self.ck and kwargs.get('use_mmap', False):
+            self._load_mapped(filepath)
+            return
+
         if filepath:
             rawtxt = self._read(filepath)
-
-        if self.ck and rawtxt:
-            self._fill(self._decrypt(rawtxt))        
+        self._load(filepath, rawtxt)
+
+    def _load(self, filepath, rawtxt, txt=None):
+        """fill from the contents rawtxt of filepath (or from rawtxt alone);
+        txt is its plaintext, if that has already been decrypted."""
+        if self.ck and rawtxt and filepath and self.snapshot:
+            self._fill_snapshot(filepath, rawtxt)
+        elif self.ck and rawtxt:
+            self._fill_encrypted(rawtxt, txt)
         elif rawtxt:
             try:
                 self._fill(rawtxt)
@@ -77,15 +128,128 @@ class SecureConfig(cryptkeeper_access_methods):
             # this is a "blank slate" configuration.
             self.cfg = {}
 
-    def _decrypt(self, buf):
-        return self.ck.crypter.decrypt(buf).decode()
+    @classmethod
+    def read_many(cls, filepaths, workers=None, processes=False, **kwargs):
+        """Load many config files at once, spreading the file reads and decryption
+        over a pool of threads (or processes, if processes=True).
+
+        Remaining kwargs (e.g. ck, readonly) are passed to each instance, and each
+        ends up just as cls(filepath, **kwargs) would.
+
+            :param filepaths:  list of paths to config files.
+            :param workers:    size of the worker pool (default: None, serial).
+            :param processes:  use processes instead of threads (default: False)
+
+            :return: list of config objects, in the same order as filepaths.
+        """
+        from .parallel import prefetch_files
+        ck = kwargs.get('ck', None)
+        if kwargs.get('snapshot', False):
+            # snapshots are checked against the file contents before any decryption.
+            ck = None
+        configs = []
+        for path, (rawtxt, txt) in zip(filepaths, prefetch_files(ck, filepaths, workers, processes)):
+            cfg = cls(**kwargs)
+            cfg._load(path, rawtxt, txt)
+            configs.append(cfg)
+        return configs
+
+    @classmethod
+    async def aload(cls, filepath, executor=None, **kwargs):
+        """awaitable load of a config file: reading, decrypting and parsing all happen
+        in an executor (default: the event loop's default executor).
+
+            cfg = await SecureJson.aload(path, ck=ck)
+
+        Remaining kwargs (e.g. ck, readonly) are passed to the constructor.
+        """
+        return await run_blocking(cls, filepath, executor=executor, **kwargs)
+
+    def _decompress(self, txt):
+        """returns (compression method or None, plaintext), noting the method so
+        that .write() compresses the same way."""
+        method, txt = compression.decompress(txt)
+        if method:
+            self.compress = method
+        return method, txt
 
     def _encrypt(self, buf):
-        return self.ck.crypter.encrypt(buf.encode()).decode()
+        if self.envelope:
+            return self.ck.encrypt_envelope(buf)
+        return self.ck.encrypt_bytes(buf).decode()
 
     def _fill(self, txt=''):
-        self.cfg = literal_eval(txt)
+        """fill from plaintext, compressed or not."""
+        self._parse(self._decompress(txt)[1])
+
+    def _parse(self, txt):
+        """parse decompressed plaintext (str or bytes-like) in the format named by its
+        header, or the class's default format if it has none."""
+        from . import serializers
+        self.cfg, self.serializer = serializers.loads(txt, self.default_serializer)
+
+    def _fill_encrypted(self, rawtxt, txt=None):
+        """fill from encrypted file contents (or rawtxt), given its plaintext txt
+        if that has already been decrypted."""
+        from .ciphers import detect, envelope_cipher, is_envelope
+        if txt is None:
+            key_id, txt = self.ck.decrypt_with_key_id(rawtxt)
+        elif hasattr(self.ck, 'keepers'):
+            # decrypted elsewhere by one of a MultiCryptKeeper's keys, but which one
+            # is unknown: never reuse the token, in case it's an old key's.
+            key_id = None
+        else:
+            key_id = self.ck.key_id
+        method, txt = self._decompress(txt)
+        self._parse(txt)
+        if isinstance(rawtxt, bytes) and is_envelope(rawtxt):
+            self.envelope = True
+            token, cipher = rawtxt, envelope_cipher(rawtxt)
+        else:
+            token = (rawtxt.decode() if isinstance(rawtxt, bytes) else rawtxt).strip()
+            cipher = detect(token)
+        self._clean = (_digest(txt), (key_id, cipher, method, bool(self.envelope)), token)
+
+    def _fill_snapshot(self, filepath, rawtxt):
+        """fill from the snapshot of filepath if it is current; otherwise fill from
+        rawtxt as usual and (re)build the snapshot."""
+        from . import snapshot
+        from .ciphers import is_envelope
+        context = type(self).__name__
+        cfg = snapshot.load(self.ck, filepath, rawtxt, context)
+        if cfg is None:
+            self._fill_encrypted(rawtxt)
+            if isinstance(self.cfg, dict):
+                snapshot.save(self.ck, filepath, rawtxt, (self.serializer, self.compress, self.cfg), context)
+            return
+        self.serializer, compress, self.cfg = cfg
+        self.compress = compress or self.compress
+        self.envelope = self.envelope or is_envelope(rawtxt)
+
+    def _load_mapped(self, filepath):
+        """mmap-backed load: the token is decrypted straight out of the mapped file
+        and the plaintext bytearray is zeroed as soon as it has been parsed."""
+        import mmap
+        from .zeromem import zeromem
+        with open(filepath, 'rb') as fh:
+            try:
+                buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files can't be mapped; treat as a blank slate like _read does.
+                return
+        try:
+            plain = self.ck.decrypt_buffer(buf)
+            # the ciphertext is kept (as a non-mapped load keeps it) so that an
+            # unchanged config can be written back as it was.
+            rawtxt = buf[:]
+        finally:
+            buf.close()
+        try:
+            self._fill_encrypted(rawtxt, plain)
+        finally:
+            zeromem(plain)
 
+    @instrument.timed('read', lambda args, result: len(result))
     def _read(self, filepath):
         with open(filepath, 'rb') as fh:
             tmp = fh.read()
@@ -93,7 +257,9 @@ class SecureConfig(cryptkeeper_access_methods):
         return tmp
 
     def _serialize(self):
-        return '%r' % self.cfg
+        from . import serializers
+        cfg = self.cfg if isinstance(self.cfg, dict) else dict(self.cfg)
+        return serializers.dumps(cfg, self.serializer, self.default_serializer)
 
     def __repr__(self):
         return '%r' % self.cfg
@@ -115,6 +281,7 @@ class SecureConfig(cryptkeeper_access_methods):
             existed, return True. Otherwise return False."""
         try:
             self.cfg.pop(section)
+            self._dirty.add(section)
             return True
         except KeyError:
             return False
@@ -125,6 +292,7 @@ class SecureConfig(cryptkeeper_access_methods):
             raise SecureConfigException('specified section already exists')
         else:
             self.cfg[section] = {}            
+            self._dirty.add(section)
 
     def sections(self):
         """Returns a list of available sections in the config."""
@@ -149,13 +317,41 @@ class SecureConfig(cryptkeeper_access_methods):
             raise ReadOnlyConfigError
         else:
             self.cfg[section][param] = value
+            self._dirty.add(section)
+
+    def is_dirty(self):
+        """True if the config may differ from what was last loaded or written.
+        (Changes made directly to .cfg are only detected at .write() time.)"""
+        return self._clean is None or bool(self._dirty)
+
+    def _writer(self):
+        """how .write() would encrypt now: (key id, cipher, compression, envelope)."""
+        return (getattr(self.ck, 'key_id', None), getattr(self.ck, 'cipher', None),
+                self.compress, bool(self.envelope))
+
+    def _encrypt_changed(self):
+        """serializes and encrypts .cfg, reusing the existing ciphertext when the
+        serialized data is unchanged since the last load or write, and would be
+        encrypted the same way (same key, cipher, compression and envelope)."""
+        txt = self._serialize()
+        digest = _digest(txt)
+        writer = self._writer()
+        if not self._dirty and self._clean and self._clean[:2] == (digest, writer):
+            return self._clean[2]
+        buf = self._encrypt(compression.compress(txt, self.compress) if self.compress else txt)
+        self._clean = (digest, writer, buf)
+        self._dirty.clear()
+        return buf
 
     def write(self, fh=None):
-        """if .readonly=False, serializes, encrypts (if key) writing to specified filehandle."""
+        """if .readonly=False, serializes, encrypts (if key) writing to specified filehandle.
+
+        If nothing has changed since the config was loaded (or last written), the
+        existing ciphertext is written back instead of re-encrypting."""
         if self.readonly:
             raise ReadOnlyConfigError
         try:
-            buf = self._encrypt(self._serialize())
+            buf = self._encrypt_changed()
         except AttributeError:
             # no self.ck / no key supplied
             buf = self._serialize()
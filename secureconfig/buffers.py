@@ -0,0 +1,160 @@
+from __future__ import absolute_import
+
+import base64
+import binascii
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.fernet import InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.hmac import HMAC
+
+__doc__ = '''Fernet token decryption straight from buffers (bytes, bytearray, memoryview, mmap).
+
+    cryptography's Fernet.decrypt() only accepts bytes or str, and internally makes
+    several full-size copies of the token on its way to the plaintext (base64
+    alphabet translation, decoding, padded plaintext, unpadded plaintext).  For a
+    large memory-mapped config file this module instead:
+
+      * base64-decodes the token in small windows into one preallocated bytearray,
+      * verifies the HMAC over a memoryview of it,
+      * decrypts with Cipher.update_into() into one more preallocated bytearray,
+      * and strips the PKCS7 padding in place.
+
+    The result is byte-for-byte what Fernet.decrypt() returns, as a bytearray that
+    the caller can wipe (e.g. with zeromem) when finished.
+'''
+
+# must be a multiple of 4 so every window decodes to whole bytes.
+WINDOW = 64 * 1024
+
+_URLSAFE = bytes.maketrans(b'-_', b'+/')
+_WHITESPACE = b' \t\r\n'
+_BLOCK = 16
+
+
+def split_key(key):
+    """returns (signing_key, encryption_key) from a Fernet key."""
+    raw = base64.urlsafe_b64decode(key)
+    return raw[:16], raw[16:]
+
+
+def _b64decode_view(view):
+    """urlsafe-base64-decode memoryview into a new bytearray, one window at a time."""
+    end = len(view)
+    while end and view[end - 1] in _WHITESPACE:
+        end -= 1
+    if end == 0 or end % 4:
+        raise InvalidToken
+
+    pad = 0
+    while pad < 2 and view[end - 1 - pad] == 0x3d:   # '='
+        pad += 1
+
+    out = bytearray(end // 4 * 3 - pad)
+    pos = 0
+    try:
+        for start in range(0, end, WINDOW):
+            chunk = binascii.a2b_base64(view[start:min(start + WINDOW, end)].tobytes().translate(_URLSAFE))
+            out[pos:pos + len(chunk)] = chunk
+            pos += len(chunk)
+    except binascii.Error:
+        raise InvalidToken
+    if pos != len(out):
+        raise InvalidToken
+    return out
+
+
+def _verified_data(signing_key, token):
+    """base64-decodes token and checks its HMAC; returns the decoded bytearray."""
+    # both views released before any InvalidToken propagates, so that a caller
+    # can close the mmap the token came from.
+    with memoryview(token) as view, view.cast('B') as octets:
+        data = _b64decode_view(octets)
+
+    if len(data) < 1 + 8 + _BLOCK + 32 or data[0] != 0x80 or (len(data) - 57) % _BLOCK:
+        raise InvalidToken
+
+    with memoryview(data) as mv:
+        h = HMAC(signing_key, hashes.SHA256())
+        h.update(mv[:-32])
+        try:
+            h.verify(bytes(mv[-32:]))
+        except InvalidSignature:
+            raise InvalidToken
+    return data
+
+
+def _unpad(block, size):
+    """returns the PKCS7 padding length of the size bytes ending block."""
+    pad = block[size - 1]
+    if not 1 <= pad <= _BLOCK or block[size - pad:size] != bytes((pad, )) * pad:
+        raise InvalidToken
+    return pad
+
+
+def decrypt_into(signing_key, encryption_key, token, out):
+    """decrypts a Fernet token held in any buffer into writable buffer out.
+
+        :param signing_key:     first half of the raw Fernet key (see split_key)
+        :param encryption_key:  second half of the raw Fernet key (see split_key)
+        :param token:           bytes-like object or mmap containing the token
+        :param out:             writable buffer (bytearray, memoryview, mmap...)
+
+        :return: number of plaintext bytes written to the start of out.
+
+        Raises InvalidToken exactly where Fernet.decrypt() would (TTLs not supported),
+        or ValueError if out is too small for the plaintext.
+    """
+    data = _verified_data(signing_key, token)
+    with memoryview(data) as mv, memoryview(out) as dst:
+        dst = dst.cast('B')
+        ciphertext = mv[25:-32]
+        decryptor = Cipher(algorithms.AES(encryption_key), modes.CBC(bytes(mv[9:25]))).decryptor()
+
+        if len(dst) >= len(ciphertext) + _BLOCK - 1:
+            # room for the padded plaintext: decrypt straight into out.
+            size = decryptor.update_into(ciphertext, dst)
+            decryptor.finalize()
+            return size - _unpad(dst, size)
+
+        # otherwise decrypt a window at a time, holding back the final block
+        # (which carries the padding) until the end.
+        tmp = bytearray(min(WINDOW, len(ciphertext)) + _BLOCK - 1)
+        held = bytearray(_BLOCK)
+        pos = -_BLOCK
+        try:
+            with memoryview(tmp) as tview:
+                for start in range(0, len(ciphertext), WINDOW):
+                    size = decryptor.update_into(ciphertext[start:start + WINDOW], tview)
+                    if pos + size > len(dst):
+                        raise ValueError('buffer too small for plaintext')
+                    if pos >= 0:
+                        dst[pos:pos + _BLOCK] = held
+                    dst[pos + _BLOCK:pos + size] = tview[:size - _BLOCK]
+                    held[:] = tview[size - _BLOCK:size]
+                    pos += size
+            decryptor.finalize()
+            size = _BLOCK - _unpad(held, _BLOCK)
+            if pos + size > len(dst):
+                raise ValueError('buffer too small for plaintext')
+            dst[pos:pos + size] = held[:size]
+            return pos + size
+        finally:
+            tmp[:] = bytes(len(tmp))
+            held[:] = bytes(_BLOCK)
+
+
+def decrypt_buffer(signing_key, encryption_key, token):
+    """decrypts a Fernet token held in any buffer; returns plaintext as a bytearray.
+
+        :param signing_key:     first half of the raw Fernet key (see split_key)
+        :param encryption_key:  second half of the raw Fernet key (see split_key)
+        :param token:           bytes-like object or mmap containing the token
+
+        Raises InvalidToken exactly where Fernet.decrypt() would (TTLs not supported).
+    """
+    # upper bound on the padded plaintext size, so decrypt_into works in place.
+    out = bytearray(max(0, len(token) // 4 * 3 - 57) + _BLOCK - 1)
+    del out[decrypt_into(signing_key, encryption_key, token, out):]
+    return out
@@ -0,0 +1,87 @@
+from __future__ import absolute_import
+
+import threading
+import time
+from collections import OrderedDict
+
+__doc__ = '''DecryptCache: a small LRU cache of decrypted values with optional TTL.
+
+    Plaintext is held in a bytearray owned exclusively by the cache, so that it can be
+    overwritten with zeroes (via zeromem) whenever an entry is evicted, expired,
+    invalidated or cleared.
+'''
+
+
+class DecryptCache(object):
+    """LRU cache mapping an arbitrary hashable key to a decrypted string.
+
+        :param maxsize:  maximum number of entries to hold (oldest evicted first).
+        :param ttl:      seconds an entry stays valid (default: None, no expiry).
+    """
+
+    def __init__(self, maxsize=128, ttl=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # guards _entries, and the plaintext buffers in it: a buffer is decoded
+        # while the lock is held, so no other thread can zero it mid-read.
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        """Return cached plaintext for key, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            buf, expires = entry
+            if expires is not None and self.clock() >= expires:
+                self._evict(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return buf.decode()
+
+    def put(self, key, val):
+        """Store plaintext val (str) under key, evicting the oldest entries if full."""
+        if self.maxsize <= 0:
+            return
+        expires = self.clock() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = (bytearray(val, 'utf-8'), expires)
+
+            while len(self._entries) > self.maxsize:
+                self._evict(next(iter(self._entries)))
+
+    def invalidate(self, match):
+        """Evict every entry for which match(key) is true."""
+        with self._lock:
+            for key in [key for key in self._entries if match(key)]:
+                self._evict(key)
+
+    def clear(self):
+        """Evict (and zero) every entry."""
+        with self._lock:
+            for key in list(self._entries):
+                self._evict(key)
+
+    def _evict(self, key):
+        # callers hold self._lock.
+        from .zeromem import zeromem
+        buf, _ = self._entries.pop(key)
+        zeromem(buf)
@@ -0,0 +1,200 @@
+from __future__ import absolute_import
+
+import base64
+import binascii
+import os
+
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+__doc__ = '''Cipher backends for CryptKeeper, selected by name (and by sigil in config files).
+
+    FERNET    AES-128-CBC + HMAC-SHA256 (cryptography's Fernet); the original format.
+    AESGCM    AES-256-GCM.
+    CHACHA20  ChaCha20-Poly1305.
+
+    The AEAD backends do encryption and authentication in a single pass and add
+    29 bytes (before base64) to the plaintext, against Fernet's 57 plus padding.
+    They never use the CryptKeeper key directly: each derives its own 256-bit
+    subkey from it with HKDF-SHA256, so one key serves every backend and existing
+    Fernet data keeps decrypting alongside the new formats.
+
+    Text tokens (for values in config files) are::
+
+        urlsafe_base64(version (1) | nonce (12) | ciphertext + tag)
+
+    The version byte is authenticated as associated data, and is chosen so that
+    the first base64 character identifies the backend ('g' is always Fernet), so
+    a token can be decrypted without being told which backend made it.
+
+    Binary envelopes (for whole encrypted files) skip base64 altogether::
+
+        MAGIC (4) | version (1) | nonce (12) | ciphertext + tag
+
+    with MAGIC and version authenticated as associated data.  A MultiCryptKeeper
+    prefixes its envelopes with the id of the key that made them::
+
+        KEYED_MAGIC (4) | key id (4) | envelope
+
+    (the key id needs no authentication: a wrong one just names a key that fails.)
+
+    As with Fernet, every failure to decrypt raises cryptography's InvalidToken.
+'''
+
+ENVELOPE_MAGIC = b'CKAE'
+KEYED_MAGIC = b'CKKI'
+KEY_ID_SIZE = 4
+NONCE_SIZE = 12
+TAG_SIZE = 16
+
+
+class AEADCipher(object):
+    """base class for AEAD backends. Subclasses set name, version (a byte value
+    unique among backends) and algorithm (a cryptography AEAD class taking a
+    32-byte key)."""
+
+    name = None
+    version = None
+    algorithm = None
+
+    def __init__(self, key):
+        if not isinstance(key, bytes):
+            key = key.encode()
+        hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=None,
+                    info=b'secureconfig ' + self.name.lower().encode() + b' v1')
+        self._aead = self.algorithm(hkdf.derive(base64.urlsafe_b64decode(key.strip())))
+        self._header = bytes((self.version, ))
+        self._envelope_header = ENVELOPE_MAGIC + self._header
+
+    def _seal(self, header, data, nonce=None):
+        nonce = nonce or os.urandom(NONCE_SIZE)
+        return header + nonce + self._aead.encrypt(nonce, data, header)
+
+    def _open(self, header, raw):
+        size = len(header)
+        if len(raw) < size + NONCE_SIZE + TAG_SIZE or bytes(raw[:size]) != header:
+            raise InvalidToken
+        with memoryview(raw) as view:
+            try:
+                return self._aead.decrypt(view[size:size + NONCE_SIZE], view[size + NONCE_SIZE:], header)
+            except InvalidTag:
+                raise InvalidToken
+
+    def encrypt(self, data):
+        """returns a base64 text token (as bytes) for data."""
+        return base64.urlsafe_b64encode(self._seal(self._header, data))
+
+    def decrypt(self, token):
+        """takes a text token (bytes or string) and returns plaintext bytes."""
+        if isinstance(token, str):
+            token = token.encode()
+        try:
+            raw = base64.urlsafe_b64decode(token)
+        except (TypeError, binascii.Error):
+            raise InvalidToken
+        return self._open(self._header, raw)
+
+    def encrypt_many(self, items):
+        """returns a list of text tokens for a list of plaintext bytes, drawing
+        every nonce from a single os.urandom call."""
+        nonces = os.urandom(NONCE_SIZE * len(items))
+        return [base64.urlsafe_b64encode(self._seal(self._header, data, nonces[i:i + NONCE_SIZE]))
+                for i, data in zip(range(0, len(nonces), NONCE_SIZE), items)]
+
+    def encrypt_envelope(self, data):
+        """returns a binary envelope (bytes) for data."""
+        return self._seal(self._envelope_header, data)
+
+    def decrypt_envelope(self, blob):
+        """takes a binary envelope (any bytes-like object) and returns plaintext bytes."""
+        return self._open(self._envelope_header, blob)
+
+
+class AESGCMCipher(AEADCipher):
+    name = 'AESGCM'
+    version = 0x90
+    algorithm = AESGCM
+
+
+class ChaCha20Cipher(AEADCipher):
+    name = 'CHACHA20'
+    version = 0x94
+    algorithm = ChaCha20Poly1305
+
+
+# name -> backend class; every class takes the CryptKeeper key and provides
+# encrypt(bytes) -> token and decrypt(token) -> bytes.
+CIPHERS = {'FERNET': Fernet}
+
+# first character of a text token -> backend name ('g' is Fernet's version 0x80).
+_token_leads = {'g': 'FERNET'}
+
+# envelope version byte -> backend name.
+_envelope_versions = {}
+
+
+def register_cipher(cls):
+    """makes an AEADCipher subclass available to CryptKeeper(cipher=cls.name).
+    Register before creating the CryptKeepers that should recognise its sigil."""
+    lead = base64.urlsafe_b64encode(bytes((cls.version, 0, 0)))[:1].decode()
+    if _token_leads.get(lead, cls.name) != cls.name or _envelope_versions.get(cls.version, cls.name) != cls.name:
+        raise ValueError('version 0x%02x of cipher %s clashes with an existing cipher' % (cls.version, cls.name))
+    CIPHERS[cls.name] = cls
+    _token_leads[lead] = cls.name
+    _envelope_versions[cls.version] = cls.name
+    return cls
+
+
+register_cipher(AESGCMCipher)
+register_cipher(ChaCha20Cipher)
+
+
+def detect(token):
+    """returns the name of the backend that made text token (str or bytes-like),
+    defaulting to FERNET for anything unrecognised."""
+    lead = token[:1]
+    if not isinstance(lead, str):
+        lead = bytes(lead).decode('latin-1')
+    return _token_leads.get(lead, 'FERNET')
+
+
+def is_token(token):
+    """True if token (str or bytes) looks like a text token of a registered backend."""
+    token = token.strip()
+    lead = token[:1]
+    if not isinstance(lead, str):
+        lead = lead.decode('latin-1')
+    return lead in _token_leads and len(token) >= 40 and len(token) % 4 == 0
+
+
+def is_envelope(buf):
+    """True if buf (bytes-like or mmap) holds a binary envelope (keyed or not)."""
+    return not isinstance(buf, str) and bytes(buf[:len(ENVELOPE_MAGIC)]) in (ENVELOPE_MAGIC, KEYED_MAGIC)
+
+
+def keyed_envelope(key_id, envelope):
+    """prefixes envelope with key_id (8 hex digits)."""
+    return KEYED_MAGIC + bytes.fromhex(key_id) + envelope
+
+
+def envelope_key_id(buf):
+    """returns (key id, offset of the envelope proper) for the envelope in buf;
+    key id is None for an envelope without one."""
+    if bytes(buf[:len(KEYED_MAGIC)]) != KEYED_MAGIC:
+        return None, 0
+    offset = len(KEYED_MAGIC) + KEY_ID_SIZE
+    return bytes(buf[len(KEYED_MAGIC):offset]).hex(), offset
+
+
+def envelope_cipher(buf):
+    """returns the name of the backend that made the binary envelope in buf."""
+    offset = envelope_key_id(buf)[1] + len(ENVELOPE_MAGIC)
+    if len(buf) <= offset:
+        raise InvalidToken
+    try:
+        return _envelope_versions[buf[offset]]
+    except KeyError:
+        raise InvalidToken
@@ -0,0 +1,79 @@
+from __future__ import absolute_import
+
+__doc__ = '''Compression of plaintext before it is encrypted.
+
+    Config text compresses well, and compressing it first means less for the
+    cipher to process and less (base64) ciphertext to store or send.  Methods:
+
+        zlib   (stdlib)
+        lzma   (stdlib; smallest output, slowest)
+        zstd   (needs Python 3.14's compression.zstd or the zstandard package)
+
+    Compressed plaintext starts with a header naming the method::
+
+        b'\\0cz:' + method + b'\\n' + compressed data
+
+    which is encrypted along with it, so the cipher's authentication covers
+    whether (and how) the data was compressed, and decrypting code can tell
+    without being told.  Plaintext without the header passes through unchanged.
+'''
+
+HEADER = b'\0cz:'
+
+
+def _zlib():
+    import zlib
+    return zlib.compress, zlib.decompress
+
+
+def _lzma():
+    import lzma
+    return lzma.compress, lzma.decompress
+
+
+def _zstd():
+    try:
+        from compression import zstd
+        return zstd.compress, zstd.decompress
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('zstd compression needs Python 3.14+ or the zstandard package')
+    return (lambda data: zstandard.ZstdCompressor().compress(data),
+            lambda data: zstandard.ZstdDecompressor().decompress(data))
+
+
+# imported on first use: each of these pulls in its own extension module.
+METHODS = {'zlib': _zlib, 'lzma': _lzma, 'zstd': _zstd}
+
+_loaded = {}
+
+
+def _codec(method):
+    if method not in _loaded:
+        try:
+            _loaded[method] = METHODS[method]()
+        except KeyError:
+            raise ValueError('unknown compression method %r' % method)
+    return _loaded[method]
+
+
+def compress(data, method):
+    """returns data (str or bytes-like) compressed with method, with its header."""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return HEADER + method.encode() + b'\n' + _codec(method)[0](bytes(data))
+
+
+def decompress(data):
+    """returns (method, decompressed bytes) for data written by compress(), or
+    (None, data) for anything else."""
+    if isinstance(data, str) or bytes(data[:len(HEADER)]) != HEADER:
+        return None, data
+    end = bytes(data[:32]).find(b'\n')
+    if end < 0:
+        raise ValueError('bad compression header')
+    method = bytes(data[len(HEADER):end]).decode()
+    return method, _codec(method)[1](bytes(data[end + 1:]))
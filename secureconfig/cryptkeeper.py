@@ -1,12 +1,16 @@
+import hashlib
 import os
+import re
+import threading
+from collections import OrderedDict
+from functools import partial
 
-from cryptography.fernet import Fernet, InvalidToken
-
-from .securestring import SecureString
+from . import instrument
 
 # CryptKeeper pattern:
 #  - location possibilities: file, env, string
-#  - schemes: symmetric (AES) via Fernet [future: asymmetric (RSA)]
+#  - schemes: symmetric via Fernet (default), AES-256-GCM or ChaCha20-Poly1305
+#    (see secureconfig.ciphers) [future: asymmetric (RSA)]
 #  - actions: load, store, encrypt, decrypt.
 
 # Notes:
@@ -18,8 +22,10 @@ from .securestring import SecureString
 # FileCryptKeeper will not create a directory, only a file. Target directory must exist.
 #
 # The 'sigil' attribute is being used in SecureConfigParser to distinguish an encrypted 
-# value from a plaintext value.  It could be used in the future to allow multiple keys
-# to encrypt and decrypt values from the same config.
+# value from a plaintext value, and to tell which cipher encrypted it (CK_FERNET::,
+# CK_AESGCM::, CK_CHACHA20::).  MultiCryptKeeper also puts the id of the key in it
+# (CK_FERNET.1a2b3c4d::), so that several keys can encrypt and decrypt values in
+# the same config without trial decryption.
 #
 # CryptKeeper is built around cryptography.io which asserts the following
 # standards about its "Fernet" protocol:
@@ -30,6 +36,39 @@ from .securestring import SecureString
 #
 
 
+def _fernet():
+    # deferred until a key is actually used: importing cryptography.fernet pulls
+    # in most of cryptography's hazmat layer, which scripts that never touch a
+    # key (or only need SecureJson's class) shouldn't pay for at import time.
+    from cryptography.fernet import Fernet
+    return Fernet
+
+
+# a sigil naming the key as well as the cipher; see MultiCryptKeeper.
+_KEYED_SIGIL = re.compile(r'CK_([A-Z0-9]+)\.([0-9a-f]{8})::')
+
+
+def _key_id(key):
+    """short public identifier of key: 8 hex digits of a (domain-separated) hash."""
+    if not isinstance(key, bytes):
+        key = key.encode()
+    return hashlib.sha256(b'secureconfig key id:' + key.strip()).hexdigest()[:8]
+
+
+def _payload_size(args, result):
+    return len(args[1])
+
+
+def _batch_size(args, result):
+    return sum(len(inp) for inp in args[1])
+
+
+def _as_bytes(inp):
+    if isinstance(inp, str):
+        return inp.encode()
+    return inp if isinstance(inp, bytes) else bytes(inp)
+
+
 def encrypt_string(key, input):
     ck = CryptKeeper(key)
     return ck.encrypt(input)
@@ -47,6 +86,14 @@ def verify_key(key, teststr = 'test string'):
         return False
 
 
+async def run_blocking(func, *args, executor=None, **kwargs):
+    """run blocking func(*args, **kwargs) in executor (default: the event loop's
+    default executor) so that it does not stall the running event loop."""
+    import asyncio
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+
 class cryptkeeper_access_methods(object):
     """not to be used directly; subclass to make objects with a standardized array
      of encryption classmethods based on what's available in cryptkeeper"""
@@ -54,53 +101,70 @@ class cryptkeeper_access_methods(object):
     @classmethod
     def from_env(cls, keyenv, *args, **kwargs):
         """required argument: keyenv (name of environment variable)"""
-        kwargs['ck'] = EnvCryptKeeper(keyenv)
+        kwargs['ck'] = key_registry.from_env(keyenv)
         return cls(*args, **kwargs)
 
     @classmethod
     def from_file(cls, keyloc, *args, **kwargs):
         """required argument: keyloc (path to file containing key)"""
-        kwargs['ck'] = FileCryptKeeper(keyloc)
+        kwargs['ck'] = key_registry.from_file(keyloc)
         return cls(*args, **kwargs)
 
     @classmethod
     def from_key(cls, key, *args, **kwargs):
         """required argument: key (string containing key)"""
-        kwargs['ck'] = CryptKeeper(key=key)
+        kwargs['ck'] = key_registry.from_key(key)
         return cls(*args, **kwargs)
 
 
 class CryptKeeper(object):
     sigil_base = 'CK_%s::'
+    keyed_sigil_base = 'CK_%s.%s::'
     
     @classmethod
     def generate_key(cls, *args, **kwargs):
-        return Fernet.generate_key()
+        return _fernet().generate_key()
 
+    @instrument.timed('ck.init')
     def __init__(self, *args, **kwargs):
         """base CryptKeeper class. Supply key=string to provide key,
         or allow CryptKeeper to generate a new key when instantiated
         without arguments."""
     
         self.key = kwargs.get('key', None)
-        self.sigil = kwargs.get('sigil', self.sigil_base % 'FERNET')
+        self._split_key = None
+        self.cipher = kwargs.get('cipher', 'FERNET').upper()
+        self.sigil = kwargs.get('sigil', self.sigil_base % self.cipher)
         
         # if proactive==True, create new key and store it.
         # Appropriate Exception will be raised if store() not possible.
         
         self.proactive = kwargs.get('proactive', True)
 
+        from . import ciphers
+        if self.cipher not in ciphers.CIPHERS:
+            raise ValueError('unknown cipher %r (available: %s)' % (self.cipher, ', '.join(sorted(ciphers.CIPHERS))))
+
         if self._key_exists():
             self.key = self.load()
             self.key = self._clean_key(self.key)
-            self.crypter = Fernet(self.key)
+            self.crypter = _fernet()(self.key)
         elif self.proactive:
             self.key = self._gen_key()
-            self.crypter = Fernet(self.key)
+            self.crypter = _fernet()(self.key)
             self.store()
         else:
             raise Exception('no key supplied or key location does not exist')
 
+        self.key_id = _key_id(self.key)
+
+        # cipher backends built so far (see _backend), and every sigil this
+        # CryptKeeper recognises, mapped to its cipher (None: detect from token).
+        self._backends = {'FERNET': self.crypter}
+        self._sigils = [(self.sigil, self.cipher if self.sigil == self.sigil_base % self.cipher else None)]
+        self._sigils += [(self.sigil_base % name, name) for name in sorted(ciphers.CIPHERS)
+                         if self.sigil_base % name != self.sigil]
+
     def _key_exists(self):
         """override for key storage based classes"""
         if self.key:
@@ -112,20 +176,212 @@ class CryptKeeper(object):
 
     def _gen_key(self):
         """generates a new Fernet-based encryption key"""
-        return Fernet.generate_key()
+        return _fernet().generate_key()
         
     def encrypt(self, inp):
-        """takes plaintext string and returns encrypted string"""
-        return self.crypter.encrypt(inp.encode()).decode()
+        """takes plaintext string (or bytes) and returns encrypted string"""
+        return self.encrypt_bytes(inp).decode()
         
     def decrypt(self, inp):
-        """takes encrypted string and returns plaintext string"""
-        return self.crypter.decrypt(inp.encode()).decode()
+        """takes encrypted string (or bytes) and returns plaintext string"""
+        return self.decrypt_bytes(inp).decode()
+
+    @instrument.timed('encrypt', _payload_size)
+    def encrypt_bytes(self, inp, cipher=None):
+        """takes plaintext bytes (or any bytes-like object, or a string) and returns
+        the encrypted token as bytes.  Supply cipher=name to override self.cipher."""
+        return self._backend(cipher or self.cipher).encrypt(_as_bytes(inp))
+
+    @instrument.timed('decrypt', _payload_size)
+    def decrypt_bytes(self, inp, cipher=None):
+        """takes encrypted bytes (or string) and returns plaintext bytes, skipping
+        the str round trip of decrypt().  Tokens of any cipher, and binary envelopes,
+        are recognised; supply cipher=name to accept only that cipher's tokens (or
+        name.key_id, as split_sigil returns for keyed sigils)."""
+        from . import ciphers
+        if cipher is None:
+            if ciphers.is_envelope(inp):
+                return self._decrypt_envelope(inp)
+            cipher = ciphers.detect(inp)
+        elif '.' in cipher:
+            cipher, key_id = cipher.split('.', 1)
+            if key_id != self.key_id:
+                raise ciphers.InvalidToken
+        return self._backend(cipher).decrypt(inp)
+
+    def decrypt_with_key_id(self, inp, cipher=None):
+        """as decrypt_bytes, but returns (key_id, plaintext bytes), where key_id
+        is the id of the key that decrypted inp."""
+        return self.key_id, self.decrypt_bytes(inp, cipher)
+
+    def encrypt_many(self, inputs, cipher=None):
+        """takes an iterable of plaintext strings (or bytes) and returns a list of
+        encrypted strings, in order.  Same as encrypt() on each, but cheaper for
+        many small values: the per-call overhead is paid once for the whole list
+        and, for the AEAD ciphers, every nonce comes from one os.urandom call."""
+        return [token.decode() for token in self._encrypt_many([_as_bytes(inp) for inp in inputs], cipher)]
+
+    @instrument.timed('encrypt', _batch_size)
+    def _encrypt_many(self, inputs, cipher=None):
+        cipher = cipher or self.cipher
+        if cipher == 'FERNET':
+            return [self.crypter.encrypt(inp) for inp in inputs]
+        return self._backend(cipher).encrypt_many(inputs)
+
+    def decrypt_many(self, inputs, cipher=None):
+        """takes an iterable of encrypted strings (or bytes) and returns a list of
+        plaintext strings, in order.  Same as decrypt() on each (cipher as for
+        decrypt_bytes), for the per-call overhead of one."""
+        return [plain.decode() for plain in self._decrypt_many(list(inputs), cipher)]
+
+    @instrument.timed('decrypt', _batch_size)
+    def _decrypt_many(self, inputs, cipher=None):
+        from . import ciphers
+        if cipher and '.' in cipher:
+            cipher, key_id = cipher.split('.', 1)
+            if key_id != self.key_id:
+                raise ciphers.InvalidToken
+        plains = []
+        for inp in inputs:
+            name = cipher or (None if ciphers.is_envelope(inp) else ciphers.detect(inp))
+            plains.append(self._decrypt_envelope(inp) if name is None else self._backend(name).decrypt(inp))
+        return plains
+
+    @instrument.timed('encrypt', _payload_size)
+    def encrypt_envelope(self, inp, cipher=None):
+        """takes plaintext bytes (or string) and returns a compact binary envelope,
+        for whole encrypted files.  Uses cipher, else this CryptKeeper's cipher, or
+        AESGCM if that is FERNET (which has no binary form)."""
+        if isinstance(inp, str):
+            inp = inp.encode()
+        cipher = cipher or self.cipher
+        if cipher == 'FERNET':
+            cipher = 'AESGCM'
+        return self._backend(cipher).encrypt_envelope(inp)
+
+    @instrument.timed('decrypt', _payload_size)
+    def decrypt_envelope(self, inp):
+        """takes a binary envelope (any bytes-like object) and returns plaintext bytes"""
+        return self._decrypt_envelope(inp)
+
+    def _decrypt_envelope(self, inp):
+        from . import ciphers
+        key_id, offset = ciphers.envelope_key_id(inp)
+        if key_id is not None:
+            if key_id != self.key_id:
+                raise ciphers.InvalidToken
+            inp = memoryview(inp)[offset:]
+        return self._backend(ciphers.envelope_cipher(inp)).decrypt_envelope(inp)
+
+    def sigils(self):
+        """returns [(sigil, cipher), ...] for every sigil this CryptKeeper recognises,
+        its own first; cipher is None for a custom sigil (detected from the token)."""
+        return list(self._sigils)
+
+    def sigil_for(self, cipher):
+        """returns the sigil values encrypted with cipher should carry."""
+        return self.sigil_base % cipher
+
+    def split_sigil(self, val):
+        """if val starts with a recognised sigil, returns (cipher, token): cipher is the
+        name the sigil stands for (None for a custom sigil; name.key_id for a keyed
+        sigil) and token the rest of val.  Otherwise returns None."""
+        for sigil, cipher in self._sigils:
+            if val.startswith(sigil):
+                return cipher, val[len(sigil):]
+        if val.startswith('CK_'):
+            match = _KEYED_SIGIL.match(val)
+            if match:
+                return '%s.%s' % match.groups(), val[match.end():]
+        return None
+
+    def _backend(self, cipher):
+        backend = self._backends.get(cipher)
+        if backend is None:
+            from . import ciphers
+            try:
+                backend = self._backends[cipher] = ciphers.CIPHERS[cipher](self.key)
+            except KeyError:
+                raise ValueError('unknown cipher %r' % cipher)
+        return backend
+
+    @instrument.timed('decrypt', _payload_size)
+    def decrypt_buffer(self, inp):
+        """takes any buffer (bytes, bytearray, memoryview, mmap) holding an encrypted
+        token and returns plaintext as a bytearray, without making full-size copies
+        of the token along the way (see secureconfig.buffers)"""
+        from . import buffers
+        cipher = self._detect(inp)
+        if cipher != 'FERNET':
+            # AEAD ciphertext is decrypted in one piece; no buffer-level path.
+            return bytearray(self._decrypt_aead(inp, cipher))
+        return buffers.decrypt_buffer(*self._raw_keys(), inp)
+
+    @instrument.timed('decrypt', _payload_size)
+    def decrypt_into(self, inp, out):
+        """decrypts the token in inp (string or any buffer) into the writable buffer
+        out (e.g. a preallocated bytearray, or a SecureBuffer), returning the number
+        of plaintext bytes written. Raises ValueError if out is too small."""
+        from .securebuffer import SecureBuffer
+        if isinstance(out, SecureBuffer):
+            out.size = 0
+            out.size = self._decrypt_into(inp, out.writable())
+            return out.size
+        return self._decrypt_into(inp, out)
+
+    def _decrypt_into(self, inp, out):
+        if isinstance(inp, str):
+            inp = inp.encode()
+        cipher = self._detect(inp)
+        if cipher == 'FERNET':
+            from . import buffers
+            return buffers.decrypt_into(*self._raw_keys(), inp, out)
+        from .zeromem import zeromem
+        plain = self._decrypt_aead(inp, cipher)
+        try:
+            if len(plain) > len(out):
+                raise ValueError('buffer too small for plaintext')
+            with memoryview(out) as dst:
+                dst.cast('B')[:len(plain)] = plain
+        finally:
+            # cryptography hands AEAD plaintext back as bytes: wipe that copy.
+            zeromem(plain)
+        return len(plain)
+
+    @staticmethod
+    def _detect(inp):
+        # cipher name for a token, or None for a binary envelope.
+        from . import ciphers
+        return None if ciphers.is_envelope(inp) else ciphers.detect(inp)
+
+    def _decrypt_aead(self, inp, cipher):
+        if cipher is None:
+            return self._decrypt_envelope(inp)
+        return self._backend(cipher).decrypt(bytes(inp))
+
+    def _raw_keys(self):
+        if self._split_key is None:
+            from . import buffers
+            self._split_key = buffers.split_key(self.key)
+        return self._split_key
+
+    def encrypt_stream(self, src, dst, chunk_size=None):
+        """encrypts binary file object src into binary file object dst chunk by chunk,
+        using constant memory (see secureconfig.stream). Returns bytes written."""
+        from . import stream
+        return stream.encrypt_stream(self.key, src, dst, chunk_size or stream.DEFAULT_CHUNK_SIZE)
+
+    def decrypt_stream(self, src, dst):
+        """decrypts binary file object src (written by encrypt_stream) into binary
+        file object dst chunk by chunk. Returns bytes written."""
+        from . import stream
+        return stream.decrypt_stream(self.key, src, dst)
     
     def store(self):
         """override for key storage based classes"""
         pass
         
+    @instrument.timed('ck.load')
     def load(self):
         """override for key storage based classes"""
         return self.key
@@ -150,6 +406,7 @@ class EnvCryptKeeper(CryptKeeper):
         os.environ[self.env] = self.key.decode()
         os.putenv(self.env, self.key.decode())
 
+    @instrument.timed('ck.load')
     def load(self):
         """retrieve key from environment variable"""
         return os.environ[self.env]
@@ -198,6 +455,7 @@ class FileCryptKeeper(CryptKeeper):
             fh.write(self.key)
             fh.close()
     
+    @instrument.timed('ck.load')
     def load(self):
         """retrieve key from file at self.path (supplied at instantiation)"""
         with open(self.path, 'rb') as fh:
@@ -205,3 +463,272 @@ class FileCryptKeeper(CryptKeeper):
             fh.close()
         return tmp
 
+
+class MultiCryptKeeper(CryptKeeper):
+    """Holds several keys, e.g. during key rotation: encrypts with the first (primary)
+    key and decrypts with whichever key made the data, without trial decryption.
+
+    Keys are supplied as CryptKeeper objects -- EnvCryptKeeper and FileCryptKeeper
+    included -- or as key strings:
+
+        ck = MultiCryptKeeper(FileCryptKeeper('new.key'), EnvCryptKeeper('OLD_KEY'))
+
+    Values it encrypts in SecureConfigParser files carry the primary key's id in
+    their sigil (CK_FERNET.1a2b3c4d::), and envelopes it writes carry it in their
+    header, so decrypting them goes straight to the right key.  Data without a key
+    id (plain sigils, whole-file tokens, lazy SecureJson sections) is still
+    accepted, by trying each key in turn, primary first.
+
+    Worker processes (see secureconfig.parallel) are sent .keys, every raw key,
+    along with the primary key's cipher and any custom sigil.
+    """
+
+    def __init__(self, *keepers, **kwargs):
+        if not keepers:
+            raise ValueError('MultiCryptKeeper needs at least one key')
+        self.keepers = [ck if isinstance(ck, CryptKeeper) else CryptKeeper(key=ck) for ck in keepers]
+        primary = self.keepers[0]
+
+        self.key = primary.key
+        self.keys = tuple(ck.key for ck in self.keepers)
+        self.key_id = primary.key_id
+        self.cipher = primary.cipher
+        self.crypter = primary.crypter
+        self.proactive = False
+        self._split_key = None
+        self._backends = primary._backends
+
+        self._by_id = {}
+        for ck in self.keepers:
+            self._by_id.setdefault(ck.key_id, ck)
+
+        from . import ciphers
+        self.sigil = kwargs.get('sigil', self.sigil_for(self.cipher))
+        self._sigils = [(self.sigil, None if 'sigil' in kwargs else '%s.%s' % (self.cipher, self.key_id))]
+        for ck in self.keepers:
+            for name in sorted(ciphers.CIPHERS):
+                sigil = self.keyed_sigil_base % (name, ck.key_id)
+                if sigil != self.sigil:
+                    self._sigils.append((sigil, '%s.%s' % (name, ck.key_id)))
+        self._sigils += [(self.sigil_base % name, name) for name in sorted(ciphers.CIPHERS)]
+
+    def sigil_for(self, cipher):
+        return self.keyed_sigil_base % (cipher, self.key_id)
+
+    def _keeper(self, key_id):
+        ck = self._by_id.get(key_id)
+        if ck is None:
+            from cryptography.fernet import InvalidToken
+            raise InvalidToken
+        return ck
+
+    def _candidates(self, inp):
+        """the keepers that may have made inp: its keeper if it names one, else all."""
+        from . import ciphers
+        if ciphers.is_envelope(inp):
+            key_id = ciphers.envelope_key_id(inp)[0]
+            if key_id is not None:
+                return [self._keeper(key_id)]
+        return self.keepers
+
+    def _first(self, method, inp, *args):
+        from cryptography.fernet import InvalidToken
+        for ck in self._candidates(inp):
+            try:
+                return getattr(ck, method)(inp, *args)
+            except InvalidToken:
+                pass
+        raise InvalidToken
+
+    def encrypt_bytes(self, inp, cipher=None):
+        return self.keepers[0].encrypt_bytes(inp, cipher)
+
+    def encrypt_many(self, inputs, cipher=None):
+        return self.keepers[0].encrypt_many(inputs, cipher)
+
+    def decrypt_many(self, inputs, cipher=None):
+        if cipher and '.' in cipher:
+            return self._keeper(cipher.split('.', 1)[1]).decrypt_many(inputs, cipher)
+        from cryptography.fernet import InvalidToken
+        inputs = list(inputs)
+        try:
+            return self.keepers[0].decrypt_many(inputs, cipher)
+        except InvalidToken:
+            # some were made by other keys: find each one's key.
+            return [self._first('decrypt_bytes', inp, cipher).decode() for inp in inputs]
+
+    def encrypt_envelope(self, inp, cipher=None):
+        """as CryptKeeper.encrypt_envelope, with the primary key's id in the header."""
+        from . import ciphers
+        return ciphers.keyed_envelope(self.key_id, self.keepers[0].encrypt_envelope(inp, cipher))
+
+    def decrypt_bytes(self, inp, cipher=None):
+        if cipher and '.' in cipher:
+            return self._keeper(cipher.split('.', 1)[1]).decrypt_bytes(inp, cipher)
+        return self._first('decrypt_bytes', inp, cipher)
+
+    def decrypt_with_key_id(self, inp, cipher=None):
+        if cipher and '.' in cipher:
+            ck = self._keeper(cipher.split('.', 1)[1])
+            return ck.key_id, ck.decrypt_bytes(inp, cipher)
+        from cryptography.fernet import InvalidToken
+        for ck in self._candidates(inp):
+            try:
+                return ck.key_id, ck.decrypt_bytes(inp, cipher)
+            except InvalidToken:
+                pass
+        raise InvalidToken
+
+    def decrypt_envelope(self, inp):
+        return self._first('decrypt_envelope', inp)
+
+    def decrypt_buffer(self, inp):
+        return self._first('decrypt_buffer', inp)
+
+    def decrypt_into(self, inp, out):
+        return self._first('decrypt_into', inp, out)
+
+    def encrypt_stream(self, src, dst, chunk_size=None):
+        return self.keepers[0].encrypt_stream(src, dst, chunk_size)
+
+    def decrypt_stream(self, src, dst):
+        """as CryptKeeper.decrypt_stream; src must be seekable if it may have been
+        written with a key other than the primary one."""
+        from cryptography.fernet import InvalidToken
+        start = src.tell()
+        for ck in self.keepers:
+            try:
+                return ck.decrypt_stream(src, dst)
+            except InvalidToken:
+                # a wrong key fails on the first frame, before anything is written.
+                src.seek(start)
+        raise InvalidToken
+
+    def load(self):
+        return self.key
+
+
+def __getattr__(name):
+    # SecureString used to be imported here; still reachable, but only loaded
+    # (along with the zeromem extension) when asked for.
+    if name == 'SecureString':
+        from .securestring import SecureString
+        return SecureString
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+def _file_stamp(path):
+    """identifies the current contents of the file at path, or None if missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+
+
+def _key_fingerprint(key):
+    if not isinstance(key, bytes):
+        key = key.encode()
+    return hashlib.sha256(key.strip()).hexdigest()
+
+
+class KeyRegistry(object):
+    """Process-wide registry of CryptKeeper objects, so that many configs sharing
+    one key don't each re-check, re-read and re-build it.
+
+    The cryptkeeper_access_methods (from_file, from_env, from_key) go through the
+    module-level `key_registry` instance.  Entries are keyed by path, environment
+    variable name, or key fingerprint (plus any CryptKeeper kwargs), and are
+    rebuilt when the key file changes (inode, size, mtime or ctime) or when the
+    environment variable holds a different value.
+
+    Set key_registry.enabled = False to always build a fresh CryptKeeper.  At most
+    max_entries CryptKeepers are kept; the least recently used go first.
+    """
+
+    def __init__(self, max_entries=128):
+        self.enabled = True
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, regkey, stamp, factory):
+        if not self.enabled:
+            return factory()
+
+        # stamped before building, so a key rotated meanwhile is noticed next time.
+        current = stamp()
+        with self._lock:
+            entry = self._entries.get(regkey)
+            if entry is not None and entry[0] is not None and entry[0] == current:
+                self._entries.move_to_end(regkey)
+                return entry[1]
+
+        ck = factory()
+        with self._lock:
+            self._entries[regkey] = (current, ck)
+            self._entries.move_to_end(regkey)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return ck
+
+    def from_file(self, path, **kwargs):
+        """returns a (possibly shared) FileCryptKeeper for the key file at path."""
+        regkey = ('file', os.path.abspath(path), tuple(sorted(kwargs.items())))
+        return self._lookup(regkey, lambda: _file_stamp(path),
+                            lambda: FileCryptKeeper(path, **kwargs))
+
+    def from_env(self, env, **kwargs):
+        """returns a (possibly shared) EnvCryptKeeper for environment variable env."""
+        regkey = ('env', env, tuple(sorted(kwargs.items())))
+        return self._lookup(regkey, lambda: os.environ.get(env, None),
+                            lambda: EnvCryptKeeper(env, **kwargs))
+
+    def from_key(self, key, **kwargs):
+        """returns a (possibly shared) CryptKeeper for the supplied key."""
+        regkey = ('key', _key_fingerprint(key), tuple(sorted(kwargs.items())))
+        return self._lookup(regkey, lambda: True,
+                            lambda: CryptKeeper(key=key, **kwargs))
+
+    def discard(self, ck):
+        """forget every entry for CryptKeeper ck (e.g. once its key is retired)."""
+        with self._lock:
+            for regkey in [regkey for regkey, entry in self._entries.items() if entry[1] is ck]:
+                del self._entries[regkey]
+
+    def clear(self):
+        """forget every registered CryptKeeper."""
+        with self._lock:
+            self._entries.clear()
+
+
+key_registry = KeyRegistry()
+
+
+class AsyncFileCryptKeeper(FileCryptKeeper):
+    """FileCryptKeeper for use inside asyncio event loops.
+
+    Construct with `await AsyncFileCryptKeeper.create(path, ...)` so that the key file
+    checks and read happen in an executor.  The a-prefixed methods are awaitable
+    versions of load, store, encrypt and decrypt.
+    """
+
+    @classmethod
+    async def create(cls, path, *args, executor=None, **kwargs):
+        """awaitable constructor; accepts the same arguments as FileCryptKeeper."""
+        return await run_blocking(cls, path, *args, executor=executor, **kwargs)
+
+    async def aload(self, executor=None):
+        return await run_blocking(self.load, executor=executor)
+
+    async def astore(self, executor=None):
+        return await run_blocking(self.store, executor=executor)
+
+    async def aencrypt(self, inp, executor=None):
+        return await run_blocking(self.encrypt, inp, executor=executor)
+
+    async def adecrypt(self, inp, executor=None):
+        return await run_blocking(self.decrypt, inp, executor=executor)
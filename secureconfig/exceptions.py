@@ -5,4 +5,5 @@ class SecureConfigException(Exception):
 
 
 class ReadOnlyConfigError(SecureConfigException):
-    pass
+    def __init__(self, message='config is read-only', Errors=[]):
+        SecureConfigException.__init__(self, message, Errors)
@@ -0,0 +1,122 @@
+from __future__ import absolute_import
+
+import threading
+from functools import wraps
+from time import perf_counter
+
+__doc__ = '''Instrumentation hooks for timing key loads, encryption, decryption and file reads.
+
+    Register an observer -- any callable taking (event, duration, size) -- to be told
+    about every instrumented operation:
+
+        from secureconfig import instrument
+
+        collector = instrument.HistogramCollector()
+        instrument.add_observer(collector)
+        ...
+        print(collector.format())
+
+    Events emitted:
+
+        ck.init      CryptKeeper construction (including key checks and load)
+        ck.load      key load from its storage (env variable, file...)
+        encrypt      CryptKeeper encryption;  size = plaintext bytes
+        decrypt      CryptKeeper decryption;  size = token bytes
+        read         SecureConfig file read;  size = file bytes
+        cache.hit    SecureConfigParser.get served from its decrypt cache (duration None)
+        cache.miss   SecureConfigParser.get had to decrypt (duration None)
+        snapshot.hit   a config was loaded from its snapshot (duration None)
+        snapshot.miss  no current snapshot; the source had to be parsed (duration None)
+
+    With no observers registered, each instrumented call costs one extra function
+    call and a list truth test.
+'''
+
+observers = []
+
+
+def add_observer(observer):
+    """register observer(event, duration, size) to receive every event."""
+    if observer not in observers:
+        observers.append(observer)
+
+
+def remove_observer(observer):
+    """unregister an observer added with add_observer."""
+    if observer in observers:
+        observers.remove(observer)
+
+
+def emit(event, duration=None, size=None):
+    """send an event to every registered observer."""
+    for observer in observers:
+        observer(event, duration, size)
+
+
+def count(event, size=None):
+    """emit a counting (untimed) event, if anyone is listening."""
+    if observers:
+        emit(event, None, size)
+
+
+def timed(event, size=None):
+    """decorator emitting event with the call's duration whenever observers are
+    registered.  size, if given, is called as size(args, result) to measure the payload."""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not observers:
+                return func(*args, **kwargs)
+            start = perf_counter()
+            result = func(*args, **kwargs)
+            emit(event, perf_counter() - start, size(args, result) if size else None)
+            return result
+        return wrapper
+    return decorate
+
+
+class HistogramCollector(object):
+    """in-memory observer: per event, counts, total/min/max time, total bytes, and a
+    histogram of durations in power-of-two microsecond buckets."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def __call__(self, event, duration, size):
+        with self._lock:
+            stat = self.stats.get(event)
+            if stat is None:
+                stat = self.stats[event] = {'count': 0, 'total': 0.0, 'min': None, 'max': None,
+                                            'bytes': 0, 'buckets': {}}
+            stat['count'] += 1
+            if size is not None:
+                stat['bytes'] += size
+            if duration is None:
+                return
+            stat['total'] += duration
+            stat['min'] = duration if stat['min'] is None else min(stat['min'], duration)
+            stat['max'] = duration if stat['max'] is None else max(stat['max'], duration)
+            bucket = 1 << max(0, int(duration * 1e6)).bit_length()
+            stat['buckets'][bucket] = stat['buckets'].get(bucket, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+
+    def dump(self):
+        """returns a snapshot of the collected stats (JSON-serializable).
+        Histogram buckets are keyed by their upper bound in microseconds."""
+        with self._lock:
+            return dict((event, dict(stat, buckets=dict((str(b), n) for b, n in sorted(stat['buckets'].items()))))
+                        for event, stat in self.stats.items())
+
+    def format(self):
+        """returns a human-readable table of the collected stats."""
+        lines = ['%-12s %8s %12s %10s %10s %12s' % ('event', 'count', 'total ms', 'mean us', 'max us', 'bytes')]
+        for event, stat in sorted(self.dump().items()):
+            timed_count = sum(stat['buckets'].values())
+            mean = stat['total'] / timed_count * 1e6 if timed_count else 0.0
+            lines.append('%-12s %8d %12.3f %10.1f %10.1f %12d' % (
+                event, stat['count'], stat['total'] * 1e3, mean, (stat['max'] or 0.0) * 1e6, stat['bytes']))
+        return '\n'.join(lines)
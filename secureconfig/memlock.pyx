@@ -0,0 +1,112 @@
+# POSIX-only companions to zeromem (mlock, mprotect), kept in their own extension
+# so that zeromem itself builds anywhere.
+from libc.string cimport memset
+from libc.errno cimport errno
+from posix.mman cimport mlock as _mlock, munlock as _munlock, mprotect as _mprotect, PROT_READ
+
+import mmap
+import os
+
+from .zeromem import zeromem
+
+def mlock(x):
+	"""locks the memory of buffer x into RAM (keeps it out of swap)."""
+	cdef const unsigned char[::1] view = x
+	if view.shape[0] and _mlock(&view[0], view.shape[0]) != 0:
+		raise OSError(errno, os.strerror(errno))
+
+def munlock(x):
+	"""undoes mlock(x)."""
+	cdef const unsigned char[::1] view = x
+	if view.shape[0] and _munlock(&view[0], view.shape[0]) != 0:
+		raise OSError(errno, os.strerror(errno))
+
+def protect_readonly(x):
+	"""makes the pages of buffer x (page-aligned, e.g. an mmap) read-only: writes
+	to them crash the process instead of changing them."""
+	cdef const unsigned char[::1] view = x
+	if view.shape[0] and _mprotect(<void*> &view[0], view.shape[0], PROT_READ) != 0:
+		raise OSError(errno, os.strerror(errno))
+
+cdef class SlotPool:
+	"""fixed-size slots carved out of one preallocated anonymous memory mapping, for
+	holding secrets (see secureconfig.securebuffer).  The mapping is mlock'ed (kept
+	out of swap) if lock=True and the memlock limit allows -- see .locked -- and is
+	excluded from core dumps where the platform supports it.  Released slots are
+	zeroed before they are handed out again."""
+
+	cdef readonly Py_ssize_t slot_size
+	cdef readonly Py_ssize_t slots
+	cdef readonly bint locked
+	cdef object _map
+	cdef object _view
+	cdef list _free
+	cdef bytearray _used
+
+	def __init__(self, Py_ssize_t slot_size=256, Py_ssize_t slots=256, bint lock=True):
+		if slot_size <= 0 or slots <= 0:
+			raise ValueError('slot_size and slots must be positive')
+		self.slot_size = slot_size
+		self.slots = slots
+		self._map = mmap.mmap(-1, slot_size * slots)
+		if hasattr(mmap, 'MADV_DONTDUMP'):
+			self._map.madvise(mmap.MADV_DONTDUMP)
+		self.locked = False
+		if lock:
+			try:
+				mlock(self._map)
+				self.locked = True
+			except OSError:
+				pass
+		self._view = memoryview(self._map)
+		self._free = list(range(slots - 1, -1, -1))
+		self._used = bytearray(slots)
+
+	def acquire(self):
+		"""takes a free slot; returns its number.  Raises MemoryError if none is left."""
+		try:
+			num = self._free.pop()
+		except IndexError:
+			raise MemoryError('all %d slots of the pool are in use' % self.slots)
+		self._used[num] = 1
+		return num
+
+	def slot(self, Py_ssize_t num):
+		"""returns a writable memoryview of slot num (release it before .close())."""
+		self._check(num)
+		return self._view[num * self.slot_size:(num + 1) * self.slot_size]
+
+	def release(self, Py_ssize_t num):
+		"""zeroes slot num and returns it to the pool."""
+		cdef unsigned char[::1] view
+		self._check(num)
+		view = self._view[num * self.slot_size:(num + 1) * self.slot_size]
+		memset(&view[0], 0, self.slot_size)
+		self._used[num] = 0
+		self._free.append(num)
+
+	def available(self):
+		"""the number of free slots."""
+		return len(self._free)
+
+	def close(self):
+		"""zeroes and unmaps the whole pool.  Slots must not be used afterwards."""
+		if self._map is None:
+			return
+		zeromem(self._map)
+		if self.locked:
+			munlock(self._map)
+		self._view.release()
+		try:
+			self._map.close()
+		except BufferError:
+			# slots still in use elsewhere; the memory goes when they do.
+			pass
+		self._map = None
+		self._free = []
+
+	def _check(self, Py_ssize_t num):
+		if self._map is None:
+			raise ValueError('pool is closed')
+		if not 0 <= num < self.slots or not self._used[num]:
+			raise ValueError('slot %d is not in use' % num)
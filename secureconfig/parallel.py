@@ -0,0 +1,175 @@
+from __future__ import absolute_import
+
+from functools import partial
+
+from .cryptkeeper import CryptKeeper, MultiCryptKeeper
+
+__doc__ = '''Executor-backed helpers for decrypting many values or many files at once.
+
+    Decryption (Fernet or AEAD via cryptography) is CPU-bound work.  These
+    helpers spread a batch of it over a pool of threads (default) or processes.
+
+    Process pools need to rebuild a CryptKeeper on the other side, so only the raw
+    key (ck.key, or the tuple ck.keys of a MultiCryptKeeper), its cipher and any
+    custom sigil are sent to worker processes, never the CryptKeeper object itself.
+    Decrypted plaintext travels back to the parent process over a pipe; use threads
+    if that is a concern for you.
+'''
+
+# below this many tokens per worker it isn't worth farming the work out.
+MIN_TOKENS_PER_WORKER = 8
+
+# CryptKeepers built inside worker processes, keyed by what _key_of returned.
+_keepers = {}
+
+
+def _key_of(ck):
+    """what to send worker processes to rebuild ck with (see _keeper): (raw key or
+    tuple of keys, cipher, sigil), where sigil is None unless it is a custom one."""
+    sigil = ck.sigil if ck.sigil != ck.sigil_for(ck.cipher) else None
+    return getattr(ck, 'keys', None) or ck.key, ck.cipher, sigil
+
+
+def _keeper(spec):
+    ck = _keepers.get(spec)
+    if ck is None:
+        key, cipher, sigil = spec
+        kwargs = {'sigil': sigil} if sigil else {}
+        if isinstance(key, tuple):
+            ck = MultiCryptKeeper(CryptKeeper(key=key[0], cipher=cipher), *key[1:], **kwargs)
+        else:
+            ck = CryptKeeper(key=key, cipher=cipher, **kwargs)
+        _keepers[spec] = ck
+    return ck
+
+
+def _executor(workers, processes=False):
+    # imported here: concurrent.futures.process drags in multiprocessing.
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    if processes:
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+def _chunks(seq, num):
+    size = max(1, -(-len(seq) // num))
+    return [seq[i:i + size] for i in range(0, len(seq), size)]
+
+
+def _decrypt_tokens(ck, tokens, cipher=None):
+    return ck.decrypt_many(tokens, cipher)
+
+
+def _decrypt_tokens_by_key(key, tokens, cipher=None):
+    return _decrypt_tokens(_keeper(key), tokens, cipher)
+
+
+def _decrypt_file(ck, path, raw=False):
+    with open(path, 'rb') as fh:
+        buf = fh.read()
+        fh.close()
+    if ck is None:
+        return buf
+    buf = ck.decrypt_bytes(buf)
+    return buf if raw else buf.decode()
+
+
+def _decrypt_file_by_key(key, path, raw=False):
+    return _decrypt_file(_keeper(key) if key else None, path, raw)
+
+
+def _prefetch_file(ck, path):
+    with open(path, 'rb') as fh:
+        buf = fh.read()
+        fh.close()
+    if ck is None:
+        return buf, None
+    from .ciphers import InvalidToken
+    try:
+        return buf, ck.decrypt_bytes(buf)
+    except InvalidToken:
+        # not a single token (e.g. a lazy SecureJson container), or the wrong key:
+        # left for the caller to deal with.
+        return buf, None
+
+
+def _prefetch_file_by_key(key, path):
+    return _prefetch_file(_keeper(key) if key else None, path)
+
+
+def decrypt_tokens(ck, tokens, workers=None, processes=False, cipher=None):
+    """Decrypt a list of (sigil-free) encrypted strings, preserving order.
+
+        :param ck:         CryptKeeper object
+        :param tokens:     list of encrypted strings
+        :param workers:    number of threads/processes to use (default: None, serial)
+        :param processes:  use a process pool instead of a thread pool (default: False)
+        :param cipher:     accept only this cipher's tokens (default: None, any)
+
+        :return: list of plaintext strings
+    """
+    tokens = list(tokens)
+    if not workers or workers <= 1 or len(tokens) < 2 * MIN_TOKENS_PER_WORKER:
+        return _decrypt_tokens(ck, tokens, cipher)
+
+    workers = min(workers, len(tokens) // MIN_TOKENS_PER_WORKER)
+    if processes:
+        func = partial(_decrypt_tokens_by_key, _key_of(ck), cipher=cipher)
+    else:
+        func = partial(_decrypt_tokens, ck, cipher=cipher)
+
+    results = []
+    with _executor(workers, processes) as ex:
+        for chunk in ex.map(func, _chunks(tokens, workers * 4)):
+            results.extend(chunk)
+    return results
+
+
+def decrypt_files(ck, filepaths, workers=None, processes=False, raw=False):
+    """Read and decrypt whole files, preserving order.
+
+        If ck is None, the raw file contents (bytes) are returned instead.
+
+        :param ck:         CryptKeeper object (or None)
+        :param filepaths:  list of paths to encrypted files
+        :param workers:    number of threads/processes to use (default: None, serial)
+        :param processes:  use a process pool instead of a thread pool (default: False)
+        :param raw:        return plaintext bytes rather than strings (default: False)
+
+        :return: list of plaintext strings
+    """
+    filepaths = list(filepaths)
+    if not workers or workers <= 1 or len(filepaths) < 2:
+        return [_decrypt_file(ck, path, raw) for path in filepaths]
+
+    if processes:
+        func = partial(_decrypt_file_by_key, _key_of(ck) if ck else None, raw=raw)
+    else:
+        func = partial(_decrypt_file, ck, raw=raw)
+
+    with _executor(min(workers, len(filepaths)), processes) as ex:
+        return list(ex.map(func, filepaths))
+
+
+def prefetch_files(ck, filepaths, workers=None, processes=False):
+    """Read whole files and try to decrypt each as a single token, preserving order.
+
+        :param ck:         CryptKeeper object (or None, to only read the files)
+        :param filepaths:  list of paths to encrypted files
+        :param workers:    number of threads/processes to use (default: None, serial)
+        :param processes:  use a process pool instead of a thread pool (default: False)
+
+        :return: list of (file contents, plaintext bytes) pairs; plaintext is None
+                 where ck is None or the contents would not decrypt as one token.
+    """
+    filepaths = list(filepaths)
+    if not workers or workers <= 1 or len(filepaths) < 2:
+        return [_prefetch_file(ck, path) for path in filepaths]
+
+    if processes:
+        func = partial(_prefetch_file_by_key, _key_of(ck) if ck else None)
+    else:
+        func = partial(_prefetch_file, ck)
+
+    with _executor(min(workers, len(filepaths)), processes) as ex:
+        return list(ex.map(func, filepaths))
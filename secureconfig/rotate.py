@@ -0,0 +1,408 @@
+from __future__ import absolute_import, print_function
+
+import argparse
+import fnmatch
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from functools import partial
+
+from cryptography.fernet import InvalidToken
+
+from . import ciphers
+from .cryptkeeper import EnvCryptKeeper, FileCryptKeeper
+from .parallel import _executor, _key_of, _keeper
+from .securejson import LAZY_FORMAT, SecureJson
+
+__doc__ = '''Key rotation: re-encrypt config files from an old key to a new one.
+
+    Usage from python:
+
+        from secureconfig.rotate import rotate_tree
+
+        report = rotate_tree('/etc/app', old_ck, new_ck, workers=4, journal='rotate.journal')
+        print(report.summary())
+
+    or from the command line:
+
+        python -m secureconfig.rotate /etc/app --old-keyfile old.key --new-keyfile new.key -w 4
+
+    Every file under the tree is recognised by its contents:
+
+      * whole encrypted files (SecureJson, SecureConfig): a single token, or a
+        binary envelope;
+      * lazy SecureJson containers: every section token and the index;
+      * anything else (e.g. SecureConfigParser .ini files): every sigil-tagged
+        value, rewritten in place so that comments and layout survive.
+
+    Files with nothing encrypted in them are skipped.  Each value keeps its cipher
+    (and sigil, unless the sigil names the old key); only the key changes.
+
+    Files are rewritten atomically (temporary file, fsync, rename), so a crash
+    leaves every file either wholly old or wholly new.  Values that already decrypt
+    under the new key are left alone, so rerunning an interrupted rotation simply
+    finishes the job; a journal file additionally lets reruns skip finished files
+    without decrypting them again.  If any value in a file decrypts under neither
+    key, that file is left untouched and reported as failed.
+'''
+
+# a whole file consisting of one base64 token.
+_TOKEN_FILE = re.compile(br'^\s*([A-Za-z0-9_\-]+=*)\s*$')
+
+# prefix of the temporary files written by _write_atomic.
+_TMP_PREFIX = '.secureconfig-rotate-'
+
+# any keyed sigil (CK_FERNET.1a2b3c4d::), whichever key it names: as
+# cryptkeeper._KEYED_SIGIL, but without groups.
+_ANY_KEYED_SIGIL = r'CK_[A-Z0-9]+\.[0-9a-f]{8}::'
+
+
+def _rotate_token(old_ck, new_ck, token, cipher=None):
+    """returns token (str or bytes) re-encrypted under new_ck as bytes, keeping its
+    cipher, or None if it is already encrypted under new_ck.  cipher may name the
+    key too (FERNET.1a2b3c4d), as split_sigil reports for keyed sigils."""
+    try:
+        plain = old_ck.decrypt_bytes(token, cipher)
+    except InvalidToken:
+        # raises InvalidToken in turn if neither key fits.
+        new_ck.decrypt_bytes(token, cipher)
+        return None
+    return new_ck.encrypt_bytes(plain, cipher.split('.')[0] if cipher else ciphers.detect(token))
+
+
+def _rotate_envelope(old_ck, new_ck, data):
+    try:
+        plain = old_ck.decrypt_envelope(data)
+    except InvalidToken:
+        new_ck.decrypt_envelope(data)
+        return None
+    return new_ck.encrypt_envelope(plain, ciphers.envelope_cipher(data))
+
+
+def _rotate_container(old_ck, new_ck, container):
+    count = 0
+    tokens = [container['index']] + container['sections']
+    for i, token in enumerate(tokens):
+        new = _rotate_token(old_ck, new_ck, token)
+        if new is not None:
+            tokens[i] = new.decode()
+            count += 1
+    if not count:
+        return None, 0
+    return json.dumps({'secureconfig': LAZY_FORMAT, 'index': tokens[0], 'sections': tokens[1:]}).encode(), count
+
+
+def _sigil_pattern(ck):
+    """a regex matching every sigil ck recognises, and keyed sigils naming any key."""
+    # longest first, so that no sigil is mistaken for one it starts with.
+    sigils = sorted((sigil for sigil, _ in ck.sigils()), key=len, reverse=True)
+    return '|'.join([re.escape(sigil) for sigil in sigils] + [_ANY_KEYED_SIGIL])
+
+
+def _rotate_values(old_ck, new_ck, text):
+    """rotates every sigil-tagged value in text; returns (new text or None, count)."""
+    pattern = re.compile('(%s)([A-Za-z0-9_\\-]+=*)' % _sigil_pattern(old_ck))
+    count = [0]
+
+    def replace(match):
+        # a keyed sigil's cipher names its key, so old_ck decrypts it only if it
+        # holds that key (and new_ck is tried next, as for any other value).
+        sigil = match.group(1)
+        cipher = old_ck.split_sigil(sigil)[0]
+        new = _rotate_token(old_ck, new_ck, match.group(2), cipher)
+        if new is None:
+            return match.group(0)
+        count[0] += 1
+        if cipher and '.' in cipher:
+            # a keyed sigil names the old key: name the new one instead.
+            sigil = new_ck.sigil_for(cipher.split('.')[0])
+        return sigil + new.decode()
+
+    text = pattern.sub(replace, text)
+    return (text if count[0] else None), count[0]
+
+
+def rotate_data(data, old_ck, new_ck):
+    """Re-encrypt the contents of one config file from old_ck's key to new_ck's.
+
+        :param data:    file contents (bytes)
+        :param old_ck:  CryptKeeper holding the old key
+        :param new_ck:  CryptKeeper holding the new key
+
+        :return: (kind, new contents or None if unchanged, number of tokens re-encrypted)
+                 where kind is 'envelope', 'token', 'lazy', 'values' or None (nothing
+                 encrypted found).
+
+        Raises InvalidToken if something encrypted decrypts under neither key.
+    """
+    if ciphers.is_envelope(data):
+        new = _rotate_envelope(old_ck, new_ck, data)
+        return 'envelope', new, int(new is not None)
+
+    match = _TOKEN_FILE.match(data)
+    if match and ciphers.is_token(match.group(1)):
+        new = _rotate_token(old_ck, new_ck, match.group(1))
+        if new is not None:
+            new = data[:match.start(1)] + new + data[match.end(1):]
+        return 'token', new, int(new is not None)
+
+    try:
+        text = data.decode()
+    except UnicodeDecodeError:
+        return None, None, 0
+
+    container = SecureJson._parse_container(text)
+    if container is not None:
+        new, count = _rotate_container(old_ck, new_ck, container)
+        return 'lazy', new, count
+
+    new, count = _rotate_values(old_ck, new_ck, text)
+    if new is None and not re.search(_sigil_pattern(old_ck), text):
+        return None, None, 0
+    return 'values', (new.encode() if new is not None else None), count
+
+
+def _write_atomic(path, data):
+    """replaces path's contents with data: written to a temporary file in the same
+    directory, fsync'd, given path's permissions and renamed over it."""
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=dirname, prefix=_TMP_PREFIX)
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def rotate_file(path, old_ck, new_ck, dry_run=False):
+    """Re-encrypt one config file in place (atomically).
+
+        :return: dict with path, status ('rotated', 'current' (already under the new
+                 key) or 'skipped' (nothing encrypted)), kind, values (tokens
+                 re-encrypted) and bytes (file size).
+
+        Raises InvalidToken if something encrypted decrypts under neither key.
+    """
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    kind, new, count = rotate_data(data, old_ck, new_ck)
+    if kind is None:
+        status = 'skipped'
+    elif new is None:
+        status = 'current'
+    else:
+        status = 'rotated'
+        if not dry_run:
+            _write_atomic(path, new)
+    return {'path': path, 'status': status, 'kind': kind, 'values': count, 'bytes': len(data)}
+
+
+def _rotate_file_by_key(old_key, new_key, path, dry_run=False):
+    return rotate_file(path, _keeper(old_key), _keeper(new_key), dry_run)
+
+
+def _safe_rotate(func, path):
+    try:
+        return func(path)
+    except Exception as e:
+        return {'path': path, 'status': 'failed', 'error': '%s: %s' % (type(e).__name__, e)}
+
+
+def find_files(paths, include=None, exclude=None):
+    """Yield the files under paths (files or directory trees), in sorted order.
+
+        :param include:  list of fnmatch patterns; only matching file names are kept
+        :param exclude:  list of fnmatch patterns; matching file names are dropped
+    """
+    def wanted(name):
+        if name.startswith(_TMP_PREFIX):
+            return False
+        if include and not any(fnmatch.fnmatch(name, pat) for pat in include):
+            return False
+        return not (exclude and any(fnmatch.fnmatch(name, pat) for pat in exclude))
+
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if wanted(name):
+                    yield os.path.join(dirpath, name)
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _load_journal(journal):
+    done = {}
+    if journal and os.path.exists(journal):
+        with open(journal) as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue    # a line cut short by a crash.
+                done[entry['path']] = entry['stamp']
+    return done
+
+
+class RotationReport(object):
+    """results of rotate_tree: lists of file results (see rotate_file) by status,
+    plus totals and throughput."""
+
+    def __init__(self):
+        self.rotated = []
+        self.current = []
+        self.skipped = []
+        self.failed = []
+        self.journaled = 0
+        self.values = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def add(self, result):
+        getattr(self, result['status']).append(result)
+        self.values += result.get('values', 0)
+        self.bytes += result.get('bytes', 0)
+
+    @property
+    def files(self):
+        return len(self.rotated) + len(self.current) + len(self.skipped) + len(self.failed)
+
+    def throughput(self):
+        """returns (files per second, megabytes per second, values per second)."""
+        seconds = self.seconds or 1e-9
+        return self.files / seconds, self.bytes / seconds / 1e6, self.values / seconds
+
+    def summary(self):
+        files, mb, values = self.throughput()
+        return ('%d files in %.2f s: %d rotated, %d already current, %d skipped, %d failed, '
+                '%d already journaled; %d values re-encrypted (%.1f files/s, %.2f MB/s, %.1f values/s)' % (
+                    self.files, self.seconds, len(self.rotated), len(self.current), len(self.skipped),
+                    len(self.failed), self.journaled, self.values, files, mb, values))
+
+
+def rotate_tree(paths, old_ck, new_ck, workers=None, processes=False, include=None, exclude=None,
+                journal=None, dry_run=False, progress=None):
+    """Re-encrypt every config file under paths from old_ck's key to new_ck's.
+
+        :param paths:      a file or directory path, or a list of them
+        :param old_ck:     CryptKeeper holding the old key
+        :param new_ck:     CryptKeeper holding the new key
+        :param workers:    number of threads/processes to use (default: None, serial)
+        :param processes:  use a process pool instead of a thread pool (default: False)
+        :param include:    fnmatch patterns of file names to rotate (default: all)
+        :param exclude:    fnmatch patterns of file names to leave alone
+        :param journal:    path of a journal of finished files, for resuming (default: None)
+        :param dry_run:    report what would change without writing anything
+        :param progress:   callable receiving each file's result dict as it completes
+
+        :return: RotationReport
+
+        Key files belonging to old_ck or new_ck are never touched.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    start = time.time()
+    report = RotationReport()
+
+    keyfiles = set(os.path.abspath(ck.path) for ck in (old_ck, new_ck) if getattr(ck, 'path', None))
+    done = _load_journal(journal)
+    todo = []
+    for path in find_files(paths, include, exclude):
+        if os.path.abspath(path) in keyfiles:
+            continue
+        if done.get(path) == _stamp(path):
+            report.journaled += 1
+            continue
+        todo.append(path)
+
+    if processes:
+        func = partial(_rotate_file_by_key, _key_of(old_ck), _key_of(new_ck), dry_run=dry_run)
+    else:
+        func = partial(rotate_file, old_ck=old_ck, new_ck=new_ck, dry_run=dry_run)
+    func = partial(_safe_rotate, func)
+
+    journal_fh = open(journal, 'a') if journal and not dry_run else None
+    try:
+        if workers and workers > 1 and len(todo) > 1:
+            ex = _executor(min(workers, len(todo)), processes)
+            results = ex.map(func, todo)
+        else:
+            ex = None
+            results = map(func, todo)
+        try:
+            for result in results:
+                report.add(result)
+                if journal_fh and result['status'] != 'failed':
+                    journal_fh.write(json.dumps({'path': result['path'], 'stamp': _stamp(result['path'])}) + '\n')
+                    journal_fh.flush()
+                if progress:
+                    progress(result)
+        finally:
+            if ex:
+                ex.shutdown()
+    finally:
+        if journal_fh:
+            journal_fh.close()
+
+    report.seconds = time.time() - start
+    return report
+
+
+def _keeper_from_args(keyfile, keyenv, create=False):
+    if keyfile:
+        return FileCryptKeeper(keyfile, proactive=create)
+    return EnvCryptKeeper(keyenv, proactive=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m secureconfig.rotate',
+                                     description='re-encrypt secureconfig files under a new key')
+    parser.add_argument('paths', nargs='+', help='config files or directories to rotate')
+    old = parser.add_mutually_exclusive_group(required=True)
+    old.add_argument('--old-keyfile', help='file holding the old key')
+    old.add_argument('--old-keyenv', help='environment variable holding the old key')
+    new = parser.add_mutually_exclusive_group(required=True)
+    new.add_argument('--new-keyfile', help='file holding the new key (created if missing)')
+    new.add_argument('--new-keyenv', help='environment variable holding the new key')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='size of the worker pool')
+    parser.add_argument('--processes', action='store_true', help='use processes rather than threads')
+    parser.add_argument('--include', action='append', help='only rotate file names matching this pattern')
+    parser.add_argument('--exclude', action='append', help='leave file names matching this pattern alone')
+    parser.add_argument('--journal', help='record finished files here, to resume an interrupted run')
+    parser.add_argument('-n', '--dry-run', action='store_true', help="report what would change; don't write")
+    parser.add_argument('-v', '--verbose', action='store_true', help='print a line per file')
+    args = parser.parse_args(argv)
+
+    old_ck = _keeper_from_args(args.old_keyfile, args.old_keyenv)
+    new_ck = _keeper_from_args(args.new_keyfile, args.new_keyenv, create=True)
+
+    def progress(result):
+        if result['status'] == 'failed':
+            print('failed   %s: %s' % (result['path'], result['error']), file=sys.stderr)
+        elif args.verbose:
+            print('%-8s %s' % (result['status'], result['path']))
+
+    report = rotate_tree(args.paths, old_ck, new_ck, workers=args.workers, processes=args.processes,
+                         include=args.include, exclude=args.exclude, journal=args.journal,
+                         dry_run=args.dry_run, progress=progress)
+    print(report.summary())
+    return 1 if report.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+from __future__ import absolute_import
+
+import hmac
+import threading
+
+from .memlock import SlotPool
+from .zeromem import zeromem
+
+__doc__ = '''SecureBuffer: a secret held in a slot of a preallocated, mlock'ed pool.
+
+    SecureString is a str, so it can't be changed in place, and it also keeps a
+    bytes copy of itself (the only copy its zeromem reaches).  A SecureBuffer
+    holds its bytes in one slot of a SlotPool (see the memlock extension), and
+    nowhere else:
+
+        secret = SecureBuffer()
+        ck.decrypt_into(token, secret)    # decrypted straight into the slot
+        with secret:
+            connect(password=secret.view())
+        # the slot has been zeroed and returned to the pool
+
+    The pool is preallocated, so making many secrets costs no allocations, and it
+    is kept out of swap and core dumps where the platform allows.  Anything you
+    copy out (bytes(), .decode()...) is an ordinary object again; prefer .view().
+'''
+
+DEFAULT_SLOT_SIZE = 256
+DEFAULT_SLOTS = 256
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def default_pool():
+    """the pool SecureBuffers use unless given one: DEFAULT_SLOTS slots of
+    DEFAULT_SLOT_SIZE bytes, created on first use."""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = SlotPool(DEFAULT_SLOT_SIZE, DEFAULT_SLOTS)
+    return _default_pool
+
+
+class SecureBuffer(object):
+    """Holds up to pool.slot_size bytes of secret data in a slot of pool (default:
+    default_pool()).  The slot is zeroed and returned to the pool by .burn(), at the
+    end of a with block, or when the SecureBuffer is garbage collected.
+
+        :param data:  initial contents (str or bytes-like), if any
+        :param pool:  SlotPool to take the slot from
+    """
+
+    def __init__(self, data=None, pool=None):
+        self._pool = pool or default_pool()
+        self._num = self._pool.acquire()
+        self._slot = self._pool.slot(self._num)
+        self.size = 0
+        if data is not None:
+            self.write(data)
+
+    @property
+    def capacity(self):
+        return len(self._slot)
+
+    def write(self, data):
+        """replaces the contents with data (str or bytes-like).  A str is encoded
+        into a temporary bytes object, which is zeroed afterwards."""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+            try:
+                self.write(data)
+            finally:
+                zeromem(data)
+            return
+        with memoryview(data) as src:
+            src = src.cast('B')
+            if len(src) > self.capacity:
+                raise ValueError('%d bytes do not fit a %d-byte slot' % (len(src), self.capacity))
+            self._slot[:len(src)] = src
+            self._slot[len(src):self.size] = bytes(max(0, self.size - len(src)))
+            self.size = len(src)
+
+    def writable(self):
+        """returns a writable memoryview of the whole slot, e.g. to decrypt into;
+        set .size to the number of bytes written."""
+        self._check()
+        return self._slot
+
+    def view(self):
+        """returns a read-only memoryview of the contents (no copy)."""
+        self._check()
+        return self._slot[:self.size].toreadonly()
+
+    def decode(self, encoding='utf-8'):
+        """returns the contents as a str -- an ordinary, unprotected copy."""
+        return str(self.view(), encoding)
+
+    def __len__(self):
+        return self.size
+
+    def __eq__(self, other):
+        # constant-time, and without copying the contents.
+        if isinstance(other, SecureBuffer):
+            other = other.view()
+        elif isinstance(other, str):
+            other = other.encode('utf-8')
+        return hmac.compare_digest(self.view(), other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<SecureBuffer: %d bytes>' % self.size if self._slot is not None else '<SecureBuffer: burnt>'
+
+    def burn(self):
+        """zeroes the contents and returns the slot to the pool."""
+        if self._slot is None:
+            return
+        self._slot.release()
+        self._slot = None
+        self.size = 0
+        self._pool.release(self._num)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.burn()
+
+    def __del__(self):
+        if getattr(self, '_slot', None) is not None:
+            self.burn()
+
+    def _check(self):
+        if self._slot is None:
+            raise ValueError('SecureBuffer has been burnt')
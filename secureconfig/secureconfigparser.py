@@ -1,8 +1,12 @@
+import io
+import os
 import sys
 
-import cryptography
-
 from .baseclass import cryptkeeper_access_methods
+from .cryptkeeper import run_blocking
+from .cache import DecryptCache
+from .parallel import decrypt_tokens
+from . import instrument
 
 try:
     # New style
@@ -35,20 +39,200 @@ except ImportError:
 # oh god multiple inheritance 
 # /me crosses her fingers
 
+# marks a missing option in raw_get (None is a valid value with allow_no_value).
+_MISSING = object()
+
+# ConfigParser keyword arguments that change how files are parsed, and so which
+# snapshot (see secureconfig.snapshot) a file's parse may be taken from.
+_PARSE_OPTIONS = ('allow_no_value', 'delimiters', 'comment_prefixes', 'inline_comment_prefixes',
+                  'strict', 'empty_lines_in_values', 'default_section')
+
+
 class SecureConfigParser(ConfigParser, cryptkeeper_access_methods):
-    """A subclass of ConfigParser py:class::ConfigParser which decrypts certain entries."""
+    """A subclass of ConfigParser py:class::ConfigParser which decrypts certain entries.
+
+        Supply cache_size=N (default: 0, disabled) to keep up to N decrypted values
+        in memory so that repeated .get() calls on an unchanged encrypted value skip
+        decryption.  Supply cache_ttl=seconds to expire cached values after a while.
+        Cached plaintext is zeroed when evicted; see .clear_cache().
+
+        Supply workers=N to spread bulk decryption (.items(), .items_decrypted())
+        over a pool of N threads, or N processes if processes=True.
+
+        Which options are encrypted, and with which cipher, is worked out once per
+        .read() (see .encrypted_options()) rather than by scanning for sigils on
+        every lookup.
+
+        Supply snapshot=True to have .read() keep each file's parsed contents in an
+        encrypted snapshot next to it (see secureconfig.snapshot), so that later
+        reads of the unchanged file skip the text parsing.
+    """
 
     def __init__(self, *args, **kwargs):
 
         # supplied by cryptkeeper_access_methods
         self.ck = kwargs.pop('ck', None)
 
+        cache_size = kwargs.pop('cache_size', 0)
+        cache_ttl = kwargs.pop('cache_ttl', None)
+        self._cache = DecryptCache(cache_size, cache_ttl) if cache_size else None
+
+        self.workers = kwargs.pop('workers', None)
+        self.processes = kwargs.pop('processes', False)
+        self.snapshot = kwargs.pop('snapshot', False)
+        self._parse_options = dict((opt, kwargs[opt]) for opt in _PARSE_OPTIONS if opt in kwargs)
+
+        # {section: {option: (cipher, sigil length)}} for every encrypted value;
+        # None until first needed.  See _sigil_index.
+        self._index = None
+        self._index_ck = None
+
+        # what each file's parse needs to be made with (see _parse_file).
+        self._init_args, self._init_kwargs = args, dict(kwargs)
+
         ConfigParser.__init__(self, *args, **kwargs)
 
-    def read(self, filenames):
-        """Read the list of config files."""
-        # print("[DEBUG] filenames: ", filenames)
-        ConfigParser.read(self, filenames)
+    def read(self, filenames, workers=None):
+        """Read the list of config files; returns the names of those read.
+
+            Supply workers=N to fetch the files on a pool of N threads (e.g. for
+            many files on a network filesystem).  They are still parsed and merged
+            one by one in the order given, exactly as by ConfigParser.read.
+        """
+        if isinstance(filenames, (str, bytes, os.PathLike)):
+            filenames = [filenames]
+        filenames = list(filenames)
+        if self.snapshot and self.ck:
+            read_ok = self._read_snapshots(filenames, workers)
+        elif workers and workers > 1 and len(filenames) > 1:
+            read_ok = self._read_fetched(filenames, workers)
+        else:
+            read_ok = ConfigParser.read(self, filenames)
+        self._after_read()
+        return read_ok
+
+    def _in_order(self, func, filenames, workers=None):
+        """yields func(filename) for each of filenames in order, computed on a pool
+        of threads if workers > 1."""
+        if workers and workers > 1 and len(filenames) > 1:
+            from .parallel import _executor
+            with _executor(min(workers, len(filenames))) as ex:
+                # map() hands back results (and raises errors) in filenames order,
+                # so the files before a bad one are merged before it raises, as in
+                # ConfigParser.read.
+                for result in ex.map(func, filenames):
+                    yield result
+        else:
+            for filename in filenames:
+                yield func(filename)
+
+    def _read_fetched(self, filenames, workers):
+        """ConfigParser.read(), with the files fetched on a pool of threads; each
+        is then parsed into this parser by ConfigParser.read_file, in order."""
+        encoding = io.text_encoding(None)
+
+        def fetch(filename):
+            try:
+                with open(filename, encoding=encoding) as fh:
+                    return fh.read()
+            except OSError:
+                return None
+
+        read_ok = []
+        for filename, text in zip(filenames, self._in_order(fetch, filenames, workers)):
+            if text is not None:
+                ConfigParser.read_file(self, io.StringIO(text), filename)
+                read_ok.append(os.fspath(filename))
+        return read_ok
+
+    def _read_snapshots(self, filenames, workers=None):
+        """ConfigParser.read(), with each file's parse taken from its snapshot while
+        the file is unchanged (see secureconfig.snapshot), and merged in order."""
+        read_ok = []
+        for filename, parsed in zip(filenames, self._in_order(self._load_parsed, filenames, workers)):
+            if parsed is not None:
+                self._merge_parsed(parsed)
+                read_ok.append(os.fspath(filename))
+        return read_ok
+
+    def _load_parsed(self, filename):
+        """returns the parse of filename (see _parse_file), from its snapshot if
+        the file is unchanged; None if it can't be opened."""
+        try:
+            with open(filename, 'rb') as fh:
+                data = fh.read()
+        except OSError:
+            return None
+
+        from . import snapshot
+        xform, interpolation = self.optionxform, self._interpolation
+        context = '%s %r %s %s' % (type(self).__name__, sorted(self._parse_options.items()),
+                                   getattr(xform, '__qualname__', type(xform).__name__),
+                                   type(interpolation).__name__)
+        parsed = snapshot.load(self.ck, filename, data, context)
+        if parsed is None:
+            parsed = self._parse_file(filename, data)
+            snapshot.save(self.ck, filename, data, parsed, context)
+        return parsed
+
+    def _parse_file(self, filename, data):
+        """returns (defaults, [(section, options), ...]) as parsed from one file by
+        a ConfigParser set up just like this one."""
+        parser = ConfigParser(*self._init_args, **self._init_kwargs)
+        parser.optionxform = self.optionxform
+        parser.read_string(data.decode(), source=os.fspath(filename))
+        return dict(parser.defaults()), [(sec, dict(parser._sections[sec])) for sec in parser.sections()]
+
+    def _merge_parsed(self, parsed):
+        """merges a parse from _parse_file into the config, as ConfigParser._read
+        merges each file it reads.  (Not through read_dict: that goes through
+        .set(), which would re-encrypt values, and would run the interpolation's
+        before_set checks, which ConfigParser.read doesn't.)"""
+        from configparser import SectionProxy
+        defaults, sections = parsed
+        self._defaults.update(defaults)
+        for sec, options in sections:
+            if sec not in self._sections:
+                self._sections[sec] = self._dict()
+                self._proxies[sec] = SectionProxy(self, sec)
+            self._sections[sec].update(options)
+
+    def read_file(self, f, source=None):
+        """Read a config from an open file (see ConfigParser.read_file)."""
+        ConfigParser.read_file(self, f, source)
+        self._after_read()
+
+    def _after_read(self):
+        self._index = None
+        self._sigil_index()
+        if self._cache:
+            # drop cached plaintext for any value the new files have changed.
+            self._cache.invalidate(lambda ckey: self.raw_get(ckey[0], ckey[1]) != ckey[2])
+
+    async def aread(self, filenames, executor=None):
+        """awaitable .read(); file I/O and parsing happen in an executor."""
+        return await run_blocking(self.read, filenames, executor=executor)
+
+    async def aget(self, sec, key, default=None, executor=None):
+        """awaitable .get(); decryption happens in an executor."""
+        return await run_blocking(self.get, sec, key, default, executor=executor)
+
+    async def adecrypt_all(self, sections=None, executor=None):
+        """awaitable .items_decrypted(); decryption happens in an executor."""
+        return await run_blocking(self.items_decrypted, sections, executor=executor)
+
+    def clear_cache(self):
+        """Evict (and zero) every cached decrypted value."""
+        if self._cache is not None:
+            self._cache.clear()
+
+    def _invalidate(self, sec, key=None):
+        if self._cache:
+            if key is None:
+                self._cache.invalidate(lambda ckey: ckey[0] == sec)
+            else:
+                key = self.optionxform(key)
+                self._cache.invalidate(lambda ckey: ckey[0] == sec and ckey[1] == key)
 
     def raw_get(self, sec, key, default=None):
         """Get the raw value without decoding it."""
@@ -62,16 +246,100 @@ class SecureConfigParser(ConfigParser, cryptkeeper_access_methods):
 
     def raw_set(self, sec, key, val):
         """Set the value without encrypting it."""
-        return ConfigParser.set(self, sec, key, val)
+        self._invalidate(sec, key)
+        ConfigParser.set(self, sec, key, val)
+        self._reindex(sec, key)
+
+    def add_section(self, sec):
+        ConfigParser.add_section(self, sec)
+        self._reindex(sec)
+
+    def remove_option(self, sec, key):
+        self._invalidate(sec, key)
+        removed = ConfigParser.remove_option(self, sec, key)
+        self._reindex(sec, key)
+        return removed
+
+    def remove_section(self, sec):
+        self._invalidate(sec)
+        removed = ConfigParser.remove_section(self, sec)
+        if self._index is not None:
+            self._index.pop(sec, None)
+        return removed
+
+    def _sigil_index(self):
+        """returns {section: {option: (cipher, sigil length)}} for every encrypted
+        value, scanning the whole config only when the index is missing (e.g. after
+        .read()) or the CryptKeeper has been swapped."""
+        if self._index is None or self._index_ck is not self.ck:
+            self._index_ck = self.ck
+            sections = [self.default_section] + self.sections()
+            self._index = dict((sec, self._index_section(sec)) for sec in sections)
+        return self._index
+
+    def _index_section(self, sec):
+        index = {}
+        if self.ck:
+            split_sigil = self.ck.split_sigil
+            for (key, raw_val) in self.raw_items(sec):
+                found = split_sigil(raw_val) if raw_val else None
+                if found:
+                    index[key] = (found[0], len(raw_val) - len(found[1]))
+        return index
+
+    def _reindex(self, sec, key=None):
+        """brings the index up to date after a change to sec (and key, if given)."""
+        if self._index is None:
+            return
+        if sec == self.default_section:
+            # defaults show through in every section.
+            self._index = None
+        elif key is None:
+            self._index[sec] = self._index_section(sec)
+        else:
+            key = self.optionxform(key)
+            index = self._index.setdefault(sec, {})
+            raw_val = self.raw_get(sec, key)
+            found = self.ck.split_sigil(raw_val) if self.ck and raw_val else None
+            if found:
+                index[key] = (found[0], len(raw_val) - len(found[1]))
+            else:
+                index.pop(key, None)
+
+    def _encrypted(self, sec, key):
+        """returns (cipher, sigil length) if sec/key holds an encrypted value, else None."""
+        return self._sigil_index().get(sec, {}).get(self.optionxform(key))
+
+    def is_encrypted(self, sec, key):
+        """True if the value of key in section sec is encrypted."""
+        return self._encrypted(sec, key) is not None
+
+    def encrypted_options(self, sections=None):
+        """Return a list of (section, option, cipher) for every encrypted value,
+            without decrypting (or scanning) anything.  cipher is as the sigil
+            names it: e.g. FERNET, or FERNET.1a2b3c4d for a value tagged with the
+            id of the key that encrypted it (see MultiCryptKeeper).
+
+            :param sections: section name or list of section names (default: all sections)
+        """
+        index = self._sigil_index()
+        if sections is None:
+            sections = self.sections()
+        elif isinstance(sections, str):
+            sections = [sections]
+        return [(sec, key, cipher) for sec in sections for key, (cipher, _) in index.get(sec, {}).items()]
 
     def raw_items(self, sec):
         """Return the items in a section without decrypting the values."""
         return ConfigParser.items(self, sec, raw=True)
 
     def val_decrypt(self, raw_val, **kwargs):
-        """Decrypt supplied value if it appears to be encrypted."""
-        if self.ck and raw_val.startswith(self.ck.sigil):
-            return self.ck.crypter.decrypt(raw_val.split(self.ck.sigil)[1].encode()).decode()
+        """Decrypt supplied value if it appears to be encrypted, with the cipher
+        named by its sigil."""
+        found = self.ck.split_sigil(raw_val) if self.ck else None
+        if found:
+            cipher, token = found
+            return self.ck.decrypt_bytes(token, cipher).decode()
         else:
             return raw_val
 
@@ -81,33 +349,168 @@ class SecureConfigParser(ConfigParser, cryptkeeper_access_methods):
         if raw_val is None:
             return default
 
-        val = self.val_decrypt(raw_val, sec=sec, key=key)
+        encrypted = self._encrypted(sec, key)
+        if encrypted is None:
+            return raw_val
+        return self._decrypt_value(sec, key, raw_val, encrypted)
+
+    def _decrypt_value(self, sec, key, raw_val, encrypted):
+        cipher, offset = encrypted
+        if self._cache is None:
+            return self.ck.decrypt_bytes(raw_val[offset:], cipher).decode()
+
+        ckey = (sec, self.optionxform(key), raw_val)
+        val = self._cache.get(ckey)
+        if val is None:
+            instrument.count('cache.miss')
+            val = self.ck.decrypt_bytes(raw_val[offset:], cipher).decode()
+            self._cache.put(ckey, val)
+        else:
+            instrument.count('cache.hit')
         return val
 
     def set(self, sec, key, new_val, encrypt=False):
         """If the value should be secured, encrypt and update it;
             Otherwise just update it.  supply encrypt=True to encrypt
             a value that was not previously encrypted.
+
+            Encrypted values are (re-)encrypted with the CryptKeeper's own cipher,
+            whichever cipher their old sigil named.
         """
-        if not self.has_option(sec, key):
+        old_raw_val = self.raw_get(sec, key, _MISSING)
+        if old_raw_val is _MISSING:
             if encrypt:
-                new_val = self.ck.sigil + self.ck.encrypt(new_val.encode()).decode()
+                new_val = self.ck.sigil + self.ck.encrypt(new_val)
             return self.raw_set(sec, key, new_val)
 
-        old_raw_val = self.raw_get(sec, key)
+        encrypted = self._encrypted(sec, key)
+        was_encrypted = encrypted is not None
 
-        if old_raw_val.startswith(self.ck.sigil) or encrypt:
+        if was_encrypted and old_raw_val[:encrypted[1]] == self.ck.sigil:
+            # self.ck has already loaded cryptography.fernet by now.
+            from cryptography.fernet import InvalidToken
+            try:
+                if self._decrypt_value(sec, key, old_raw_val, encrypted) == new_val:
+                    # unchanged, and under the sigil (so cipher and key) this
+                    # CryptKeeper writes with: keep the existing ciphertext.
+                    return
+            except InvalidToken:
+                pass
+
+        if was_encrypted or encrypt:
             new_val = self.ck.sigil + self.ck.encrypt(new_val)
             return self.raw_set(sec, key, new_val)
 
         return self.raw_set(sec, key, new_val)
 
+    def set_many(self, items, encrypt=False):
+        """set() for many (sec, key, new_val) at once.  Faster than calling
+            set() for each when generating configs: the current encrypted values
+            are decrypted (to spot unchanged ones) as one batch, and the new
+            ones encrypted as another (see CryptKeeper.encrypt_many).
+        """
+        latest = {}
+        for sec, key, new_val in items:
+            latest[(sec, self.optionxform(key))] = (key, new_val)
+
+        # cipher -> list of (name, new_val, token) of encrypted values being set
+        # whose sigil is the one self.ck writes with; any others are re-encrypted.
+        current = {}
+        for name, (key, new_val) in latest.items():
+            encrypted = self._encrypted(name[0], key)
+            if encrypted is not None:
+                cipher, offset = encrypted
+                raw_val = self.raw_get(name[0], key)
+                if raw_val[:offset] == self.ck.sigil:
+                    current.setdefault(cipher, []).append((name, new_val, raw_val[offset:]))
+
+        unchanged = set()
+        if current:
+            from cryptography.fernet import InvalidToken
+
+            def decrypt_or_none(token, cipher):
+                try:
+                    return self.ck.decrypt_bytes(token, cipher).decode()
+                except InvalidToken:
+                    return None
+
+            for cipher, batch in current.items():
+                tokens = [token for (_, _, token) in batch]
+                try:
+                    plaintexts = self._decrypt_batch(tokens, cipher=cipher)
+                except InvalidToken:
+                    # undecryptable values count as changed; find out which they are.
+                    plaintexts = [decrypt_or_none(token, cipher) for token in tokens]
+                unchanged.update(name for (name, new_val, _), val in zip(batch, plaintexts) if val == new_val)
+
+        changed = [(name[0], key, new_val, encrypt or self._encrypted(name[0], key) is not None)
+                   for name, (key, new_val) in latest.items() if name not in unchanged]
+        plain = [new_val for (_, _, new_val, secure) in changed if secure]
+        tokens = iter(self.ck.encrypt_many(plain) if plain else ())
+        for sec, key, new_val, secure in changed:
+            self.raw_set(sec, key, self.ck.sigil + next(tokens) if secure else new_val)
+
     def items(self, sec):
         """Iterate over the items; decoding the values."""
+        if self.workers:
+            for (key, val) in self.items_decrypted(sec)[sec].items():
+                yield key, val
+            return
+
+        index = self._sigil_index().get(sec, {})
         for (key, val) in self.raw_items(sec):
-            val = self.val_decrypt(val, sec=sec, key=key)
+            encrypted = index.get(key)
+            if encrypted:
+                val = self.ck.decrypt_bytes(val[encrypted[1]:], encrypted[0]).decode()
             yield key, val
 
+    def items_decrypted(self, sections=None, workers=None):
+        """Return a plain dict snapshot of {section: {key: value}} with every
+            encrypted value decrypted.
+
+            Unlike looping over .get(), all encrypted values are collected in a
+            single pass over the raw items and then decrypted as one batch.
+
+            :param sections: section name or list of section names (default: all sections)
+            :param workers:  size of decryption pool (default: self.workers)
+        """
+        if sections is None:
+            sections = self.sections()
+        elif isinstance(sections, str):
+            sections = [sections]
+
+        sigil_index = self._sigil_index()
+        snapshot = {}
+        # cipher -> list of (values, key, token) awaiting decryption.
+        pending = {}
+
+        for sec in sections:
+            values = snapshot[sec] = {}
+            index = sigil_index.get(sec, {})
+            for (key, raw_val) in self.raw_items(sec):
+                encrypted = index.get(key)
+                if encrypted:
+                    cipher, offset = encrypted
+                    pending.setdefault(cipher, []).append((values, key, raw_val[offset:]))
+                values[key] = raw_val
+
+        for cipher, batch in pending.items():
+            plaintexts = self._decrypt_batch([token for (_, _, token) in batch], workers, cipher)
+            for (values, key, _), val in zip(batch, plaintexts):
+                values[key] = val
+
+        return snapshot
+
+    def decrypt_all(self, workers=None):
+        """Return a plain dict snapshot of every section with all values decrypted."""
+        return self.items_decrypted(workers=workers)
+
+    def _decrypt_batch(self, tokens, workers=None, cipher=None):
+        """Decrypt a list of sigil-stripped tokens, preserving order."""
+        if workers is None:
+            workers = self.workers
+        return decrypt_tokens(self.ck, tokens, workers, self.processes, cipher)
+
     def print_decrypted(self):
         """Print the file with all the values decrypted."""
         for sec in self.sections():
@@ -1,6 +1,8 @@
+from collections.abc import MutableMapping
 from json import dumps, loads
 
-from .baseclass import SecureConfig
+from .baseclass import SecureConfig, _digest
+from .exceptions import ReadOnlyConfigError, SecureConfigException
 
 __doc__ = '''SecureJson class for simplifying load of encrypted config files.
 
@@ -13,8 +15,142 @@ __doc__ = '''SecureJson class for simplifying load of encrypted config files.
     * ConfigParser-like interface via .get(section, param) method.
     * Default readonly=True protects configuration and "forgets" keyloc.
     * Supply readonly=False to allow use of .set() method.
+    * Supply lazy=True to write an indexed container of per-section tokens, so that
+      later loads only decrypt the sections that are actually used.
+
+    Lazy container format (itself plain JSON)::
+
+        {"secureconfig": "securejson-lazy/2",
+         "index": <token of JSON list of top-level keys>,
+         "sections": [<token of JSON [position, key, value]>, ...]}
+
+    Each section's token carries its own position and key, which are checked when it
+    is decrypted, so sections can't be reordered, swapped or dropped unnoticed.
+    Top-level key names are encrypted in the index, but the number of sections and
+    the (padded) size of each one are visible to anyone who can read the file.
 '''
 
+LAZY_FORMAT = 'securejson-lazy/2'
+
+_UNLOADED = object()
+
+
+def _section_plaintext(pos, name, val):
+    return dumps([pos, name, val])
+
+
+def open_section(ck, pos, token, name):
+    """decrypts the token of a lazy container's section, checking that it was
+    written as section name at position pos.  Returns (value, plaintext, id of
+    the key that decrypted it)."""
+    key_id, txt = ck.decrypt_with_key_id(token)
+    try:
+        tpos, tname, val = loads(txt)
+    except (TypeError, ValueError):
+        tpos = tname = None
+    if (tpos, tname) != (pos, name):
+        raise SecureConfigException('lazy container section %d is not %r' % (pos, name))
+    return val, txt, key_id
+
+
+def _writer_of(key_id, token):
+    from .ciphers import detect
+    return key_id, detect(token)
+
+
+def check_container(names, tokens):
+    """raises SecureConfigException unless there is one section token per name."""
+    if len(names) != len(tokens):
+        raise SecureConfigException('lazy container has %d sections but %d names in its index'
+                                    % (len(tokens), len(names)))
+
+
+class LazySections(MutableMapping):
+    """dict-like .cfg for lazy SecureJson containers: each top-level value is
+    decrypted and parsed the first time it is accessed, then kept."""
+
+    def __init__(self, ck, names, tokens, index_token=None, index_key_id=None):
+        check_container(names, tokens)
+        self._ck = ck
+        self._data = dict((name, _UNLOADED) for name in names)
+        # name -> (position, token, writer) of the section's current ciphertext,
+        # where writer is the (key id, cipher) it was encrypted with, or None until
+        # the section is decrypted if that could have been any of several keys.
+        key_id = None if hasattr(ck, 'keepers') else ck.key_id
+        self._tokens = dict((name, (pos, token, key_id and _writer_of(key_id, token)))
+                            for pos, (name, token) in enumerate(zip(names, tokens)))
+        self._digests = {}
+        self._index = (list(names), index_token, index_token and _writer_of(index_key_id, index_token))
+
+    def __getitem__(self, name):
+        val = self._data[name]
+        if val is _UNLOADED:
+            pos, token = self._tokens[name][:2]
+            val, txt, key_id = open_section(self._ck, pos, token, name)
+            self._tokens[name] = (pos, token, _writer_of(key_id, token))
+            self._digests[name] = _digest(txt)
+            self._data[name] = val
+        return val
+
+    def __setitem__(self, name, val):
+        self._data[name] = val
+        self._forget(name)
+
+    def __delitem__(self, name):
+        del self._data[name]
+        self._forget(name)
+
+    def _forget(self, name):
+        self._tokens.pop(name, None)
+        self._digests.pop(name, None)
+
+    def remember(self, name, pos, token, txt, writer):
+        """record token, encrypted by writer, as the current ciphertext of section
+        name at position pos (whose plaintext is txt)."""
+        self._tokens[name] = (pos, token, writer)
+        self._digests[name] = _digest(txt)
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return '{%s}' % ', '.join('%r: %s' % (name, '<encrypted>' if val is _UNLOADED else repr(val))
+                                  for name, val in self._data.items())
+
+    def is_loaded(self, name):
+        """True if section name has been decrypted (or assigned)."""
+        return self._data[name] is not _UNLOADED
+
+    def token(self, name, pos, writer):
+        """returns the existing token for section name if it is still at position
+        pos, was encrypted by writer, and its contents are unchanged (never loaded,
+        or still serializing to the same plaintext); otherwise None."""
+        entry = self._tokens.get(name)
+        if entry is not None and entry[2] is None:
+            # which key made it is only known once it has been decrypted.
+            self[name]
+            entry = self._tokens[name]
+        if entry is None or entry[0] != pos or entry[2] != writer:
+            return None
+        if self._data[name] is _UNLOADED:
+            return entry[1]
+        if _digest(_section_plaintext(pos, name, self._data[name])) == self._digests[name]:
+            return entry[1]
+        return None
+
+    def index_token(self, names, writer):
+        """returns the existing index token if the list of section names is unchanged
+        and it was encrypted by writer."""
+        if self._index[0] == names and self._index[2] == writer:
+            return self._index[1]
+        return None
+
+    def remember_index(self, names, token, writer):
+        self._index = (list(names), token, writer)
+
 
 class SecureJson(SecureConfig):
     """Builds a SecureJson object. Requires at minimum a filename or a rawtxt argument.
@@ -33,18 +169,93 @@ class SecureJson(SecureConfig):
         :param filepath:   absolute or relative path to real file on disk.
         :param rawtxt:     string containing encrypted configuration string.
         :param readonly:   protects source config from .write() (default: True)
+        :param lazy:       .write() a lazy container of per-section tokens (default: False)
 
         :return: SecureJson object with .cfg dictionary.
+
+        Lazy containers are recognized automatically when read (and written back
+        as lazy containers); their .cfg is a LazySections mapping that only
+        decrypts the sections you touch.
     """
-    
-    def _fill(self, txt):
-        self.cfg = loads(txt)
 
-    def _serialize(self):
-        return self.to_json()
+    default_serializer = 'json'
+
+    def __init__(self, *args, **kwargs):
+        self.lazy = kwargs.pop('lazy', False)
+        super(SecureJson, self).__init__(*args, **kwargs)
+
+    def _fill_encrypted(self, rawtxt, txt=None):
+        container = self._parse_container(rawtxt)
+        if container is None:
+            return super(SecureJson, self)._fill_encrypted(rawtxt, txt)
+        key_id, names = self.ck.decrypt_with_key_id(container['index'])
+        self.cfg = LazySections(self.ck, loads(names), container['sections'], container['index'], key_id)
+        self.lazy = True
+
+    def _load_mapped(self, filepath):
+        with open(filepath, 'rb') as fh:
+            head = fh.read(64)
+        if head.lstrip().startswith(b'{'):
+            # a lazy container holds many small tokens rather than one large one:
+            # nothing to gain from the mapping, so read it as usual.
+            return self._load(filepath, self._read(filepath))
+        return super(SecureJson, self)._load_mapped(filepath)
+
+    @staticmethod
+    def _parse_container(rawtxt):
+        """returns the parsed lazy container, or None if rawtxt isn't one."""
+        if isinstance(rawtxt, bytes):
+            if not rawtxt.lstrip().startswith(b'{'):
+                return None
+            rawtxt = rawtxt.decode()
+        if not rawtxt.lstrip().startswith('{'):
+            return None
+        try:
+            container = loads(rawtxt)
+        except ValueError:
+            return None
+        if container.get('secureconfig') != LAZY_FORMAT:
+            return None
+        return container
+
+    def _serialize_lazy(self):
+        """serializes .cfg as a lazy container, re-encrypting only the sections (and
+        index) that have changed since they were loaded or last written."""
+        lazy = isinstance(self.cfg, LazySections)
+        writer = self._writer()[:2]
+        names = list(self.cfg.keys())
+        tokens = []
+        for pos, name in enumerate(names):
+            token = self.cfg.token(name, pos, writer) if lazy and name not in self._dirty else None
+            if token is None:
+                txt = _section_plaintext(pos, name, self.cfg[name])
+                token = self.ck.encrypt(txt)
+                if lazy:
+                    self.cfg.remember(name, pos, token, txt, writer)
+            tokens.append(token)
+
+        index = self.cfg.index_token(names, writer) if lazy else None
+        if index is None:
+            index = self.ck.encrypt(dumps(names))
+            if lazy:
+                self.cfg.remember_index(names, index, writer)
+
+        self._dirty.clear()
+        return dumps({'secureconfig': LAZY_FORMAT, 'index': index, 'sections': tokens})
 
     def to_json(self):
-        return dumps(self.cfg)
+        return dumps(dict(self.cfg))
+
+    def write(self, fh=None):
+        """if .readonly=False, serializes, encrypts (if key) writing to specified filehandle.
+
+        With lazy=True, writes a lazy container in which sections that were never
+        loaded keep their existing tokens."""
+        if not (self.lazy and self.ck):
+            return super(SecureJson, self).write(fh)
+        if self.readonly:
+            raise ReadOnlyConfigError
+        fh.write(self._serialize_lazy())
 
 
 if __name__ == '__main__':
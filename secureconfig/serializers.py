@@ -0,0 +1,293 @@
+from __future__ import absolute_import
+
+import json
+import struct
+from ast import literal_eval
+
+__doc__ = '''Serializers for SecureConfig data, selected by name.
+
+    repr     repr() / ast.literal_eval; SecureConfig's original format.
+    json     json; SecureJson's original format.
+    binary   compact tagged binary format (below); pure python, no extra dependency.
+    msgpack  MessagePack; needs the msgpack package.  Tuples come back as lists.
+
+    Only repr and binary round-trip every type literal_eval can produce (tuples,
+    sets, bytes, complex numbers, non-string keys...); json and msgpack only
+    handle JSON-like data.  None of them can run code when loading: pickle and
+    marshal are deliberately absent.
+
+    Data in any format other than the class's default is written with a header
+    naming its format, and read back in that format automatically::
+
+        b'\\0sc:' + name + b'\\n' + payload
+
+    (so files in the default format stay exactly as before).
+
+    Binary format: each value is one tag byte, then
+
+        N T F        None, True, False (nothing follows)
+        i            int64
+        I            length (uint32), then a big-endian two's-complement integer
+        f / c        float64 / two float64s (complex)
+        s / b        length (uint32), then UTF-8 text / bytes
+        l t e z      count (uint32), then that many values: list, tuple, set, frozenset
+        d            count (uint32), then that many key, value pairs
+
+    all little-endian.
+'''
+
+HEADER = b'\0sc:'
+
+_U32 = struct.Struct('<I')
+_I64 = struct.Struct('<q')
+_F64 = struct.Struct('<d')
+_C128 = struct.Struct('<dd')
+
+
+class ReprSerializer(object):
+    name = 'repr'
+    text = True
+
+    @staticmethod
+    def dumps(obj):
+        return repr(obj)
+
+    @staticmethod
+    def loads(data):
+        if not isinstance(data, str):
+            data = bytes(data).decode('utf-8')
+        return literal_eval(data)
+
+
+class JsonSerializer(object):
+    name = 'json'
+    text = True
+
+    @staticmethod
+    def dumps(obj):
+        return json.dumps(obj)
+
+    @staticmethod
+    def loads(data):
+        if not isinstance(data, (str, bytes)):
+            data = bytes(data)
+        return json.loads(data)
+
+
+def _pack_int(obj, out):
+    if -0x8000000000000000 <= obj <= 0x7fffffffffffffff:
+        out.append(b'i' + _I64.pack(obj))
+    else:
+        raw = obj.to_bytes((obj + (obj < 0)).bit_length() // 8 + 1, 'big', signed=True)
+        out.append(b'I' + _U32.pack(len(raw)) + raw)
+
+
+def _pack_str(obj, out):
+    raw = obj.encode('utf-8')
+    out.append(b's' + _U32.pack(len(raw)) + raw)
+
+
+def _pack_bytes(obj, out):
+    out.append(b'b' + _U32.pack(len(obj)) + bytes(obj))
+
+
+def _pack_dict(obj, out):
+    out.append(b'd' + _U32.pack(len(obj)))
+    for key, val in obj.items():
+        _pack(key, out)
+        _pack(val, out)
+
+
+def _packer(tag):
+    def pack_items(obj, out):
+        out.append(tag + _U32.pack(len(obj)))
+        for item in obj:
+            _pack(item, out)
+    return pack_items
+
+
+_PACKERS = {
+    type(None): lambda obj, out: out.append(b'N'),
+    bool: lambda obj, out: out.append(b'T' if obj else b'F'),
+    int: _pack_int,
+    float: lambda obj, out: out.append(b'f' + _F64.pack(obj)),
+    complex: lambda obj, out: out.append(b'c' + _C128.pack(obj.real, obj.imag)),
+    str: _pack_str,
+    bytes: _pack_bytes,
+    bytearray: _pack_bytes,
+    dict: _pack_dict,
+    list: _packer(b'l'),
+    tuple: _packer(b't'),
+    set: _packer(b'e'),
+    frozenset: _packer(b'z'),
+}
+
+
+def _pack(obj, out):
+    packer = _PACKERS.get(type(obj))
+    if packer is None:
+        # subclasses (OrderedDict, namedtuples, str enums...) pack as their base type.
+        for cls, packer in _PACKERS.items():
+            if cls is not bool and isinstance(obj, cls):
+                break
+        else:
+            raise TypeError('cannot serialize %s' % type(obj).__name__)
+    packer(obj, out)
+
+
+_SIMPLE = {ord('N'): None, ord('T'): True, ord('F'): False}
+_CONTAINERS = {ord('l'): list, ord('t'): tuple, ord('e'): set, ord('z'): frozenset}
+
+
+def _unpack(data, pos):
+    tag = data[pos]
+    pos += 1
+    if tag == 0x73:     # s
+        size = _U32.unpack_from(data, pos)[0]
+        pos += 4
+        return data[pos:pos + size].decode('utf-8'), pos + size
+    if tag == 0x64:     # d
+        count = _U32.unpack_from(data, pos)[0]
+        pos += 4
+        obj = {}
+        unpack_u32 = _U32.unpack_from
+        for _ in range(count):
+            # str keys and values are by far the most common: decode them inline.
+            if data[pos] == 0x73:
+                size = unpack_u32(data, pos + 1)[0]
+                pos += 5 + size
+                key = data[pos - size:pos].decode('utf-8')
+            else:
+                key, pos = _unpack(data, pos)
+            if data[pos] == 0x73:
+                size = unpack_u32(data, pos + 1)[0]
+                pos += 5 + size
+                obj[key] = data[pos - size:pos].decode('utf-8')
+            else:
+                obj[key], pos = _unpack(data, pos)
+        return obj, pos
+    if tag == 0x69:     # i
+        return _I64.unpack_from(data, pos)[0], pos + 8
+    if tag in _SIMPLE:
+        return _SIMPLE[tag], pos
+    if tag in _CONTAINERS:
+        count = _U32.unpack_from(data, pos)[0]
+        pos += 4
+        items = []
+        for _ in range(count):
+            item, pos = _unpack(data, pos)
+            items.append(item)
+        return _CONTAINERS[tag](items), pos
+    if tag == 0x66:     # f
+        return _F64.unpack_from(data, pos)[0], pos + 8
+    if tag == 0x62:     # b
+        size = _U32.unpack_from(data, pos)[0]
+        pos += 4
+        if pos + size > len(data):
+            raise ValueError('truncated data')
+        return data[pos:pos + size], pos + size
+    if tag == 0x49:     # I
+        size = _U32.unpack_from(data, pos)[0]
+        pos += 4
+        return int.from_bytes(data[pos:pos + size], 'big', signed=True), pos + size
+    if tag == 0x63:     # c
+        real, imag = _C128.unpack_from(data, pos)
+        return complex(real, imag), pos + 16
+    raise ValueError('unknown tag 0x%02x' % tag)
+
+
+class BinarySerializer(object):
+    name = 'binary'
+    text = False
+
+    @staticmethod
+    def dumps(obj):
+        out = []
+        _pack(obj, out)
+        return b''.join(out)
+
+    @staticmethod
+    def loads(data):
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        try:
+            obj, pos = _unpack(data, 0)
+        except (IndexError, struct.error, UnicodeDecodeError, TypeError) as exc:
+            raise ValueError('bad binary data: %s' % exc)
+        if pos != len(data):
+            raise ValueError('bad binary data: ends at byte %d of %d' % (pos, len(data)))
+        return obj
+
+
+class MsgpackSerializer(object):
+    name = 'msgpack'
+    text = False
+
+    @staticmethod
+    def dumps(obj):
+        # imported here: msgpack is optional, and only needed by those who use it.
+        import msgpack
+        return msgpack.packb(obj, use_bin_type=True)
+
+    @staticmethod
+    def loads(data):
+        import msgpack
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+SERIALIZERS = {}
+
+
+def register_serializer(cls):
+    """makes cls (with name, text, dumps(obj) and loads(data)) available as
+    serializer=cls.name.  Text serializers dump str, binary ones bytes."""
+    if not cls.name or '\n' in cls.name:
+        raise ValueError('bad serializer name %r' % cls.name)
+    SERIALIZERS[cls.name] = cls
+    return cls
+
+
+for _cls in (ReprSerializer, JsonSerializer, BinarySerializer, MsgpackSerializer):
+    register_serializer(_cls)
+
+
+def get(name):
+    try:
+        return SERIALIZERS[name]
+    except KeyError:
+        raise ValueError('unknown serializer %r' % name)
+
+
+def split_header(data):
+    """returns (serializer name or None, payload) for serialized data (str or
+    bytes-like) that may start with a format header."""
+    head = data[:len(HEADER)]
+    if isinstance(data, str):
+        if head != HEADER.decode():
+            return None, data
+        end = data.find('\n')
+        return data[len(HEADER):end], data[end + 1:]
+    if bytes(head) != HEADER:
+        return None, data
+    end = bytes(data[:64]).find(b'\n')
+    if end < 0:
+        raise ValueError('bad serializer header')
+    return bytes(data[len(HEADER):end]).decode(), memoryview(data)[end + 1:]
+
+
+def dumps(obj, name, default):
+    """serializes obj with serializer name, headed by the name unless it is default."""
+    serializer = get(name)
+    data = serializer.dumps(obj)
+    if name == default:
+        return data
+    if serializer.text:
+        return HEADER.decode() + name + '\n' + data
+    return HEADER + name.encode() + b'\n' + data
+
+
+def loads(data, default):
+    """returns (object, serializer name) for data written by dumps(obj, name, default)."""
+    name, payload = split_header(data)
+    name = name or default
+    return get(name).loads(payload), name
@@ -0,0 +1,254 @@
+from __future__ import absolute_import
+
+import atexit
+import marshal
+import mmap
+import os
+import struct
+import warnings
+
+from .baseclass import SecureConfig
+from .exceptions import ReadOnlyConfigError
+from .memlock import mlock, munlock, protect_readonly
+from .zeromem import zeromem
+
+__doc__ = '''Decrypted config shared between the processes of a pre-fork worker pool.
+
+    Instead of every worker decrypting (and parsing, and holding) its own copy of
+    the same config, the master process does it once, into an anonymous shared
+    memory mapping that its children inherit:
+
+        from secureconfig.shared import SharedConfig
+
+        shared = SharedConfig.from_config(SecureJson.from_file('app.key', filepath='app.json.enc'))
+        # ... fork workers (e.g. gunicorn with preload_app) ...
+
+        # in each worker:
+        config = shared.view()
+        config.get('database', 'password')
+
+    The view is a read-only SecureConfig.  It looks values up in the mapping
+    through an index kept there as well, and only decodes the values that are
+    asked for, so workers share one physical copy of the data rather than each
+    building its own.
+
+    The mapping is mlock'ed (kept out of swap) and excluded from core dumps where
+    the platform allows; it is zeroed with zeromem and unmapped by .close(),
+    which is also registered to run when the master exits.  Workers attaching
+    with .view() make their mapping read-only.
+
+    Layout of the mapping (native byte order)::
+
+        MAGIC (4) | count (4) | count x (key offset, key length, value offset, value length)
+                  | count x entry number, in key order | keys and values
+
+    Entries are (section,) for each section, followed by (section, option) for
+    each of its options; keys and values are marshal'ed.
+'''
+
+MAGIC = b'CKSH'
+
+_HEADER = struct.Struct('=4sI')
+_ENTRY = struct.Struct('=IIII')
+
+# the value of a section entry whose options follow as entries of their own.
+_SECTION = b''
+
+
+def _key(*parts):
+    # marshal version 0 never interns or back-references, so equal keys always
+    # marshal to the same bytes (and the index can be searched bytewise).
+    return marshal.dumps(parts, 0)
+
+
+def _entries(cfg):
+    for section, options in cfg.items():
+        if isinstance(options, dict):
+            yield _key(section), _SECTION
+            for option, value in options.items():
+                yield _key(section, option), marshal.dumps(value)
+        else:
+            yield _key(section), marshal.dumps(options)
+
+
+class SharedConfig(object):
+    """Decrypted config data in an anonymous shared mapping; create it in the
+        master process before forking, and use .view() in the children.
+
+        :param cfg:   dict of {section: {option: value}} (any values marshal can store)
+        :param lock:  mlock the mapping (default: True).  If the memlock limit
+                      (ulimit -l) is too low, a warning is issued and .locked is False.
+    """
+
+    def __init__(self, cfg, lock=True):
+        entries = list(_entries(cfg))
+        count = len(entries)
+        data_start = _HEADER.size + count * (_ENTRY.size + 4)
+        self.size = data_start + sum(len(key) + len(val) for key, val in entries)
+
+        self._map = mmap.mmap(-1, self.size, flags=mmap.MAP_SHARED)
+        if hasattr(mmap, 'MADV_DONTDUMP'):
+            self._map.madvise(mmap.MADV_DONTDUMP)
+        self.locked = False
+        if lock:
+            try:
+                mlock(self._map)
+                self.locked = True
+            except OSError as exc:
+                warnings.warn('could not mlock shared config (%s); it may be swapped out' % exc)
+
+        _HEADER.pack_into(self._map, 0, MAGIC, count)
+        pos = data_start
+        keys = []
+        for num, (key, val) in enumerate(entries):
+            _ENTRY.pack_into(self._map, _HEADER.size + num * _ENTRY.size, pos, len(key), pos + len(key), len(val))
+            self._map[pos:pos + len(key)] = key
+            self._map[pos + len(key):pos + len(key) + len(val)] = val
+            pos += len(key) + len(val)
+            keys.append(key)
+        order = sorted(range(count), key=keys.__getitem__)
+        struct.pack_into('=%dI' % count, self._map, _HEADER.size + count * _ENTRY.size, *order)
+
+        self._owner = os.getpid()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_config(cls, config, lock=True):
+        """shares a loaded SecureConfigParser (every value decrypted) or SecureConfig /
+        SecureJson (every section, including lazy ones)."""
+        if hasattr(config, 'items_decrypted'):
+            cfg = config.items_decrypted()
+        else:
+            cfg = dict((section, config.cfg[section]) for section in config.cfg)
+        return cls(cfg, lock=lock)
+
+    def view(self):
+        """returns a read-only SecureConfig over the shared data.  In a child
+        process, this first makes the child's mapping read-only."""
+        if self._map is None:
+            raise ValueError('shared config is closed')
+        if os.getpid() != self._owner and not getattr(self, '_protected', False):
+            protect_readonly(self._map)
+            self._protected = True
+        return SharedConfigView(memoryview(self._map).toreadonly())
+
+    def close(self):
+        """zeroes and unmaps the shared data (in the master process; children only
+        unmap their view of it).  Views must not be used afterwards."""
+        if self._map is None:
+            return
+        if os.getpid() == self._owner:
+            zeromem(self._map)
+            if self.locked:
+                munlock(self._map)
+        try:
+            self._map.close()
+        except BufferError:
+            # views still refer to it; the memory goes when they do.
+            pass
+        self._map = None
+        atexit.unregister(self.close)
+
+
+class SharedConfigView(SecureConfig):
+    """read-only SecureConfig over the data of a SharedConfig (see SharedConfig.view()).
+
+        .get(), .sections() and .options() read straight from the shared mapping;
+        .cfg builds (and returns) a private dict copy of everything.
+    """
+
+    def __init__(self, buf):
+        self.readonly = True
+        self.ck = None
+        self.envelope = False
+        self.snapshot = False
+        self._dirty = set()
+        self._clean = None
+
+        magic, self._count = _HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise ValueError('not a shared config')
+        self._buf = buf
+        table_end = _HEADER.size + self._count * _ENTRY.size
+        self._table = buf[_HEADER.size:table_end].cast('I')
+        self._order = buf[table_end:table_end + 4 * self._count].cast('I')
+
+    def _key(self, num):
+        off, size = self._table[4 * num], self._table[4 * num + 1]
+        return self._buf[off:off + size].tobytes()
+
+    def _value(self, num):
+        off, size = self._table[4 * num + 2], self._table[4 * num + 3]
+        return self._buf[off:off + size].tobytes()
+
+    def _find(self, key):
+        """returns the entry number for key, or None."""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(self._order[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self._key(self._order[lo]) == key:
+            return self._order[lo]
+        return None
+
+    @property
+    def cfg(self):
+        cfg = {}
+        section = None
+        for num in range(self._count):
+            key, val = marshal.loads(self._key(num)), self._value(num)
+            if len(key) == 1:
+                section = key[0]
+                cfg[section] = {} if val == _SECTION else marshal.loads(val)
+            else:
+                cfg[section][key[1]] = marshal.loads(val)
+        return cfg
+
+    def get(self, section, param):
+        num = self._find(_key(section, param))
+        if num is not None:
+            return marshal.loads(self._value(num))
+        num = self._find(_key(section))
+        if num is None:
+            raise KeyError(section)
+        val = self._value(num)
+        if val == _SECTION:
+            raise KeyError(param)
+        return marshal.loads(val)[param]
+
+    def sections(self):
+        sections = []
+        for num in range(self._count):
+            key = marshal.loads(self._key(num))
+            if len(key) == 1:
+                sections.append(key[0])
+        return sections
+
+    def options(self, section):
+        num = self._find(_key(section))
+        if num is None:
+            raise KeyError(section)
+        if self._value(num) != _SECTION:
+            return list(marshal.loads(self._value(num)).keys())
+        options = []
+        for num in range(num + 1, self._count):
+            key = marshal.loads(self._key(num))
+            if len(key) == 1:
+                break
+            options.append(key[1])
+        return options
+
+    def __repr__(self):
+        return '<SharedConfigView of %d entries>' % self._count
+
+    def set(self, section, param, value):
+        raise ReadOnlyConfigError
+
+    def add_section(self, section):
+        raise ReadOnlyConfigError
+
+    def remove_section(self, section):
+        raise ReadOnlyConfigError
@@ -0,0 +1,96 @@
+from __future__ import absolute_import
+
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+
+from . import instrument
+
+__doc__ = '''Compiled snapshots: parsed config data cached next to its source file.
+
+    Loading a config normally means decrypting it and then parsing text
+    (ConfigParser, json.loads, literal_eval), on every process start.  With
+    snapshot=True, SecureConfig, SecureJson and SecureConfigParser keep the parsed
+    result in a snapshot file next to the source::
+
+        app.ini  ->  app.ini.cksnap
+
+    and later loads take it from there: one AEAD decrypt and a marshal.loads, no
+    text parsing.  A snapshot is a binary envelope (see secureconfig.ciphers) of::
+
+        marshal((FORMAT, interpreter tag, sha256(context | source), data))
+
+    so it is encrypted and authenticated under the same key as the source.  The
+    hash ties it to the exact source contents it was built from (and the context:
+    which class parsed it, with which options); if the source changes, or the
+    snapshot is missing, stale, corrupt or from another Python version, the source
+    is parsed as usual and the snapshot rebuilt.  A snapshot that can't be written
+    (read-only directory, say) is simply done without.
+
+    marshal is only safe to load from trusted data; here the envelope's
+    authentication guarantees that the data is what secureconfig itself wrote.
+'''
+
+FORMAT = 'secureconfig-snapshot/1'
+SUFFIX = '.cksnap'
+
+# marshal's format may change between interpreter versions.
+_INTERPRETER = '%s/%d' % (sys.implementation.cache_tag, marshal.version)
+
+
+def snapshot_path(path):
+    """returns the path of the snapshot for source file path."""
+    return path + SUFFIX
+
+
+def _source_digest(data, context):
+    if not isinstance(data, bytes):
+        data = data.encode()
+    return hashlib.sha256(context.encode() + b'\0' + data).digest()
+
+
+def load(ck, path, data, context=''):
+    """returns the data stored in the snapshot of source file path, if that
+    snapshot was built from data (the source's current contents) in the same
+    context; otherwise None."""
+    try:
+        with open(snapshot_path(path), 'rb') as fh:
+            blob = fh.read()
+    except OSError:
+        instrument.count('snapshot.miss')
+        return None
+    try:
+        fmt, interpreter, digest, parsed = marshal.loads(ck.decrypt_envelope(blob))
+    except Exception:
+        # InvalidToken (other key, tampering) or not a snapshot at all.
+        fmt = None
+    if fmt != FORMAT or interpreter != _INTERPRETER or digest != _source_digest(data, context):
+        instrument.count('snapshot.miss')
+        return None
+    instrument.count('snapshot.hit')
+    return parsed
+
+
+def save(ck, path, data, parsed, context=''):
+    """stores parsed (built-in types only) as the snapshot of source file path,
+    whose contents are data.  Returns True if the snapshot was written."""
+    try:
+        blob = ck.encrypt_envelope(marshal.dumps((FORMAT, _INTERPRETER, _source_digest(data, context), parsed)))
+    except ValueError:
+        # something marshal can't store; parse the source every time instead.
+        return False
+    target = snapshot_path(path)
+    try:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(target)), prefix='.secureconfig-snapshot-')
+    except OSError:
+        return False
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(blob)
+        os.replace(tmp, target)
+    except OSError:
+        os.remove(tmp)
+        return False
+    return True
@@ -0,0 +1,139 @@
+from __future__ import absolute_import
+
+import base64
+import os
+import struct
+
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+__doc__ = '''Framed, chunked, authenticated encryption for large files.
+
+    Whole-file Fernet tokens need the entire plaintext (and its base64 encoding) in
+    memory at once. This format encrypts a stream chunk by chunk so that memory use
+    stays constant regardless of file size.
+
+    Layout::
+
+        header:  MAGIC (8) | version (1) | chunk_size (4) | salt (16)
+        frames:  length (4) | AES-256-GCM ciphertext + tag (length bytes)
+                 ... repeated; the last frame is flagged as final.
+
+    Each stream gets its own AES-256-GCM key, derived with HKDF-SHA256 from the
+    CryptKeeper's key and the random per-stream salt.  The 12-byte nonce of each
+    frame is its sequence number plus a "final frame" flag, and the header is
+    authenticated along with every frame, so that frames cannot be reordered,
+    dropped, truncated or spliced in from another stream without detection.
+
+    Any authentication or format failure raises cryptography's InvalidToken, just
+    like CryptKeeper.decrypt.
+'''
+
+MAGIC = b'CKSTREAM'
+VERSION = 1
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_header = struct.Struct('>8sBI16s')
+_length = struct.Struct('>I')
+_nonce = struct.Struct('>Q3xB')
+
+
+def _stream_key(key, salt):
+    if not isinstance(key, bytes):
+        key = key.encode()
+    hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=salt, info=b'secureconfig stream v1')
+    return AESGCM(hkdf.derive(base64.urlsafe_b64decode(key.strip())))
+
+
+def _read_exactly(src, size):
+    buf = src.read(size)
+    if len(buf) != size:
+        raise InvalidToken
+    return buf
+
+
+def encrypt_stream(key, src, dst, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Encrypt binary file-like src into binary file-like dst.
+
+        :param key:         Fernet-style (urlsafe base64, 32 byte) key
+        :param src:         readable binary file object (plaintext)
+        :param dst:         writable binary file object (ciphertext)
+        :param chunk_size:  plaintext bytes per frame
+
+        :return: number of ciphertext bytes written.
+    """
+    salt = os.urandom(16)
+    header = _header.pack(MAGIC, VERSION, chunk_size, salt)
+    aead = _stream_key(key, salt)
+
+    dst.write(header)
+    written = len(header)
+
+    seq = 0
+    chunk = src.read(chunk_size)
+    while True:
+        nxt = src.read(chunk_size) if len(chunk) == chunk_size else b''
+        final = not nxt
+        frame = aead.encrypt(_nonce.pack(seq, final), chunk, header)
+        dst.write(_length.pack(len(frame)))
+        dst.write(frame)
+        written += _length.size + len(frame)
+        if final:
+            return written
+        chunk = nxt
+        seq += 1
+
+
+def decrypt_stream(key, src, dst):
+    """Decrypt binary file-like src (written by encrypt_stream) into dst.
+
+        :param key:  Fernet-style (urlsafe base64, 32 byte) key
+        :param src:  readable binary file object (ciphertext)
+        :param dst:  writable binary file object (plaintext)
+
+        :return: number of plaintext bytes written.
+    """
+    header = _read_exactly(src, _header.size)
+    magic, version, chunk_size, salt = _header.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise InvalidToken
+    aead = _stream_key(key, salt)
+    max_frame = chunk_size + 16
+
+    written = 0
+    seq = 0
+    while True:
+        length = src.read(_length.size)
+        if not length:
+            # ran out of frames before the final one: truncated.
+            raise InvalidToken
+        (length, ) = _length.unpack(length)
+        if length > max_frame:
+            raise InvalidToken
+        frame = _read_exactly(src, length)
+
+        # only full-size frames can be non-final, so short frames are only tried
+        # as final ones, and at most the last frame is authenticated twice.
+        chunk = None
+        final = length < max_frame
+        try:
+            if not final:
+                try:
+                    chunk = aead.decrypt(_nonce.pack(seq, False), frame, header)
+                except InvalidTag:
+                    final = True
+            if final:
+                chunk = aead.decrypt(_nonce.pack(seq, True), frame, header)
+        except InvalidTag:
+            raise InvalidToken
+
+        dst.write(chunk)
+        written += len(chunk)
+        if final:
+            if src.read(1):
+                raise InvalidToken
+            return written
+        seq += 1
@@ -1,6 +1,8 @@
-import os, string
+import os, string, tempfile
 from random import sample, choice
 
+from . import compression
+
 # all ck_obj arguments refer to instances of CryptKeeper objects (and subclass objects)
 
 ACCEPTED_SYMBOLS = '_-)(&^#@!.'
@@ -17,19 +19,51 @@ def safe_pwgen(length=32, symbols=ACCEPTED_SYMBOLS):
     return ''.join(choice(chars) for _ in range(length))
 
 
-def encrypt_file(ck_obj, infile, outfile):
-    enctxt = ck_obj.encrypt(open(infile, 'r').read())
+def encrypt_file(ck_obj, infile, outfile, compress=None):
+    """encrypts infile to outfile, first compressing it with compress ('zlib',
+    'lzma' or 'zstd'; see secureconfig.compression) if given."""
+    data = open(infile, 'rb').read()
+    if compress:
+        data = compression.compress(data, compress)
+    enctxt = ck_obj.encrypt_bytes(data)
     f = open(outfile, 'wb')
     f.write(enctxt)
     f.close()
 
 
 def decrypt_file(ck_obj, infile, outfile=''):
-    txt = ck_obj.decrypt(open(infile, 'rb').read())
+    txt = compression.decompress(ck_obj.decrypt_bytes(open(infile, 'rb').read()))[1]
     if outfile:
-        f = open(outfile, 'w')
+        f = open(outfile, 'wb')
         f.write(txt)
         f.close()
         return outfile
     else:
-        return txt
+        return txt.decode()
+
+
+def encrypt_file_stream(ck_obj, infile, outfile, chunk_size=None):
+    """encrypts infile to outfile in fixed-size chunks, using constant memory.
+    Use for large files; decrypt with decrypt_file_stream."""
+    kwargs = {'chunk_size': chunk_size} if chunk_size else {}
+    with open(infile, 'rb') as src, open(outfile, 'wb') as dst:
+        ck_obj.encrypt_stream(src, dst, **kwargs)
+    return outfile
+
+
+def decrypt_file_stream(ck_obj, infile, outfile):
+    """decrypts a file written by encrypt_file_stream to outfile, using constant memory.
+    The plaintext goes to a temporary file next to outfile, which replaces outfile
+    only once the whole input has been authenticated; on any failure outfile is
+    left as it was."""
+    with open(infile, 'rb') as src:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(outfile)),
+                                   prefix='.' + os.path.basename(outfile) + '.')
+        try:
+            with os.fdopen(fd, 'wb') as dst:
+                ck_obj.decrypt_stream(src, dst)
+            os.replace(tmp, outfile)
+        except BaseException:
+            os.remove(tmp)
+            raise
+    return outfile
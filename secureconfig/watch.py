@@ -0,0 +1,368 @@
+from __future__ import absolute_import
+
+import os
+import threading
+from json import loads
+
+from . import compression, serializers
+from .cryptkeeper import _file_stamp, cryptkeeper_access_methods
+from .parallel import decrypt_tokens
+
+try:
+    # New style
+    from configparser import ConfigParser
+except ImportError:
+    # Old style
+    from ConfigParser import ConfigParser
+
+__doc__ = '''Hot reload: keep a decrypted snapshot of config files up to date as they change.
+
+    Long-running processes can pick up rotated secrets without restarting:
+
+        from secureconfig.watch import ConfigWatcher
+
+        watcher = ConfigWatcher.from_file('app.key', ['/etc/app/app.ini', '/etc/app/local.ini'])
+        watcher.subscribe(lambda watcher, changed: reconnect(watcher.get('database', 'password')))
+        watcher.start()
+
+    Each file is identified by its inode, size, mtime and ctime.  When that changes,
+    only that file is read again; its raw values are diffed against what was there
+    before and only the values whose ciphertext changed are decrypted.  The new
+    snapshot is then swapped in with a single assignment, so readers see either
+    the old values or the new ones, never a mixture, and subscribers are called
+    with the list of (section, option) that changed.
+
+    If a changed file can't be read, parsed or decrypted (e.g. it is caught half
+    written), the old snapshot stays and the file is tried again on the next check.
+
+    On Linux, start() uses inotify (through ctypes; nothing to install) to wake up
+    as soon as anything in the files' directories changes; elsewhere, or with
+    inotify=False, it polls every `interval` seconds.  Either way the file stamps
+    decide what gets reloaded, so atomic replacements (write + rename, as done by
+    secureconfig.rotate) are picked up too.
+
+    ConfigWatcher watches .ini files (as read by SecureConfigParser); JsonWatcher
+    watches SecureJson files, plain, encrypted or lazy containers.
+'''
+
+# inotify event mask: anything that may change a file, or replace it by rename.
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+_IN_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# a default_section name no real file uses, so that [DEFAULT] parses as an
+# ordinary section and defaults can be merged across files (see ConfigWatcher).
+_NO_DEFAULT = '\0'
+
+
+class _Inotify(object):
+    """minimal inotify binding, used only to wake the watcher up early."""
+
+    def __init__(self, directories):
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        for directory in directories:
+            if self._libc.inotify_add_watch(self.fd, os.fsencode(directory), _IN_MASK) < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), 'inotify_add_watch failed for %s' % directory)
+
+    def wait(self, timeout):
+        """blocks until something changes or timeout seconds pass."""
+        import select
+        if select.select([self.fd], [], [], timeout)[0]:
+            try:
+                while os.read(self.fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ConfigWatcher(cryptkeeper_access_methods):
+    """Watches one or more .ini files and keeps .snapshot, a plain dict of
+        {section: {option: value}} with every encrypted value decrypted (as
+        SecureConfigParser.items_decrypted() returns), up to date.
+
+        Files are merged in order, as ConfigParser.read() does; [DEFAULT] options
+        show through in every section.  .snapshot is replaced, never modified, so
+        hold on to it to read several values consistently.
+
+        :param filepaths:  path or list of paths to watch (missing files count as empty)
+        :param ck:         CryptKeeper object (default: None, values read as they are)
+        :param interval:   seconds between checks when polling (default: 1.0)
+        :param inotify:    wake up on inotify events where available (default: True)
+        :param workers:    decrypt changed values over a pool of this many threads
+                           (or processes, if processes=True); see secureconfig.parallel
+        :param on_error:   on_error(watcher, path, exception) is called when a changed
+                           file fails to load (default: None; see .errors)
+    """
+
+    def __init__(self, filepaths, ck=None, interval=1.0, inotify=True, workers=None, processes=False,
+                 on_error=None):
+        if isinstance(filepaths, str):
+            filepaths = [filepaths]
+        self.filepaths = list(filepaths)
+        self.ck = ck
+        self.interval = interval
+        self.inotify = inotify
+        self.workers = workers
+        self.processes = processes
+        self.on_error = on_error
+
+        # path -> last exception loading it, for files currently failing to load.
+        self.errors = {}
+        self.snapshot = {}
+
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        # per path: file stamp and {unit: raw} as last loaded; merged across files,
+        # {unit: raw} and {unit: value}.  A unit is whatever a subclass diffs by.
+        self._stamps = {}
+        self._units = dict((path, {}) for path in self.filepaths)
+        self._merged = {}
+        self._values = {}
+
+        self.check()
+        if self.errors:
+            # a watcher that can't load its files to begin with is of no use.
+            raise list(self.errors.values())[0]
+
+    # subclass hooks
+
+    def _parse(self, path, data):
+        """returns {(section, option): raw value} for file contents data."""
+        parser = ConfigParser(interpolation=None, default_section=_NO_DEFAULT)
+        parser.read_string(data.decode(), source=path)
+        return dict(((sec, key), val) for sec in parser.sections()
+                    for key, val in parser.items(sec, raw=True))
+
+    def _decode(self, units):
+        """returns {unit: value} for {unit: raw}, decrypting in batches per cipher."""
+        values = {}
+        pending = {}
+        split_sigil = self.ck.split_sigil if self.ck else None
+        for unit, raw in units.items():
+            found = split_sigil(raw) if split_sigil and raw else None
+            if found:
+                pending.setdefault(found[0], []).append((unit, found[1]))
+            else:
+                values[unit] = raw
+        for cipher, batch in pending.items():
+            tokens = [token for (_, token) in batch]
+            for (unit, _), val in zip(batch, decrypt_tokens(self.ck, tokens, self.workers, self.processes, cipher)):
+                values[unit] = val
+        return values
+
+    def _assemble(self, values):
+        """returns the snapshot for {unit: value}."""
+        snapshot = {}
+        for (sec, key), val in values.items():
+            snapshot.setdefault(sec, {})[key] = val
+        defaults = snapshot.pop('DEFAULT', {})
+        if defaults:
+            for sec, options in snapshot.items():
+                snapshot[sec] = dict(defaults, **options)
+        return snapshot
+
+    # reading
+
+    def get(self, section, option, default=None):
+        """returns the current value of option in section, or default."""
+        return self.snapshot.get(section, {}).get(option, default)
+
+    def sections(self):
+        return list(self.snapshot.keys())
+
+    def subscribe(self, callback):
+        """call callback(watcher, changed) after every reload that changed something;
+        changed is a sorted list of the units -- (section, option) for ConfigWatcher,
+        section names for JsonWatcher -- that changed, appeared or disappeared."""
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    # reloading
+
+    def _load(self, path):
+        try:
+            with open(path, 'rb') as fh:
+                data = fh.read()
+                fh.close()
+        except FileNotFoundError:
+            return {}
+        return self._parse(path, data)
+
+    def check(self):
+        """reloads whichever files have changed since the last check; returns the
+        list of changed units (empty if nothing changed)."""
+        with self._lock:
+            fresh = {}
+            for path in self.filepaths:
+                stamp = _file_stamp(path)
+                if path in self._stamps and self._stamps[path] == stamp:
+                    continue
+                try:
+                    fresh[path] = (stamp, self._load(path))
+                except Exception as exc:
+                    self._failed(path, exc)
+            if not fresh:
+                return []
+
+            merged = {}
+            for path in self.filepaths:
+                merged.update(fresh[path][1] if path in fresh else self._units[path])
+            changed = dict((unit, raw) for unit, raw in merged.items() if self._merged.get(unit, self) != raw)
+            removed = [unit for unit in self._merged if unit not in merged]
+
+            # decrypt before touching any state, so a failure leaves it all as it was
+            # (and the files are tried again next time).
+            try:
+                decoded = self._decode(changed)
+            except Exception as exc:
+                for path in fresh:
+                    self._failed(path, exc)
+                return []
+
+            for path, (stamp, units) in fresh.items():
+                self._stamps[path] = stamp
+                self._units[path] = units
+                self.errors.pop(path, None)
+            if not changed and not removed:
+                return []
+
+            values = dict((unit, val) for unit, val in self._values.items() if unit in merged)
+            values.update(decoded)
+            self._merged, self._values = merged, values
+            self.snapshot = self._assemble(values)
+
+        changed = sorted(list(changed) + removed)
+        for callback in list(self._subscribers):
+            callback(self, changed)
+        return changed
+
+    def _failed(self, path, exc):
+        self.errors[path] = exc
+        if self.on_error:
+            self.on_error(self, path, exc)
+
+    # background thread
+
+    def start(self):
+        """starts checking for changes in a background (daemon) thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='secureconfig-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """stops the background thread started by start()."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _open_inotify(self):
+        if not self.inotify:
+            return None
+        directories = set(os.path.dirname(os.path.abspath(path)) for path in self.filepaths)
+        try:
+            return _Inotify(sorted(directories))
+        except (OSError, AttributeError):
+            # not Linux, no libc symbol, or out of watches: poll instead.
+            return None
+
+    def _run(self):
+        notifier = self._open_inotify()
+        try:
+            while not self._stop.is_set():
+                if notifier is None:
+                    self._stop.wait(self.interval)
+                else:
+                    notifier.wait(self.interval)
+                if self._stop.is_set():
+                    break
+                try:
+                    self.check()
+                except Exception as exc:
+                    # a failing subscriber mustn't stop the watching.
+                    if self.on_error:
+                        self.on_error(self, None, exc)
+        finally:
+            if notifier is not None:
+                notifier.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class JsonWatcher(ConfigWatcher):
+    """Watches SecureJson files and keeps .snapshot, a plain dict of the (merged)
+        top-level sections, up to date.
+
+        Lazy containers are diffed by section token, so only changed sections are
+        decrypted.  Whole-file tokens and envelopes have to be decrypted entirely
+        whenever they change, but sections that come out unchanged keep their old
+        objects and aren't reported as changed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        # path -> (index token, section names) of the lazy containers last seen.
+        self._indexes = {}
+        super(JsonWatcher, self).__init__(*args, **kwargs)
+
+    def _parse(self, path, data):
+        from .securejson import SecureJson, check_container
+        container = SecureJson._parse_container(data) if self.ck else None
+        if container is not None:
+            index_token, names = self._indexes.get(path, (None, None))
+            if index_token != container['index']:
+                names = loads(self.ck.decrypt_bytes(container['index']))
+                self._indexes[path] = (container['index'], names)
+            check_container(names, container['sections'])
+            return dict((name, ('token', (pos, token)))
+                        for pos, (name, token) in enumerate(zip(names, container['sections'])))
+
+        plain = self.ck.decrypt_bytes(data) if self.ck else data
+        plain = compression.decompress(plain)[1]
+        cfg = serializers.loads(plain, SecureJson.default_serializer)[0]
+        return dict((name, ('value', val)) for name, val in cfg.items())
+
+    def _decode(self, units):
+        from .securejson import open_section
+        values = {}
+        for name, (kind, raw) in units.items():
+            values[name] = open_section(self.ck, raw[0], raw[1], name)[0] if kind == 'token' else raw
+        return values
+
+    def _assemble(self, values):
+        return dict(values)
+
+    def get(self, section, param, default=None):
+        """returns snapshot[section][param], or default."""
+        try:
+            return self.snapshot[section][param]
+        except (KeyError, TypeError, IndexError):
+            return default
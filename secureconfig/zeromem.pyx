@@ -1,5 +1,10 @@
 from libc.string cimport memset
 
 def zeromem(x):
-	memset(<char*> x, 0, len(x))
-
+	cdef unsigned char[::1] view
+	if isinstance(x, bytes):
+		memset(<char*> x, 0, len(x))
+	elif len(x):
+		# bytearray, mmap, writable memoryview...
+		view = x
+		memset(&view[0], 0, view.shape[0])
@@ -35,12 +35,16 @@ class sdist(_sdist):
 
 cmdclass['sdist'] = sdist
 
+# zeromem builds anywhere; memlock (mlock, mprotect: SecureBuffer, SharedConfig)
+# needs POSIX.
+extensions = ['zeromem'] + (['memlock'] if os.name == 'posix' else [])
+source_ext = '.pyx' if use_cython else '.c'
+
 if use_cython:
-    ext_modules += [Extension('secureconfig.zeromem', sources=['secureconfig/zeromem.pyx']), ]
     cmdclass.update({'build_ext': build_ext})
     print(cmdclass)
-else:
-    ext_modules += [Extension('secureconfig.zeromem', sources=['secureconfig/zeromem.c']), ]
+ext_modules += [Extension('secureconfig.%s' % name, sources=['secureconfig/%s%s' % (name, source_ext)])
+                for name in extensions]
 
 
 # Version info -- read without importing
@@ -68,6 +72,9 @@ setup(
     license="MIT",
     zip_safe=True,
     packages=find_packages(),
+    entry_points={
+        'console_scripts': ['secureconfig-rotate = secureconfig.rotate:main'],
+    },
     install_requires=[
         'cryptography',
         'configparser',
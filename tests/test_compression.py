@@ -0,0 +1,78 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from secureconfig import SecureConfig, SecureJson
+from secureconfig import compression
+from secureconfig.cryptkeeper import CryptKeeper
+from secureconfig.utils import decrypt_file, encrypt_file
+
+TEST_KEYSTRING = 'sFbO-GbipIFIpj64S2_AZBIPBvX80Yozszw7PR2dVFg='
+
+TEST_CFG = dict(('section%d' % i, {'username': 'some_user', 'password': 'lame_password'}) for i in range(100))
+
+
+def _methods():
+    methods = ['zlib', 'lzma']
+    try:
+        compression.compress(b'', 'zstd')
+        methods.append('zstd')
+    except ImportError:
+        pass
+    return methods
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.ck = CryptKeeper(key=TEST_KEYSTRING)
+
+    def test_roundtrip(self):
+        for method in _methods():
+            data = compression.compress(json.dumps(TEST_CFG), method)
+            self.assertTrue(data.startswith(b'\0cz:' + method.encode() + b'\n'))
+            self.assertEqual(compression.decompress(data), (method, json.dumps(TEST_CFG).encode()))
+        self.assertEqual(compression.decompress(b'{}'), (None, b'{}'))
+        self.assertRaises(ValueError, compression.compress, b'', 'nosuch')
+
+    def test_config_write(self):
+        for method in _methods():
+            sj = SecureJson(ck=self.ck, compress=method)
+            sj.cfg = dict(TEST_CFG)
+            buf = io.StringIO()
+            sj.write(buf)
+            token = buf.getvalue()
+            self.assertLess(len(token), len(self.ck.encrypt(json.dumps(TEST_CFG))) // 4)
+            # the compression header is part of the authenticated plaintext.
+            self.assertTrue(self.ck.decrypt_bytes(token).startswith(b'\0cz:'))
+
+            loaded = SecureJson(rawtxt=token, ck=self.ck)
+            self.assertEqual((loaded.cfg, loaded.compress), (TEST_CFG, method))
+            self.assertFalse(loaded.is_dirty())
+            loaded.set('section0', 'password', 'better_password')
+            loaded.write(io.StringIO())
+            self.assertTrue(self.ck.decrypt_bytes(loaded._clean[2]).startswith(b'\0cz:'))
+
+        sc = SecureConfig(ck=self.ck, compress='zlib', serializer='binary', envelope=True)
+        sc.cfg = dict(TEST_CFG)
+        buf = io.BytesIO()
+        sc.write(buf)
+        self.assertEqual(SecureConfig(rawtxt=buf.getvalue(), ck=self.ck).cfg, TEST_CFG)
+
+    def test_encrypt_file(self):
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'w') as fh:
+            fh.write(json.dumps(TEST_CFG))
+        self.addCleanup(os.remove, path)
+        self.addCleanup(os.remove, path + '.enc')
+
+        encrypt_file(self.ck, path, path + '.enc', compress='zlib')
+        self.assertLess(os.path.getsize(path + '.enc'), os.path.getsize(path) // 4)
+        self.assertEqual(json.loads(decrypt_file(self.ck, path + '.enc')), TEST_CFG)
+        self.assertEqual(SecureJson(filepath=path + '.enc', ck=self.ck).cfg, TEST_CFG)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -60,6 +60,224 @@ class TestCryptKeeper(unittest.TestCase):
             fh.close()
         assert(file_ck.key == tmp)
 
+    def test_FileCK_async_create(self):
+        import asyncio
+
+        async def roundtrip():
+            ck = await AsyncFileCryptKeeper.create(TEST_KEYFILE_PATH)
+            return ck, await ck.adecrypt(await ck.aencrypt('test string'))
+
+        ck, result = asyncio.run(roundtrip())
+        self.assertEqual(ck.key, self.file_ck.key)
+        self.assertEqual(result, 'test string')
+
+    def test_registry_reuses_file_ck_until_file_changes(self):
+        registry = KeyRegistry()
+        ck = registry.from_file(TEST_KEYFILE_PATH)
+        self.assertTrue(registry.from_file(TEST_KEYFILE_PATH) is ck)
+
+        st = os.stat(TEST_KEYFILE_PATH)
+        os.utime(TEST_KEYFILE_PATH, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        ck2 = registry.from_file(TEST_KEYFILE_PATH)
+        self.assertFalse(ck2 is ck)
+        self.assertEqual(ck2.key, ck.key)
+
+    def test_registry_env_and_key(self):
+        registry = KeyRegistry()
+        os.environ['REGISTRY_TEST_KEY'] = TEST_KEYSTRING
+        ck = registry.from_env('REGISTRY_TEST_KEY')
+        self.assertTrue(registry.from_env('REGISTRY_TEST_KEY') is ck)
+        os.environ['REGISTRY_TEST_KEY'] = TEST_KEYSTRING_WRONG
+        self.assertEqual(registry.from_env('REGISTRY_TEST_KEY').key, TEST_KEYSTRING_WRONG)
+
+        ck = registry.from_key(TEST_KEYSTRING)
+        self.assertTrue(registry.from_key(TEST_KEYSTRING) is ck)
+        self.assertFalse(registry.from_key(TEST_KEYSTRING_WRONG) is ck)
+        registry.discard(ck)
+        self.assertFalse(registry.from_key(TEST_KEYSTRING) is ck)
+
+    def test_registry_key_rotated_while_building(self):
+        registry = KeyRegistry(max_entries=2)
+        os.environ['REGISTRY_TEST_KEY'] = TEST_KEYSTRING
+
+        def build():
+            # the key changes after the CryptKeeper has read the old one.
+            ck = EnvCryptKeeper('REGISTRY_TEST_KEY')
+            os.environ['REGISTRY_TEST_KEY'] = TEST_KEYSTRING_WRONG
+            return ck
+
+        stamp = lambda: os.environ['REGISTRY_TEST_KEY']
+        self.assertEqual(registry._lookup(('env', 'REGISTRY_TEST_KEY', ()), stamp, build).key, TEST_KEYSTRING)
+        self.assertEqual(registry.from_env('REGISTRY_TEST_KEY').key, TEST_KEYSTRING_WRONG)
+
+        for key in (TEST_KEYSTRING, TEST_KEYSTRING_WRONG, TEST_KEYSTRING):
+            registry.from_key(key)
+        self.assertEqual(len(registry), 2)
+
+    def test_stream_roundtrip(self):
+        import io
+        for size in (0, 1, 100, 4096, 10000):
+            plain = os.urandom(size)
+            enc = io.BytesIO()
+            self.string_ck.encrypt_stream(io.BytesIO(plain), enc, chunk_size=1024)
+            dec = io.BytesIO()
+            self.string_ck.decrypt_stream(io.BytesIO(enc.getvalue()), dec)
+            self.assertEqual(dec.getvalue(), plain)
+
+    def test_stream_tampering_raises_InvalidToken(self):
+        import io
+        enc = io.BytesIO()
+        self.string_ck.encrypt_stream(io.BytesIO(b'x' * 5000), enc, chunk_size=1024)
+        buf = enc.getvalue()
+
+        flipped = bytearray(buf)
+        flipped[100] ^= 1
+        truncated = buf[:-(904 + 16 + 4)]
+        for bad in (bytes(flipped), truncated, buf + b'extra'):
+            self.assertRaises(InvalidToken, self.string_ck.decrypt_stream, io.BytesIO(bad), io.BytesIO())
+        self.assertRaises(InvalidToken, self.string_ck_wrong.decrypt_stream, io.BytesIO(buf), io.BytesIO())
+
+    def test_decrypt_file_stream_keeps_outfile_on_failure(self):
+        import shutil, tempfile
+        from secureconfig.utils import decrypt_file_stream, encrypt_file_stream
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        plain, enc, out = [os.path.join(tmpdir, name) for name in ('plain', 'plain.enc', 'out')]
+        with open(plain, 'wb') as fh:
+            fh.write(b'z' * 5000)
+        with open(out, 'wb') as fh:
+            fh.write(b'existing')
+        encrypt_file_stream(self.string_ck, plain, enc, chunk_size=1024)
+
+        self.assertRaises(IOError, decrypt_file_stream, self.string_ck, enc + '.missing', out)
+        self.assertRaises(InvalidToken, decrypt_file_stream, self.string_ck_wrong, enc, out)
+        with open(out, 'rb') as fh:
+            self.assertEqual(fh.read(), b'existing')
+        self.assertEqual(sorted(os.listdir(tmpdir)), ['out', 'plain', 'plain.enc'])
+
+        decrypt_file_stream(self.string_ck, enc, out)
+        with open(out, 'rb') as fh:
+            self.assertEqual(fh.read(), b'z' * 5000)
+
+    def test_decrypt_buffer_matches_decrypt(self):
+        for size in (0, 15, 16, 17, 100000):
+            token = self.string_ck.encrypt('x' * size)
+            self.assertEqual(self.string_ck.decrypt_buffer(memoryview(token.encode())), bytearray(b'x' * size))
+            self.assertEqual(self.string_ck.decrypt_bytes(token.encode()), b'x' * size)
+        self.assertRaises(InvalidToken, self.string_ck_wrong.decrypt_buffer, token.encode())
+        self.assertRaises(InvalidToken, self.string_ck.decrypt_buffer, token.encode()[:-4])
+
+    def test_bytes_api_roundtrip(self):
+        for plain in (b'', b'secret', bytearray(b'x' * 1000), memoryview(b'blob' * 50000)):
+            token = self.string_ck.encrypt_bytes(plain)
+            self.assertTrue(isinstance(token, bytes))
+            self.assertEqual(self.string_ck.decrypt_bytes(token), bytes(plain))
+            self.assertEqual(self.string_ck.decrypt(self.string_ck.encrypt(bytes(plain))), bytes(plain).decode())
+
+    def test_decrypt_into(self):
+        for size in (1, 16, 1000, 200001):
+            plain = os.urandom(size)
+            token = self.string_ck.encrypt_bytes(plain)
+            # exactly-sized buffers take the windowed path, roomy ones decrypt in place.
+            for out in (bytearray(size), bytearray(size + 100)):
+                self.assertEqual(self.string_ck.decrypt_into(token, out), size)
+                self.assertEqual(bytes(out[:size]), plain)
+            self.assertRaises(ValueError, self.string_ck.decrypt_into, token, bytearray(size - 1))
+        self.assertRaises(InvalidToken, self.string_ck_wrong.decrypt_into, token, bytearray(size))
+
+    def test_aead_ciphers_roundtrip(self):
+        fernet_token = self.string_ck.encrypt('test string')
+        for cipher in ('AESGCM', 'CHACHA20'):
+            ck = CryptKeeper(key=TEST_KEYSTRING, cipher=cipher)
+            self.assertEqual(ck.sigil, 'CK_%s::' % cipher)
+            token = ck.encrypt('test string')
+            self.assertEqual(ck.decrypt(token), 'test string')
+            # tokens say which cipher made them; Fernet data keeps decrypting.
+            self.assertEqual(self.string_ck.decrypt(token), 'test string')
+            self.assertEqual(ck.decrypt(fernet_token), 'test string')
+            self.assertRaises(InvalidToken, ck.decrypt_bytes, fernet_token, cipher)
+            self.assertRaises(InvalidToken, CryptKeeper(key=TEST_KEYSTRING_WRONG, cipher=cipher).decrypt, token)
+            tampered = token[:-2] + ('A' if token[-2] != 'A' else 'B') + token[-1]
+            self.assertRaises(InvalidToken, ck.decrypt, tampered)
+        self.assertRaises(ValueError, CryptKeeper, key=TEST_KEYSTRING, cipher='ROT13')
+
+    def test_envelope(self):
+        for cipher in ('FERNET', 'AESGCM', 'CHACHA20'):
+            ck = CryptKeeper(key=TEST_KEYSTRING, cipher=cipher)
+            plain = os.urandom(1000)
+            blob = ck.encrypt_envelope(plain)
+            self.assertEqual(len(blob), len(plain) + 33)
+            self.assertEqual(self.string_ck.decrypt_envelope(blob), plain)
+            self.assertEqual(self.string_ck.decrypt_bytes(blob), plain)
+            self.assertEqual(bytes(self.string_ck.decrypt_buffer(memoryview(blob))), plain)
+            self.assertRaises(InvalidToken, self.string_ck_wrong.decrypt_envelope, blob)
+            self.assertRaises(InvalidToken, ck.decrypt_envelope, blob[:-1])
+
+    def test_encrypt_many(self):
+        values = ['', 'x', 'test string', 'y' * 1000, '\xe4' * 16]
+        for cipher in ('FERNET', 'AESGCM', 'CHACHA20'):
+            ck = CryptKeeper(key=TEST_KEYSTRING, cipher=cipher)
+            tokens = ck.encrypt_many(iter(values))
+            self.assertEqual(len(set(tokens)), len(values))
+            # interchangeable with single-value tokens, in both directions.
+            self.assertEqual([ck.decrypt(token) for token in tokens], values)
+            self.assertEqual(self.string_ck.decrypt_many(tokens), values)
+            self.assertEqual(ck.decrypt_many([ck.encrypt(value) for value in values]), values)
+            self.assertRaises(InvalidToken, self.string_ck_wrong.decrypt_many, tokens)
+        self.assertEqual(self.string_ck.decrypt_many([]), [])
+
+        # mixed ciphers and envelopes, in order.
+        mixed = [self.string_ck.encrypt('a'), CryptKeeper(key=TEST_KEYSTRING, cipher='AESGCM').encrypt('b'),
+                 self.string_ck.encrypt_envelope(b'c')]
+        self.assertEqual(self.string_ck.decrypt_many(mixed), ['a', 'b', 'c'])
+
+        token = tokens[2]
+        tampered = token[:-2] + ('A' if token[-2] != 'A' else 'B') + token[-1]
+        self.assertRaises(InvalidToken, self.string_ck.decrypt_many, [tokens[0], tampered])
+        self.assertRaises(InvalidToken, self.string_ck.decrypt_many, [self.string_ck.encrypt('x')[:-4]])
+
+        multi = MultiCryptKeeper(TEST_KEYSTRING_WRONG, self.string_ck)
+        self.assertEqual(multi.decrypt_many([self.string_ck.encrypt('old'), multi.encrypt('new')]), ['old', 'new'])
+        self.assertEqual(self.string_ck_wrong.decrypt_many(multi.encrypt_many(['new'])), ['new'])
+
+    def test_multi_ck_routes_by_key_id(self):
+        multi = MultiCryptKeeper(TEST_KEYSTRING_WRONG, self.string_ck)
+        self.assertEqual(multi.key_id, self.string_ck_wrong.key_id)
+        self.assertEqual(multi.sigil, 'CK_FERNET.%s::' % multi.key_id)
+
+        # keyed sigils name the key, so only that key is tried.
+        for ck in (self.string_ck, self.string_ck_wrong):
+            val = 'CK_AESGCM.%s::' % ck.key_id + CryptKeeper(key=ck.key, cipher='AESGCM').encrypt('secret')
+            cipher, token = multi.split_sigil(val)
+            self.assertEqual(cipher, 'AESGCM.' + ck.key_id)
+            self.assertEqual(multi.decrypt_bytes(token, cipher), b'secret')
+            self.assertEqual(ck.decrypt_bytes(token, cipher), b'secret')
+        self.assertRaises(InvalidToken, self.string_ck.decrypt_bytes, token, cipher)
+        self.assertRaises(InvalidToken, multi.decrypt_bytes, token, 'AESGCM.00000000')
+
+        # untagged tokens fall back to trying each key.
+        self.assertEqual(multi.decrypt(self.string_ck.encrypt('old')), 'old')
+        self.assertEqual(self.string_ck_wrong.decrypt(multi.encrypt('new')), 'new')
+        self.assertRaises(InvalidToken, MultiCryptKeeper(TEST_KEYSTRING_WRONG).decrypt, self.string_ck.encrypt('old'))
+
+    def test_multi_ck_envelopes_and_key_sources(self):
+        import io
+        multi = MultiCryptKeeper(self.file_ck, self.env_ck, TEST_KEYSTRING)
+        self.assertEqual(multi.keys, (self.file_ck.key, self.env_ck.key, TEST_KEYSTRING))
+
+        blob = multi.encrypt_envelope(b'x' * 100)
+        self.assertEqual(blob[:4], b'CKKI')
+        self.assertEqual(multi.decrypt_bytes(blob), b'x' * 100)
+        self.assertEqual(self.file_ck.decrypt_envelope(blob), b'x' * 100)
+        self.assertRaises(InvalidToken, self.env_ck.decrypt_envelope, blob)
+        self.assertEqual(multi.decrypt_envelope(self.string_ck.encrypt_envelope(b'old')), b'old')
+
+        enc = io.BytesIO()
+        self.string_ck.encrypt_stream(io.BytesIO(b'y' * 5000), enc, chunk_size=1024)
+        dec = io.BytesIO()
+        multi.decrypt_stream(io.BytesIO(enc.getvalue()), dec)
+        self.assertEqual(dec.getvalue(), b'y' * 5000)
+
     def test_StringCK_key_eq_key(self):
         self.assertEqual(self.string_ck.key, TEST_KEYSTRING)
     
@@ -0,0 +1,68 @@
+import os
+import unittest
+
+from secureconfig import instrument, SecureJson
+from secureconfig.cryptkeeper import CryptKeeper
+from secureconfig.secureconfigparser import SecureConfigParser
+
+CWD = os.path.dirname(os.path.realpath(__file__))
+
+TEST_KEYSTRING = 'sFbO-GbipIFIpj64S2_AZBIPBvX80Yozszw7PR2dVFg='
+TEST_JSON_OUTFILE = os.path.join(CWD, 'instrument_test.json.enc')
+
+
+class TestInstrument(unittest.TestCase):
+
+    def setUp(self):
+        self.events = []
+        self.collector = instrument.HistogramCollector()
+        instrument.add_observer(self.collector)
+        instrument.add_observer(self.record)
+
+    def tearDown(self):
+        instrument.remove_observer(self.collector)
+        instrument.remove_observer(self.record)
+        if os.path.exists(TEST_JSON_OUTFILE):
+            os.remove(TEST_JSON_OUTFILE)
+
+    def record(self, event, duration, size):
+        self.events.append((event, duration, size))
+
+    def test_crypto_events(self):
+        ck = CryptKeeper(key=TEST_KEYSTRING)
+        token = ck.encrypt('x' * 100)
+        ck.decrypt(token)
+
+        names = [event for (event, _, _) in self.events]
+        self.assertEqual(names, ['ck.load', 'ck.init', 'encrypt', 'decrypt'])
+        self.assertEqual(self.events[2][2], 100)
+        self.assertEqual(self.events[3][2], len(token))
+        self.assertTrue(all(duration >= 0 for (_, duration, _) in self.events))
+
+    def test_read_and_cache_events(self):
+        ck = CryptKeeper(key=TEST_KEYSTRING)
+        with open(TEST_JSON_OUTFILE, 'w') as fh:
+            fh.write(ck.encrypt('{"a": {"b": "c"}}'))
+        SecureJson(filepath=TEST_JSON_OUTFILE, ck=ck)
+
+        scfg = SecureConfigParser(ck=ck, cache_size=2)
+        scfg.add_section('s')
+        scfg.raw_set('s', 'k', ck.sigil + ck.encrypt('v'))
+        scfg.get('s', 'k')
+        scfg.get('s', 'k')
+
+        stats = self.collector.dump()
+        self.assertEqual(stats['read']['count'], 1)
+        self.assertEqual(stats['read']['bytes'], os.path.getsize(TEST_JSON_OUTFILE))
+        self.assertEqual(stats['cache.miss']['count'], 1)
+        self.assertEqual(stats['cache.hit']['count'], 1)
+        self.assertTrue('decrypt' in self.collector.format())
+
+    def test_no_events_without_observers(self):
+        instrument.remove_observer(self.record)
+        CryptKeeper(key=TEST_KEYSTRING).encrypt('x')
+        self.assertEqual(self.events, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
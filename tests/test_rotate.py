@@ -0,0 +1,161 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from cryptography.fernet import InvalidToken
+
+from secureconfig import SecureConfigParser, SecureJson
+from secureconfig.cryptkeeper import CryptKeeper, MultiCryptKeeper
+from secureconfig.rotate import main, rotate_data, rotate_tree
+
+TEST_KEYSTRING = 'sFbO-GbipIFIpj64S2_AZBIPBvX80Yozszw7PR2dVFg='
+TEST_KEYSTRING_NEW = 'UCPUOddzvewGWaJxW1ZlPKftdlS9SCUjwYUYwov0bT0='
+
+TEST_INI = '''# database settings
+[database]
+username = some_user
+password = %s
+token = %s
+'''
+
+
+class TestRotate(unittest.TestCase):
+
+    def setUp(self):
+        self.old_ck = CryptKeeper(key=TEST_KEYSTRING)
+        self.new_ck = CryptKeeper(key=TEST_KEYSTRING_NEW)
+        self.tmpdir = tempfile.mkdtemp()
+
+        chacha = CryptKeeper(key=TEST_KEYSTRING, cipher='CHACHA20')
+        self.write('app.ini', TEST_INI % (self.old_ck.sigil + self.old_ck.encrypt('lame_password'),
+                                          chacha.sigil + chacha.encrypt('some_token')))
+        self.write('app.json.enc', self.old_ck.encrypt(json.dumps({'db': {'password': 'secret'}})))
+        sj = SecureJson(ck=self.old_ck, lazy=True)
+        sj.cfg = {'a': {'x': 1}, 'b': {'y': 2}}
+        fh = io.StringIO()
+        sj.write(fh)
+        self.write(os.path.join('sub', 'lazy.json'), fh.getvalue())
+        self.write(os.path.join('sub', 'blob.enc'), self.old_ck.encrypt_envelope(b'{"s": {"k": "v"}}'), 'wb')
+        self.write('README', 'nothing to see here\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def path(self, name):
+        return os.path.join(self.tmpdir, name)
+
+    def write(self, name, data, mode='w'):
+        if not os.path.isdir(os.path.dirname(self.path(name))):
+            os.makedirs(os.path.dirname(self.path(name)))
+        with open(self.path(name), mode) as fh:
+            fh.write(data)
+
+    def read(self, name):
+        with open(self.path(name)) as fh:
+            return fh.read()
+
+    def assert_new_key(self):
+        scfg = SecureConfigParser(ck=self.new_ck)
+        scfg.read(self.path('app.ini'))
+        self.assertEqual(scfg.get('database', 'password'), 'lame_password')
+        self.assertEqual(scfg.get('database', 'token'), 'some_token')
+        self.assertEqual(SecureJson(filepath=self.path('app.json.enc'), ck=self.new_ck).cfg['db']['password'], 'secret')
+        self.assertEqual(SecureJson(filepath=self.path('sub/lazy.json'), ck=self.new_ck).get('b', 'y'), 2)
+        self.assertEqual(SecureJson(filepath=self.path('sub/blob.enc'), ck=self.new_ck).cfg, {'s': {'k': 'v'}})
+
+    def test_rotate_tree(self):
+        for workers in (None, 2):
+            report = rotate_tree(self.tmpdir, self.old_ck, self.new_ck, workers=workers)
+            self.assert_new_key()
+            if workers is None:
+                self.assertEqual(len(report.rotated), 4)
+                self.assertEqual(report.values, 7)
+            else:
+                # second run: everything already under the new key.
+                self.assertEqual(len(report.current), 4)
+                self.assertEqual(report.values, 0)
+            self.assertEqual([r['path'] for r in report.skipped], [self.path('README')])
+            self.assertFalse(report.failed)
+
+        ini = self.read('app.ini')
+        self.assertTrue(ini.startswith('# database settings'))
+        self.assertTrue('CK_CHACHA20::' in ini)
+
+    def test_rotate_tree_processes_keep_custom_sigil(self):
+        old_ck = CryptKeeper(key=TEST_KEYSTRING, sigil='SECRET::')
+        new_ck = CryptKeeper(key=TEST_KEYSTRING_NEW, sigil='SECRET::')
+        paths = [self.path('a.ini'), self.path('b.ini')]
+        for path in paths:
+            self.write(path, TEST_INI % (old_ck.sigil + old_ck.encrypt('lame_password'), 'plain'))
+        report = rotate_tree(paths, old_ck, new_ck, workers=2, processes=True)
+        self.assertEqual(len(report.rotated), 2)
+        scfg = SecureConfigParser(ck=new_ck)
+        scfg.read(paths)
+        self.assertEqual(scfg.get('database', 'password'), 'lame_password')
+
+    def test_rotate_journal_and_dry_run(self):
+        journal = self.path('rotate.journal')
+        report = rotate_tree(self.tmpdir, self.old_ck, self.new_ck, dry_run=True, journal=journal)
+        self.assertEqual(len(report.rotated), 4)
+        self.assertFalse(os.path.exists(journal))
+        self.assertEqual(self.old_ck.decrypt(self.read('app.json.enc')), json.dumps({'db': {'password': 'secret'}}))
+
+        rotate_tree(self.tmpdir, self.old_ck, self.new_ck, journal=journal, exclude=['*.journal'])
+        report = rotate_tree(self.tmpdir, self.old_ck, self.new_ck, journal=journal, exclude=['*.journal'])
+        self.assertEqual(report.journaled, 5)
+        self.assertEqual(report.files, 0)
+
+    def test_rotate_wrong_key_fails_untouched(self):
+        other = CryptKeeper(key=CryptKeeper.generate_key())
+        before = self.read('app.ini')
+        report = rotate_tree(self.path('app.ini'), other, self.new_ck)
+        self.assertEqual(len(report.failed), 1)
+        self.assertEqual(self.read('app.ini'), before)
+        self.assertRaises(InvalidToken, rotate_data, before.encode(), other, self.new_ck)
+
+    def test_rotate_keyed_sigils(self):
+        old_ck, new_ck = MultiCryptKeeper(self.old_ck), MultiCryptKeeper(self.new_ck, self.old_ck)
+        text = TEST_INI % (old_ck.sigil + old_ck.encrypt('lame_password'), 'plain')
+        kind, new, count = rotate_data(text.encode(), old_ck, new_ck)
+        self.assertEqual((kind, count), ('values', 1))
+        self.assertIn(new_ck.sigil, new.decode())
+        self.assertNotIn(old_ck.sigil, new.decode())
+
+        scfg = SecureConfigParser(ck=self.new_ck)
+        scfg.read_string(new.decode())
+        self.assertEqual(scfg.get('database', 'password'), 'lame_password')
+
+    def test_rotate_keyed_sigils_with_plain_keepers(self):
+        # as from the command line: keyed sigils are matched whichever keepers rotate them.
+        keyed = MultiCryptKeeper(self.old_ck)
+        text = TEST_INI % (keyed.sigil + keyed.encrypt('lame_password'), 'plain')
+        self.write('keyed.ini', text)
+        report = rotate_tree(self.path('keyed.ini'), self.old_ck, self.new_ck)
+        self.assertEqual(len(report.rotated), 1)
+        self.assertNotIn(keyed.sigil, self.read('keyed.ini'))
+
+        scfg = SecureConfigParser(ck=self.new_ck)
+        scfg.read(self.path('keyed.ini'))
+        self.assertEqual(scfg.get('database', 'password'), 'lame_password')
+
+        # values whose sigil names the new key are already current, not skipped.
+        current = MultiCryptKeeper(self.new_ck)
+        self.write('keyed.ini', TEST_INI % (current.sigil + current.encrypt('lame_password'), 'plain'))
+        report = rotate_tree(self.path('keyed.ini'), self.old_ck, self.new_ck)
+        self.assertEqual(len(report.current), 1)
+
+    def test_cli(self):
+        old_keyfile, new_keyfile = self.path('old.key'), os.path.join(tempfile.mkdtemp(dir=self.tmpdir), 'new.key')
+        self.write('old.key', TEST_KEYSTRING)
+        self.assertEqual(main([self.tmpdir, '--old-keyfile', old_keyfile, '--new-keyfile', new_keyfile, '-w', '2']), 0)
+        with open(new_keyfile) as fh:
+            self.new_ck = CryptKeeper(key=fh.read())
+        self.assert_new_key()
+        self.assertEqual(self.read('old.key'), TEST_KEYSTRING)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import gc
+import unittest
+
+from secureconfig import SecureBuffer
+from secureconfig.cryptkeeper import CryptKeeper, MultiCryptKeeper
+from secureconfig.memlock import SlotPool
+
+TEST_KEYSTRING = 'sFbO-GbipIFIpj64S2_AZBIPBvX80Yozszw7PR2dVFg='
+TEST_KEYSTRING_WRONG = 'UCPUOddzvewGWaJxW1ZlPKftdlS9SCUjwYUYwov0bT0='
+
+
+class TestSecureBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = SlotPool(64, 4)
+        self.addCleanup(self.pool.close)
+
+    def test_pool_slots(self):
+        nums = [self.pool.acquire() for _ in range(4)]
+        self.assertEqual(sorted(nums), [0, 1, 2, 3])
+        self.assertRaises(MemoryError, self.pool.acquire)
+
+        slot = self.pool.slot(nums[0])
+        slot[:6] = b'secret'
+        self.pool.release(nums[0])
+        self.assertEqual(bytes(slot), bytes(64))
+        self.assertRaises(ValueError, self.pool.release, nums[0])
+        self.assertEqual(self.pool.available(), 1)
+        self.assertEqual(self.pool.acquire(), nums[0])
+
+    def test_decrypt_into(self):
+        for cipher in ('FERNET', 'AESGCM'):
+            ck = CryptKeeper(key=TEST_KEYSTRING, cipher=cipher)
+            secret = SecureBuffer(pool=self.pool)
+            self.assertEqual(ck.decrypt_into(ck.encrypt('lame_password'), secret), 13)
+            self.assertEqual(len(secret), 13)
+            self.assertEqual(secret.view(), b'lame_password')
+            self.assertTrue(secret == 'lame_password')
+            self.assertFalse(secret == 'lame_passwore')
+            self.assertNotIn('lame', repr(secret))
+
+            slot = self.pool.slot(secret._num)
+            with secret:
+                self.assertEqual(secret.decode(), 'lame_password')
+            self.assertEqual(bytes(slot), bytes(64))
+            self.assertRaises(ValueError, secret.view)
+
+        multi = MultiCryptKeeper(TEST_KEYSTRING_WRONG, TEST_KEYSTRING)
+        with SecureBuffer(pool=self.pool) as secret:
+            multi.decrypt_into(ck.encrypt('old key'), secret)
+            self.assertEqual(secret.view(), b'old key')
+            self.assertRaises(ValueError, ck.decrypt_into, ck.encrypt('x' * 100), secret)
+
+    def test_slots_recycled(self):
+        for _ in range(20):
+            secret = SecureBuffer('hunter2', pool=self.pool)
+            secret.write(b'hunt')
+            self.assertEqual(secret.view(), b'hunt')
+            self.assertEqual(bytes(secret.writable()[:8]), b'hunt' + bytes(4))
+            del secret
+            gc.collect()
+        self.assertEqual(self.pool.available(), 4)
+        self.assertRaises(ValueError, SecureBuffer, 'x' * 65, pool=self.pool)
+
+
+if __name__ == '__main__':
+    unittest.main()
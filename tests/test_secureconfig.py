@@ -70,6 +70,269 @@ class TestSecureConfig(unittest.TestCase):
         sj = SecureJson.from_key(TEST_KEYSTRING, filepath=TEST_JSON_OUTFILE)
         self.assertTrue( type(sj.cfg)== type({}) )
 
+    def test_read_many_matches_single_reads(self):
+        paths = [TEST_JSON_OUTFILE] * 3
+        configs = SecureJson.read_many(paths, workers=2, ck=self.ck)
+        single = SecureJson.from_key(TEST_KEYSTRING, filepath=TEST_JSON_OUTFILE)
+        self.assertEqual(len(configs), 3)
+        for sj in configs:
+            self.assertEqual(sj.cfg, single.cfg)
+            # loaded just like a single read: unchanged, so written back as is.
+            self.assertFalse(sj.is_dirty())
+            self.assertEqual(sj._encrypt_changed(), open(TEST_JSON_OUTFILE).read())
+
+    def test_read_many_wrong_key_raises_InvalidToken(self):
+        self.assertRaises(InvalidToken, SecureJson.read_many, [TEST_JSON_OUTFILE] * 2,
+                          workers=2, ck=self.ck_wrong)
+
+    def test_aload_matches_load(self):
+        import asyncio
+
+        async def load_all():
+            return await asyncio.gather(*[SecureJson.aload(TEST_JSON_OUTFILE, ck=self.ck) for _ in range(3)])
+
+        single = SecureJson.from_key(TEST_KEYSTRING, filepath=TEST_JSON_OUTFILE)
+        for sj in asyncio.run(load_all()):
+            self.assertEqual(sj.cfg, single.cfg)
+
+    def test_read_with_mmap_matches_read(self):
+        sj = SecureJson(filepath=TEST_JSON_OUTFILE, ck=self.ck, use_mmap=True)
+        single = SecureJson.from_key(TEST_KEYSTRING, filepath=TEST_JSON_OUTFILE)
+        self.assertEqual(sj.cfg, single.cfg)
+
+    def test_read_with_mmap_writes_back(self):
+        import io, tempfile
+        ck = CryptKeeper(key=TEST_KEYSTRING, cipher='CHACHA20')
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        os.close(fd)
+        sj = SecureJson(filepath=TEST_JSON_OUTFILE, ck=ck, envelope=True, compress='zlib')
+        with open(path, 'wb') as fh:
+            sj.write(fh)
+        blob = open(path, 'rb').read()
+
+        loaded = SecureJson(filepath=path, ck=ck, use_mmap=True, readonly=False)
+        self.assertTrue(loaded.envelope)
+        self.assertEqual(loaded.compress, 'zlib')
+        fh = io.BytesIO()
+        loaded.write(fh)
+        self.assertEqual(fh.getvalue(), blob)
+
+        loaded.set('accessories', 'cat', 'scarf')
+        fh = io.BytesIO()
+        loaded.write(fh)
+        self.assertEqual(SecureJson(rawtxt=fh.getvalue(), ck=ck).get('accessories', 'cat'), 'scarf')
+
+    def test_read_with_mmap_wrong_key_raises_InvalidToken(self):
+        kwargs = {'filepath': TEST_JSON_OUTFILE, 'ck': self.ck_wrong, 'use_mmap': True}
+        self.assertRaises(InvalidToken, SecureJson, **kwargs)
+
+    def test_read_with_mmap_truncated_raises_InvalidToken(self):
+        import tempfile
+        token = open(TEST_JSON_OUTFILE).read()
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        os.close(fd)
+        for bad in (token[:-5], token[:-4], token[:-1] + '!'):
+            with open(path, 'w') as fh:
+                fh.write(bad)
+            self.assertRaises(InvalidToken, SecureJson, filepath=path, ck=self.ck, use_mmap=True)
+
+    def test_lazy_container_decrypts_only_touched_sections(self):
+        import io
+        sj = SecureJson.from_key(TEST_KEYSTRING, filepath=TEST_JSON_OUTFILE, lazy=True)
+        fh = io.StringIO()
+        sj.write(fh)
+
+        lazy = SecureJson(rawtxt=fh.getvalue(), ck=self.ck)
+        self.assertEqual(sorted(lazy.sections()), sorted(sj.sections()))
+        self.assertFalse(lazy.cfg.is_loaded('things'))
+        self.assertEqual(lazy.get('accessories', 'cat'), 'hat')
+        self.assertTrue(lazy.cfg.is_loaded('accessories'))
+        self.assertFalse(lazy.cfg.is_loaded('things'))
+
+        # untouched sections keep their tokens on rewrite.
+        token = lazy.cfg.token('things', list(lazy.cfg).index('things'), lazy._writer()[:2])
+        fh2 = io.StringIO()
+        lazy.write(fh2)
+        self.assertTrue(token in fh2.getvalue())
+        self.assertEqual(SecureJson(rawtxt=fh2.getvalue(), ck=self.ck).cfg['things'], sj.cfg['things'])
+
+    def test_write_unchanged_reuses_ciphertext(self):
+        import io
+        sj = SecureJson.from_key(TEST_KEYSTRING, filepath=TEST_JSON_OUTFILE)
+        fh = io.StringIO()
+        sj.write(fh)
+        self.assertEqual(fh.getvalue(), open(TEST_JSON_OUTFILE).read())
+
+        sj.cfg['accessories']['fish'] = 'tank'
+        fh = io.StringIO()
+        sj.write(fh)
+        self.assertNotEqual(fh.getvalue(), open(TEST_JSON_OUTFILE).read())
+        self.assertEqual(SecureJson(rawtxt=fh.getvalue(), ck=self.ck).get('accessories', 'fish'), 'tank')
+
+    def test_lazy_write_reencrypts_only_changed_sections(self):
+        import io
+        sj = SecureJson.from_key(TEST_KEYSTRING, filepath=TEST_JSON_OUTFILE, lazy=True)
+        fh = io.StringIO()
+        sj.write(fh)
+        before = json.loads(fh.getvalue())
+
+        lazy = SecureJson(rawtxt=fh.getvalue(), ck=self.ck)
+        lazy.get('things', '1')
+        lazy.set('accessories', 'cat', 'fedora')
+        fh = io.StringIO()
+        lazy.write(fh)
+        after = json.loads(fh.getvalue())
+
+        self.assertEqual(after['index'], before['index'])
+        changed = [a != b for (a, b) in zip(before['sections'], after['sections'])]
+        self.assertEqual(sorted(changed), [False, True])
+        self.assertEqual(SecureJson(rawtxt=fh.getvalue(), ck=self.ck).get('accessories', 'cat'), 'fedora')
+
+    def test_lazy_container_sections_bound_to_names(self):
+        import io
+        sj = SecureJson(ck=self.ck, lazy=True)
+        sj.cfg = {'tenant_a': {'password': 'a'}, 'tenant_b': {'password': 'b'}}
+        fh = io.StringIO()
+        sj.write(fh)
+        container = json.loads(fh.getvalue())
+
+        container['sections'].reverse()
+        swapped = SecureJson(rawtxt=json.dumps(container), ck=self.ck)
+        self.assertRaises(SecureConfigException, swapped.get, 'tenant_a', 'password')
+
+        container['sections'].pop()
+        self.assertRaises(SecureConfigException, SecureJson, rawtxt=json.dumps(container), ck=self.ck)
+
+        # deleting a section moves the ones after it: their tokens are rewritten.
+        lazy = SecureJson(rawtxt=fh.getvalue(), ck=self.ck, readonly=False)
+        lazy.remove_section('tenant_a')
+        fh = io.StringIO()
+        lazy.write(fh)
+        self.assertEqual(SecureJson(rawtxt=fh.getvalue(), ck=self.ck).get('tenant_b', 'password'), 'b')
+
+    def test_lazy_write_reencrypts_for_new_key(self):
+        import io
+        sj = SecureJson.from_key(TEST_KEYSTRING, filepath=TEST_JSON_OUTFILE, lazy=True)
+        fh = io.StringIO()
+        sj.write(fh)
+        lazy = SecureJson(rawtxt=fh.getvalue(), ck=self.ck, readonly=False)
+        lazy.ck = self.ck_wrong
+        fh = io.StringIO()
+        lazy.write(fh)
+        self.assertEqual(dict(SecureJson(rawtxt=fh.getvalue(), ck=self.ck_wrong).cfg), sj.cfg)
+
+    def test_write_through_multicryptkeeper_rotates_old_tokens(self):
+        import io
+        multi = MultiCryptKeeper(self.ck_wrong, self.ck)
+        old = open(TEST_JSON_OUTFILE).read()
+        for lazy in (False, True):
+            sj = SecureJson(filepath=TEST_JSON_OUTFILE, ck=self.ck, lazy=lazy)
+            fh = io.StringIO()
+            sj.write(fh)
+            loaded = SecureJson(rawtxt=fh.getvalue(), ck=multi, readonly=False)
+            fh = io.StringIO()
+            loaded.write(fh)
+            self.assertEqual(dict(SecureJson(rawtxt=fh.getvalue(), ck=self.ck_wrong).cfg), sj.cfg)
+
+        # data the primary key made is still written back as it was.
+        new = self.ck_wrong.encrypt(self.ck.decrypt(old))
+        loaded = SecureJson(rawtxt=new, ck=multi)
+        self.assertEqual(loaded._encrypt_changed(), new)
+
+    def test_lazy_container_other_entry_points(self):
+        import io, tempfile
+        sj = SecureJson.from_key(TEST_KEYSTRING, filepath=TEST_JSON_OUTFILE, lazy=True)
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as fh:
+            sj.write(fh)
+        self.assertEqual(SecureJson(filepath=path, ck=self.ck, use_mmap=True).get('accessories', 'cat'), 'hat')
+        for loaded in SecureJson.read_many([path, TEST_JSON_OUTFILE], workers=2, ck=self.ck):
+            self.assertEqual(loaded.get('accessories', 'cat'), 'hat')
+
+    def test_lazy_container_wrong_key_raises_InvalidToken(self):
+        import io
+        sj = SecureJson.from_key(TEST_KEYSTRING, filepath=TEST_JSON_OUTFILE, lazy=True)
+        fh = io.StringIO()
+        sj.write(fh)
+        self.assertRaises(InvalidToken, SecureJson, rawtxt=fh.getvalue(), ck=self.ck_wrong)
+
+    def test_write_envelope(self):
+        import io
+        ck = CryptKeeper(key=TEST_KEYSTRING, cipher='CHACHA20')
+        sj = SecureJson(filepath=TEST_JSON_OUTFILE, ck=ck, envelope=True)
+        fh = io.BytesIO()
+        sj.write(fh)
+        blob = fh.getvalue()
+        self.assertTrue(blob.startswith(b'CKAE'))
+
+        loaded = SecureJson(rawtxt=blob, ck=ck)
+        self.assertEqual(loaded.cfg, sj.cfg)
+        self.assertTrue(loaded.envelope)
+        fh = io.BytesIO()
+        loaded.write(fh)
+        self.assertEqual(fh.getvalue(), blob)
+
+    def test_write_unchanged_reencrypts_for_new_writer(self):
+        import io
+        sj = SecureJson(filepath=TEST_JSON_OUTFILE, ck=self.ck)
+        token = open(TEST_JSON_OUTFILE).read()
+        self.assertEqual(sj._encrypt_changed(), token)
+
+        sj.compress = 'zlib'
+        self.assertTrue(self.ck.decrypt_bytes(sj._encrypt_changed()).startswith(b'\0cz:zlib'))
+        sj.compress = None
+        self.assertNotEqual(sj._encrypt_changed(), token)
+
+        sj.ck = self.ck_wrong
+        fh = io.StringIO()
+        sj.write(fh)
+        self.assertEqual(SecureJson(rawtxt=fh.getvalue(), ck=self.ck_wrong).cfg, sj.cfg)
+
+        # a file in another cipher is rewritten in the CryptKeeper's own.
+        sj.ck = CryptKeeper(key=TEST_KEYSTRING, cipher='AESGCM')
+        loaded = SecureJson(rawtxt=sj._encrypt_changed(), ck=self.ck)
+        self.assertTrue(loaded._encrypt_changed().startswith('gAAAAA'))
+
+    def test_snapshot_load(self):
+        import tempfile, shutil
+        from secureconfig.snapshot import snapshot_path
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'test.json.enc')
+            shutil.copy(TEST_JSON_OUTFILE, path)
+            sj = SecureJson(filepath=path, ck=self.ck, snapshot=True)
+            self.assertTrue(os.path.exists(snapshot_path(path)))
+            self.assertEqual(SecureJson(filepath=path, ck=self.ck, snapshot=True).cfg, sj.cfg)
+
+            # a snapshot never outlives its source, nor works under another key.
+            with open(path, 'w') as fh:
+                fh.write(self.ck.encrypt(json.dumps({'new': {'x': 1}})))
+            self.assertEqual(SecureJson(filepath=path, ck=self.ck, snapshot=True).cfg, {'new': {'x': 1}})
+            self.assertRaises(InvalidToken, SecureJson, filepath=path, snapshot=True,
+                              ck=CryptKeeper(key=TEST_KEYSTRING_WRONG))
+
+            sc_path = os.path.join(tmpdir, 'test.cfg.enc')
+            with open(sc_path, 'w') as fh:
+                fh.write(self.ck.encrypt(repr({'things': {1: 'red', 2: ('blue', b'raw')}})))
+            for _ in range(2):
+                self.assertEqual(SecureConfig(filepath=sc_path, ck=self.ck, snapshot=True).cfg,
+                                 {'things': {1: 'red', 2: ('blue', b'raw')}})
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_import_is_lazy(self):
+        import subprocess, sys
+        code = ('import sys, secureconfig; print(\'secureconfig.zeromem\' in sys.modules); '
+                'secureconfig.SecureJson; secureconfig.SecureConfigParser; '
+                'print(*[mod in sys.modules for mod in (\'cryptography.fernet\', \'secureconfig.zeromem\', '
+                '\'secureconfig.serializers\', \'mmap\')])')
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(CWD))
+        out = subprocess.check_output([sys.executable, '-c', code], env=env, universal_newlines=True)
+        self.assertEqual(out.split(), ['False'] * 5)
+
 
 if __name__ == '__main__':
     create_test_json()
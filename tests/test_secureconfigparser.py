@@ -95,6 +95,13 @@ class TestSecureConfigParser(unittest.TestCase):
         self.assertTrue(result.startswith(scfg.ck.sigil))
         self.assertTrue(scfg.get(testd['section'], testd['enc']['key']) == testd['enc']['raw_val'])
 
+    def test_set_new_encrypted_option(self):
+        scfg = SecureConfigParser(ck=self.ck)
+        scfg.read(TEST_INI)
+        scfg.set(testd['section'], 'new_secret', 'sekrit', encrypt=True)
+        self.assertTrue(scfg.raw_get(testd['section'], 'new_secret').startswith(scfg.ck.sigil))
+        self.assertEqual(scfg.get(testd['section'], 'new_secret'), 'sekrit')
+
     def test_write_config_with_new_encrypted_values(self):
         # filename = 'new_encrypted_values.ini'
         path = os.path.join(CWD, TEST_INI_OUTFILE)
@@ -120,6 +127,314 @@ class TestSecureConfigParser(unittest.TestCase):
         cfg.read(path)
         assert(cfg.get(testd['section'], testd['plain']['key']) == testd['plain']['raw_val'])
 
+    def test_items_decrypted_matches_get(self):
+        scfg = SecureConfigParser(ck=self.ck)
+        scfg.read(TEST_INI)
+        scfg.set(testd['section'], testd['enc']['key'], testd['enc']['raw_val'], encrypt=True)
+
+        snapshot = scfg.items_decrypted()
+        self.assertEqual(list(snapshot.keys()), scfg.sections())
+        for key in scfg.options(testd['section']):
+            self.assertEqual(snapshot[testd['section']][key], scfg.get(testd['section'], key))
+        self.assertEqual(snapshot[testd['section']][testd['enc']['key']], testd['enc']['raw_val'])
+        self.assertEqual(scfg.decrypt_all(), snapshot)
+
+    def test_items_decrypted_single_section(self):
+        scfg = SecureConfigParser(ck=self.ck)
+        scfg.read(TEST_INI)
+        scfg.add_section('other')
+        snapshot = scfg.items_decrypted(sections=testd['section'])
+        self.assertEqual(list(snapshot.keys()), [testd['section']])
+
+    def test_cache_skips_repeat_decrypt(self):
+        scfg = SecureConfigParser(ck=self.ck, cache_size=4)
+        scfg.read(TEST_INI)
+        scfg.set(testd['section'], testd['enc']['key'], testd['enc']['raw_val'], encrypt=True)
+
+        for _ in range(3):
+            self.assertEqual(scfg.get(testd['section'], testd['enc']['key']), testd['enc']['raw_val'])
+        self.assertEqual(scfg._cache.misses, 1)
+        self.assertEqual(scfg._cache.hits, 2)
+
+    def test_cache_evicted_on_set(self):
+        scfg = SecureConfigParser(ck=self.ck, cache_size=4)
+        scfg.read(TEST_INI)
+        scfg.set(testd['section'], testd['enc']['key'], testd['enc']['raw_val'], encrypt=True)
+        scfg.get(testd['section'], testd['enc']['key'])
+        self.assertEqual(len(scfg._cache), 1)
+
+        scfg.set(testd['section'], testd['enc']['key'], 'new_password')
+        self.assertEqual(len(scfg._cache), 0)
+        self.assertEqual(scfg.get(testd['section'], testd['enc']['key']), 'new_password')
+
+    def test_cache_ttl_expires(self):
+        scfg = SecureConfigParser(ck=self.ck, cache_size=4, cache_ttl=60)
+        now = [0]
+        scfg._cache.clock = lambda: now[0]
+        scfg.read(TEST_INI)
+        scfg.set(testd['section'], testd['enc']['key'], testd['enc']['raw_val'], encrypt=True)
+        scfg.get(testd['section'], testd['enc']['key'])
+        now[0] = 61
+        scfg.get(testd['section'], testd['enc']['key'])
+        self.assertEqual(scfg._cache.misses, 2)
+
+    def test_cache_threaded(self):
+        import sys
+        import threading
+        from secureconfig.cache import DecryptCache
+        cache = DecryptCache(maxsize=2)
+        errors = []
+        self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+        sys.setswitchinterval(1e-6)
+
+        def hammer(num):
+            try:
+                for i in range(2000):
+                    key = (num + i) % 5
+                    cache.put(key, 'password%d' % key)
+                    val = cache.get(key)
+                    if val is not None and val != 'password%d' % key:
+                        errors.append(val)
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=hammer, args=(num, )) for num in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_parallel_items_decrypted(self):
+        for processes in (False, True):
+            scfg = SecureConfigParser(ck=self.ck, workers=2, processes=processes)
+            scfg.add_section('many')
+            for i in range(40):
+                scfg.raw_set('many', 'secret%d' % i, self.ck.sigil + self.ck.encrypt('value%d' % i))
+
+            snapshot = scfg.items_decrypted()
+            self.assertEqual(snapshot['many'], dict(('secret%d' % i, 'value%d' % i) for i in range(40)))
+            self.assertEqual(dict(scfg.items('many')), snapshot['many'])
+
+    def test_aread_and_adecrypt_all(self):
+        import asyncio
+
+        async def load():
+            scfg = SecureConfigParser(ck=self.ck)
+            await scfg.aread(TEST_INI)
+            return scfg, await scfg.aget(testd['section'], testd['plain']['key']), await scfg.adecrypt_all()
+
+        scfg, plainval, snapshot = asyncio.run(load())
+        self.assertEqual(plainval, testd['plain']['raw_val'])
+        self.assertEqual(snapshot, scfg.decrypt_all())
+
+    def test_set_unchanged_value_keeps_ciphertext(self):
+        scfg = SecureConfigParser(ck=self.ck)
+        scfg.read(TEST_INI)
+        scfg.set(testd['section'], testd['enc']['key'], testd['enc']['raw_val'], encrypt=True)
+        raw = scfg.raw_get(testd['section'], testd['enc']['key'])
+
+        scfg.set(testd['section'], testd['enc']['key'], testd['enc']['raw_val'])
+        self.assertEqual(scfg.raw_get(testd['section'], testd['enc']['key']), raw)
+        scfg.set(testd['section'], testd['enc']['key'], 'another_password')
+        self.assertNotEqual(scfg.raw_get(testd['section'], testd['enc']['key']), raw)
+
+    def test_set_unchanged_value_under_other_sigil_is_reencrypted(self):
+        old = CryptKeeper(key=TEST_KEYSTRING)
+        for ck in (CryptKeeper(key=TEST_KEYSTRING, cipher='AESGCM'),
+                   MultiCryptKeeper(TEST_KEYSTRING_WRONG, TEST_KEYSTRING)):
+            for set_value in (lambda scfg: scfg.set('s', 'a', 'secret'),
+                              lambda scfg: scfg.set_many([('s', 'a', 'secret')])):
+                scfg = SecureConfigParser(ck=ck)
+                scfg.add_section('s')
+                scfg.raw_set('s', 'a', old.sigil + old.encrypt('secret'))
+                set_value(scfg)
+                self.assertTrue(scfg.raw_get('s', 'a').startswith(ck.sigil))
+                self.assertEqual(scfg.get('s', 'a'), 'secret')
+
+    def test_set_many(self):
+        scfg = SecureConfigParser(ck=self.ck)
+        scfg.read(TEST_INI)
+        section, enc_key = testd['section'], testd['enc']['key']
+        scfg.set(section, enc_key, testd['enc']['raw_val'], encrypt=True)
+        raw = scfg.raw_get(section, enc_key)
+        scfg.add_section('new')
+        scfg.set_many([(section, enc_key, testd['enc']['raw_val']),
+                       ('new', 'password', 'first'),
+                       ('new', 'username', 'some_user'),
+                       ('new', 'Password', 'second')], encrypt=True)
+        # unchanged values keep their ciphertext; repeated options take the last value.
+        self.assertEqual(scfg.raw_get(section, enc_key), raw)
+        self.assertEqual(scfg.get('new', 'password'), 'second')
+        self.assertEqual(scfg.get('new', 'username'), 'some_user')
+        self.assertEqual(sorted(key for sec, key, _ in scfg.encrypted_options(['new'])), ['password', 'username'])
+
+        scfg.set_many([('new', 'plain', 'value'), ('new', 'password', 'third')])
+        self.assertEqual(scfg.raw_get('new', 'plain'), 'value')
+        self.assertTrue(scfg.is_encrypted('new', 'password'))
+        self.assertEqual(scfg.get('new', 'password'), 'third')
+
+    def test_mixed_cipher_sigils(self):
+        ck = CryptKeeper(key=TEST_KEYSTRING, cipher='AESGCM')
+        scfg = SecureConfigParser(ck=ck)
+        scfg.add_section('mixed')
+        for cipher in ('FERNET', 'AESGCM', 'CHACHA20'):
+            token = CryptKeeper(key=TEST_KEYSTRING, cipher=cipher).encrypt('secret')
+            scfg.raw_set('mixed', cipher.lower(), 'CK_%s::%s' % (cipher, token))
+        self.assertEqual(scfg.items_decrypted()['mixed'], {'fernet': 'secret', 'aesgcm': 'secret', 'chacha20': 'secret'})
+        self.assertEqual(dict(scfg.items('mixed')), scfg.items_decrypted()['mixed'])
+
+        # changed values are re-encrypted with the CryptKeeper's own cipher.
+        scfg.set('mixed', 'fernet', 'new secret')
+        self.assertTrue(scfg.raw_get('mixed', 'fernet').startswith('CK_AESGCM::'))
+        self.assertEqual(scfg.get('mixed', 'fernet'), 'new secret')
+
+        # the sigil decides the cipher.
+        scfg.raw_set('mixed', 'bogus', 'CK_CHACHA20::' + ck.encrypt('secret'))
+        self.assertRaises(InvalidToken, scfg.get, 'mixed', 'bogus')
+
+    def test_encrypted_options_index(self):
+        scfg = SecureConfigParser(ck=self.ck)
+        scfg.read(TEST_INI_OUTFILE)
+        self.assertEqual(scfg.encrypted_options(), [(testd['section'], testd['enc']['key'], 'FERNET')])
+        self.assertTrue(scfg.is_encrypted(testd['section'], testd['enc']['key']))
+        self.assertFalse(scfg.is_encrypted(testd['section'], testd['plain']['key']))
+
+        scfg.set(testd['section'], testd['plain']['key'], 'new_user', encrypt=True)
+        scfg.raw_set(testd['section'], testd['enc']['key'], 'now_plain')
+        self.assertEqual(scfg.encrypted_options(), [(testd['section'], testd['plain']['key'], 'FERNET')])
+        self.assertEqual(scfg.get(testd['section'], testd['plain']['key']), 'new_user')
+        self.assertEqual(scfg.get(testd['section'], testd['enc']['key']), 'now_plain')
+
+        scfg.remove_option(testd['section'], testd['plain']['key'])
+        self.assertEqual(scfg.encrypted_options(), [])
+
+        # encrypted defaults show through in every section.
+        scfg.raw_set('DEFAULT', 'shared', self.ck.sigil + self.ck.encrypt('shared secret'))
+        scfg.add_section('other')
+        self.assertEqual(scfg.encrypted_options('other'), [('other', 'shared', 'FERNET')])
+        self.assertEqual(scfg.get('other', 'shared'), 'shared secret')
+
+    def test_multi_ck_mixed_keys(self):
+        old_ck = CryptKeeper(key=TEST_KEYSTRING_WRONG)
+        multi = MultiCryptKeeper(self.ck, old_ck)
+        scfg = SecureConfigParser(ck=multi)
+        scfg.add_section('keys')
+        scfg.raw_set('keys', 'legacy', old_ck.sigil + old_ck.encrypt('legacy secret'))
+        scfg.raw_set('keys', 'tagged', 'CK_FERNET.%s::' % old_ck.key_id + old_ck.encrypt('tagged secret'))
+        scfg.set('keys', 'current', 'current secret', encrypt=True)
+
+        self.assertEqual(sorted(scfg.encrypted_options()), [
+            ('keys', 'current', 'FERNET.' + self.ck.key_id), ('keys', 'legacy', 'FERNET'),
+            ('keys', 'tagged', 'FERNET.' + old_ck.key_id)])
+        self.assertEqual(scfg.items_decrypted()['keys'], {
+            'legacy': 'legacy secret', 'tagged': 'tagged secret', 'current': 'current secret'})
+
+        # a keeper with only the new key reads only what the new key made.
+        scfg.ck = self.ck
+        self.assertEqual(scfg.get('keys', 'current'), 'current secret')
+        self.assertRaises(InvalidToken, scfg.get, 'keys', 'tagged')
+
+    def test_snapshot_read(self):
+        from secureconfig import instrument
+        from secureconfig.snapshot import snapshot_path
+        path = os.path.join(CWD, 'snapshot_test.ini')
+        with open(path, 'w') as fh:
+            fh.write('[DEFAULT]\nregion = eu\n[database]\nusername = some_user\n  continued\npassword = %s\n'
+                     % (self.ck.sigil + self.ck.encrypt('lame_password')))
+        for leftover in (path, snapshot_path(path)):
+            self.addCleanup(lambda leftover=leftover: os.path.exists(leftover) and os.remove(leftover))
+        events = []
+        instrument.add_observer(lambda event, duration, size: events.append(event))
+        try:
+            for _ in range(2):
+                scfg = SecureConfigParser(ck=self.ck, snapshot=True)
+                scfg.read(path)
+                self.assertEqual(scfg.items_decrypted(), {'database': {
+                    'region': 'eu', 'username': 'some_user\ncontinued', 'password': 'lame_password'}})
+        finally:
+            del instrument.observers[:]
+        self.assertEqual([e for e in events if e.startswith('snapshot')], ['snapshot.miss', 'snapshot.hit'])
+
+        # different parse options, or a changed file, don't use the old snapshot.
+        scfg = SecureConfigParser(ck=self.ck, snapshot=True, default_section='database')
+        scfg.read(path)
+        self.assertEqual(scfg.defaults()['username'], 'some_user\ncontinued')
+        with open(path, 'a') as fh:
+            fh.write('port = 3306\n')
+        scfg = SecureConfigParser(ck=self.ck, snapshot=True)
+        scfg.read(path)
+        self.assertEqual(scfg.get('database', 'port'), '3306')
+
+    def test_parallel_read_keeps_merge_order(self):
+        import configparser
+        import pathlib
+        import shutil
+        import tempfile
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        layers = []
+        for num in range(12):
+            path = os.path.join(tmpdir, 'layer%d.ini' % num)
+            with open(path, 'w') as fh:
+                fh.write('[DEFAULT]\nlevel = %d\n[common]\nowner = layer%d\n[layer%d]\nsecret = %s\n'
+                         % (num, num, num, self.ck.sigil + self.ck.encrypt('secret %d' % num)))
+            layers.append(pathlib.Path(path) if num % 2 else path)
+        filenames = layers[:6] + [os.path.join(tmpdir, 'missing.ini')] + layers[6:]
+
+        serial = SecureConfigParser(ck=self.ck)
+        read_ok = serial.read(filenames)
+        parallel = SecureConfigParser(ck=self.ck)
+        self.assertEqual(parallel.read(filenames, workers=4), read_ok)
+        self.assertEqual(read_ok, [os.fspath(path) for path in layers])
+
+        self.assertEqual(parallel.sections(), serial.sections())
+        self.assertEqual(parallel.get('common', 'owner'), 'layer11')
+        self.assertEqual(parallel.get('layer3', 'level'), '11')
+        self.assertEqual(parallel.decrypt_all(), serial.decrypt_all())
+
+        # a bad file raises as ConfigParser.read does, with the files before it merged.
+        bad = os.path.join(tmpdir, 'bad.ini')
+        with open(bad, 'w') as fh:
+            fh.write('no section header\n')
+        scfg = SecureConfigParser(ck=self.ck)
+        self.assertRaises(configparser.MissingSectionHeaderError, scfg.read, layers[:3] + [bad] + layers[3:], workers=4)
+        self.assertEqual(scfg.get('common', 'owner'), 'layer2')
+
+    def test_parallel_read_uses_parser_settings(self):
+        import collections
+        import configparser
+        import shutil
+        import tempfile
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+
+        class Marked(configparser.Interpolation):
+            def before_read(self, parser, section, option, value):
+                return value if value.startswith('<') else '<%s>' % value
+
+        paths = []
+        for num in range(4):
+            path = os.path.join(tmpdir, 'layer%d.ini' % num)
+            with open(path, 'w') as fh:
+                fh.write('[Common]\nOwner = layer%d\nurl = http://host:%d\nPct = 50%%\n'
+                         '[layer%d]\nSecret = %s\n' % (num, num, num, self.ck.sigil + self.ck.encrypt('s%d' % num)))
+            paths.append(path)
+
+        def load(**kwargs):
+            scfg = SecureConfigParser(ck=self.ck, delimiters=('=', ), dict_type=collections.OrderedDict,
+                                      interpolation=Marked())
+            scfg.optionxform = str
+            scfg.read(paths, **kwargs)
+            return scfg, dict((sec, scfg.raw_items(sec)) for sec in scfg.sections())
+
+        serial, expected = load()
+        self.assertEqual(expected['Common'], [('Owner', '<layer3>'), ('url', '<http://host:3>'), ('Pct', '<50%>')])
+        parallel, got = load(workers=3)
+        self.assertEqual(got, expected)
+        self.assertIsInstance(parallel._sections['Common'], collections.OrderedDict)
+        self.assertEqual(parallel.decrypt_all(), serial.decrypt_all())
+
     def test_wrong_ck_raises_InvalidToken(self):
         scfg = SecureConfigParser(ck=self.ck_wrong)
         scfg.read(TEST_INI_OUTFILE)
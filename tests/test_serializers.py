@@ -0,0 +1,99 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from secureconfig import SecureConfig, SecureJson
+from secureconfig import serializers
+from secureconfig.cryptkeeper import CryptKeeper
+
+TEST_KEYSTRING = 'sFbO-GbipIFIpj64S2_AZBIPBvX80Yozszw7PR2dVFg='
+
+TEST_CFG = {'database': {'username': 'some_user', 'password': 'lame_p\xe4ssword', 'port': 3306},
+            'things': {1: 'red', 2: ('blue', b'raw', None), 3: [1.5, -2 ** 70, 2 ** 64, 1j]},
+            'flags': {True: (1, 2), False: set(['x'])},
+            'empty': {}}
+
+JSON_CFG = {'database': {'username': 'some_user', 'port': 3306, 'ratio': 0.5, 'on': True, 'off': None},
+            'list': {'items': [1, 'two', [3]]}}
+
+
+class TestSerializers(unittest.TestCase):
+
+    def test_roundtrip(self):
+        for name in ('repr', 'binary'):
+            data = serializers.get(name).dumps(TEST_CFG)
+            self.assertEqual(serializers.get(name).loads(data), TEST_CFG)
+            self.assertEqual(serializers.get(name).loads(bytearray(data.encode() if name == 'repr' else data)), TEST_CFG)
+        nested = {frozenset([1, 2]): [frozenset()], 'b': bytearray(b'x')}
+        self.assertEqual(serializers.get('binary').loads(serializers.get('binary').dumps(nested)),
+                         {frozenset([1, 2]): [frozenset()], 'b': b'x'})
+        data = serializers.get('json').dumps(JSON_CFG)
+        self.assertEqual(serializers.get('json').loads(data), JSON_CFG)
+
+    def test_binary_rejects_bad_data(self):
+        data = serializers.get('binary').dumps(TEST_CFG)
+        for bad in (data[:-1], data + b'\0', b'X', b''):
+            self.assertRaises(ValueError, serializers.get('binary').loads, bad)
+        self.assertRaises(TypeError, serializers.get('binary').dumps, {'a': object()})
+
+    def test_header(self):
+        data = serializers.dumps(TEST_CFG, 'binary', 'repr')
+        self.assertTrue(data.startswith(b'\0sc:binary\n'))
+        self.assertEqual(serializers.loads(data, 'repr'), (TEST_CFG, 'binary'))
+
+        # the default format is written without a header, exactly as before.
+        self.assertEqual(serializers.dumps(TEST_CFG, 'repr', 'repr'), repr(TEST_CFG))
+        self.assertEqual(serializers.loads(repr(TEST_CFG), 'repr'), (TEST_CFG, 'repr'))
+        self.assertEqual(serializers.loads(serializers.dumps(JSON_CFG, 'json', 'repr'), 'repr'), (JSON_CFG, 'json'))
+
+        self.assertRaises(ValueError, serializers.loads, b'\0sc:nosuch\n{}', 'repr')
+
+
+class TestConfigSerializers(unittest.TestCase):
+
+    def setUp(self):
+        self.ck = CryptKeeper(key=TEST_KEYSTRING)
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+
+    def test_write_and_autodetect(self):
+        for envelope in (False, True):
+            cfg = SecureConfig(ck=self.ck, serializer='binary', envelope=envelope)
+            cfg.cfg = dict(TEST_CFG)
+            with open(self.path, 'wb' if envelope else 'w') as fh:
+                cfg.write(fh)
+
+            loaded = SecureConfig(filepath=self.path, ck=self.ck)
+            self.assertEqual(loaded.cfg, TEST_CFG)
+            self.assertEqual(loaded.serializer, 'binary')
+            self.assertEqual(SecureConfig.read_many([self.path, self.path], ck=self.ck)[1].cfg, TEST_CFG)
+            self.assertEqual(SecureConfig(filepath=self.path, ck=self.ck, use_mmap=True).cfg, TEST_CFG)
+
+            # written back in the format it was read in.
+            buf = io.BytesIO() if envelope else io.StringIO()
+            loaded.set('database', 'port', 3307)
+            loaded.write(buf)
+            self.assertEqual(SecureConfig(rawtxt=buf.getvalue(), ck=self.ck).serializer, 'binary')
+
+    def test_plaintext_and_legacy(self):
+        cfg = SecureJson(serializer='binary')
+        cfg.cfg = dict(JSON_CFG)
+        buf = io.BytesIO()
+        cfg.write(buf)
+        self.assertEqual(SecureJson(rawtxt=buf.getvalue()).cfg, JSON_CFG)
+
+        # files written before serializers existed (no header) load as they did.
+        sj = SecureJson(rawtxt=self.ck.encrypt(json.dumps(JSON_CFG)), ck=self.ck)
+        self.assertEqual((sj.cfg, sj.serializer), (JSON_CFG, 'json'))
+        sc = SecureConfig(rawtxt=self.ck.encrypt(repr(TEST_CFG)), ck=self.ck)
+        self.assertEqual((sc.cfg, sc.serializer), (TEST_CFG, 'repr'))
+        buf = io.StringIO()
+        sc.write(buf)
+        self.assertEqual(self.ck.decrypt(buf.getvalue()), repr(TEST_CFG))
+
+
+if __name__ == '__main__':
+    unittest.main()
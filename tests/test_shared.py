@@ -0,0 +1,74 @@
+import json
+import os
+import unittest
+
+from secureconfig import SecureConfigParser, SecureJson
+from secureconfig.cryptkeeper import CryptKeeper
+from secureconfig.exceptions import ReadOnlyConfigError
+from secureconfig.shared import SharedConfig
+
+TEST_KEYSTRING = 'sFbO-GbipIFIpj64S2_AZBIPBvX80Yozszw7PR2dVFg='
+
+TEST_CFG = {'database': {'username': 'some_user', 'password': 'lame_password', 'port': 3306},
+            'things': {1: 'red', 2: ('blue', b'raw')},
+            'empty': {},
+            'debug': True}
+
+
+class TestShared(unittest.TestCase):
+
+    def setUp(self):
+        self.ck = CryptKeeper(key=TEST_KEYSTRING)
+
+    def test_view(self):
+        shared = SharedConfig(TEST_CFG)
+        view = shared.view()
+        self.assertEqual(view.cfg, TEST_CFG)
+        self.assertEqual(view.sections(), list(TEST_CFG))
+        self.assertEqual(view.options('database'), ['username', 'password', 'port'])
+        self.assertEqual(view.options('empty'), [])
+        self.assertEqual(view.get('database', 'port'), 3306)
+        self.assertEqual(view.get('things', 2), ('blue', b'raw'))
+        self.assertRaises(KeyError, view.get, 'database', 'hostname')
+        self.assertRaises(KeyError, view.get, 'nowhere', 'hostname')
+        self.assertRaises(ReadOnlyConfigError, view.set, 'database', 'port', 1)
+        self.assertRaises(ReadOnlyConfigError, view.write)
+
+        shared.close()
+        self.assertRaises(ValueError, shared.view)
+
+    def test_from_configs(self):
+        scfg = SecureConfigParser(ck=self.ck)
+        scfg.add_section('database')
+        scfg.set('database', 'password', 'lame_password', encrypt=True)
+        self.assertEqual(SharedConfig.from_config(scfg).view().get('database', 'password'), 'lame_password')
+
+        sj = SecureJson(rawtxt=self.ck.encrypt(json.dumps({'a': {'x': 1}})), ck=self.ck)
+        self.assertEqual(SharedConfig.from_config(sj).view().cfg, {'a': {'x': 1}})
+
+    def test_fork(self):
+        shared = SharedConfig(TEST_CFG)
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(read_fd)
+                view = shared.view()
+                os.write(write_fd, view.get('database', 'password').encode())
+                shared.close()
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd, 'rb') as fh:
+            self.assertEqual(fh.read(), b'lame_password')
+        os.waitpid(pid, 0)
+
+        # the child's close() left the master's data alone; the master's zeroes it.
+        view = shared.view()
+        self.assertEqual(view.get('database', 'password'), 'lame_password')
+        shared.close()
+        self.assertEqual(view._buf.tobytes(), bytes(shared.size))
+
+
+if __name__ == '__main__':
+    unittest.main()
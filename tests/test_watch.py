@@ -0,0 +1,167 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from cryptography.fernet import InvalidToken
+
+from secureconfig import SecureJson
+from secureconfig.cryptkeeper import CryptKeeper
+from secureconfig.watch import ConfigWatcher, JsonWatcher
+
+TEST_KEYSTRING = 'sFbO-GbipIFIpj64S2_AZBIPBvX80Yozszw7PR2dVFg='
+TEST_KEYSTRING_WRONG = 'UCPUOddzvewGWaJxW1ZlPKftdlS9SCUjwYUYwov0bT0='
+
+
+class CountingCK(CryptKeeper):
+    """counts the tokens it decrypts."""
+
+    def __init__(self, *args, **kwargs):
+        super(CountingCK, self).__init__(*args, **kwargs)
+        self.decrypted = 0
+
+    def decrypt_bytes(self, inp, cipher=None):
+        self.decrypted += 1
+        return super(CountingCK, self).decrypt_bytes(inp, cipher)
+
+    def _decrypt_many(self, inputs, cipher=None):
+        self.decrypted += len(inputs)
+        return super(CountingCK, self)._decrypt_many(inputs, cipher)
+
+
+class TestWatch(unittest.TestCase):
+
+    def setUp(self):
+        self.ck = CountingCK(key=TEST_KEYSTRING)
+        self.tmpdir = tempfile.mkdtemp()
+        self.ini = os.path.join(self.tmpdir, 'app.ini')
+        self.local = os.path.join(self.tmpdir, 'local.ini')
+        self.write_ini(self.ini, {'DEFAULT': {'region': 'eu'},
+                                  'database': {'username': 'some_user', 'password': self.enc('pw1'),
+                                               'token': self.enc('tok1')}})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def enc(self, val):
+        return self.ck.sigil + self.ck.encrypt(val)
+
+    def write(self, path, data, mode='w'):
+        # write + rename, as rotate (and most deploy tools) do.
+        tmp = path + '.tmp'
+        with open(tmp, mode) as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+
+    def write_ini(self, path, sections):
+        self.write(path, ''.join('[%s]\n%s\n' % (sec, ''.join('%s = %s\n' % item for item in options.items()))
+                                 for sec, options in sections.items()))
+
+    def test_reload_decrypts_only_changed_values(self):
+        watcher = ConfigWatcher(self.ini, ck=self.ck)
+        self.assertEqual(watcher.snapshot, {'database': {'region': 'eu', 'username': 'some_user',
+                                                         'password': 'pw1', 'token': 'tok1'}})
+        self.assertEqual(self.ck.decrypted, 2)
+        self.assertEqual(watcher.check(), [])
+
+        seen = []
+        watcher.subscribe(lambda w, changed: seen.append((changed, w.get('database', 'password'))))
+        with open(self.ini) as fh:
+            token = [line for line in fh if line.startswith('token')][0].split(' = ')[1].strip()
+        old = watcher.snapshot
+        self.write_ini(self.ini, {'DEFAULT': {'region': 'eu'},
+                                  'database': {'username': 'some_user', 'password': self.enc('pw2'),
+                                               'token': token}})
+        self.assertEqual(watcher.check(), [('database', 'password')])
+        self.assertEqual(self.ck.decrypted, 3)
+        self.assertEqual(seen, [([('database', 'password')], 'pw2')])
+        self.assertEqual(watcher.get('database', 'token'), 'tok1')
+        # the old snapshot is untouched.
+        self.assertEqual(old['database']['password'], 'pw1')
+
+    def test_multiple_files_and_removal(self):
+        self.write_ini(self.local, {'database': {'password': self.enc('local')}})
+        watcher = ConfigWatcher([self.ini, self.local], ck=self.ck)
+        self.assertEqual(watcher.get('database', 'password'), 'local')
+
+        os.remove(self.local)
+        self.assertEqual(watcher.check(), [('database', 'password')])
+        self.assertEqual(watcher.get('database', 'password'), 'pw1')
+
+    def test_bad_file_keeps_old_snapshot(self):
+        errors = []
+        watcher = ConfigWatcher(self.ini, ck=self.ck, on_error=lambda w, path, exc: errors.append(path))
+        wrong = CryptKeeper(key=TEST_KEYSTRING_WRONG)
+        self.write_ini(self.ini, {'database': {'password': wrong.sigil + wrong.encrypt('nope')}})
+        self.assertEqual(watcher.check(), [])
+        self.assertEqual(watcher.get('database', 'password'), 'pw1')
+        self.assertEqual(errors, [self.ini])
+        self.assertTrue(isinstance(watcher.errors[self.ini], InvalidToken))
+
+        # fixed files are picked up again.
+        self.write_ini(self.ini, {'database': {'password': self.enc('pw3')}})
+        self.assertEqual(sorted(watcher.check()), [('DEFAULT', 'region'), ('database', 'password'),
+                                                    ('database', 'token'), ('database', 'username')])
+        self.assertEqual(watcher.snapshot, {'database': {'password': 'pw3'}})
+        self.assertEqual(watcher.errors, {})
+
+        self.assertRaises(InvalidToken, ConfigWatcher, self.ini, ck=wrong)
+
+    def test_json_lazy_container(self):
+        path = os.path.join(self.tmpdir, 'app.json')
+        sj = SecureJson(ck=self.ck, lazy=True, readonly=False)
+        sj.cfg = {'a': {'x': 1}, 'b': {'y': 2}}
+        fh = io.StringIO()
+        sj.write(fh)
+        self.write(path, fh.getvalue())
+
+        watcher = JsonWatcher.from_key(TEST_KEYSTRING, path)
+        watcher.ck = self.ck
+        self.assertEqual(watcher.snapshot, {'a': {'x': 1}, 'b': {'y': 2}})
+
+        container = json.loads(fh.getvalue())
+        container['sections'][1] = self.ck.encrypt(json.dumps([1, 'b', {'y': 3}]))
+        self.ck.decrypted = 0
+        self.write(path, json.dumps(container))
+        self.assertEqual(watcher.check(), ['b'])
+        self.assertEqual(self.ck.decrypted, 1)
+        self.assertEqual(watcher.get('b', 'y'), 3)
+
+        # whole-file tokens are decrypted whole, but only changed sections reported.
+        self.write(path, self.ck.encrypt(json.dumps({'a': {'x': 1}, 'b': {'y': 4}})))
+        self.assertEqual(watcher.check(), ['a', 'b'])
+        self.write(path, self.ck.encrypt(json.dumps({'a': {'x': 1}, 'b': {'y': 5}})))
+        self.assertEqual(watcher.check(), ['b'])
+
+    def test_json_compressed(self):
+        path = os.path.join(self.tmpdir, 'app.json')
+        sj = SecureJson(ck=self.ck, compress='zlib', readonly=False)
+        sj.cfg = {'a': {'x': 1}}
+        fh = io.StringIO()
+        sj.write(fh)
+        self.write(path, fh.getvalue())
+
+        watcher = JsonWatcher(path, ck=self.ck)
+        self.assertEqual(watcher.snapshot, {'a': {'x': 1}})
+        sj.set('a', 'x', 2)
+        fh = io.StringIO()
+        sj.write(fh)
+        self.write(path, fh.getvalue())
+        self.assertEqual(watcher.check(), ['a'])
+        self.assertEqual(watcher.get('a', 'x'), 2)
+
+    def test_background_thread(self):
+        for inotify in (True, False):
+            changed = threading.Event()
+            with ConfigWatcher(self.ini, ck=self.ck, interval=0.05, inotify=inotify) as watcher:
+                watcher.subscribe(lambda w, c: changed.set())
+                self.write_ini(self.ini, {'database': {'password': self.enc('pw%s' % inotify)}})
+                self.assertTrue(changed.wait(5))
+            self.assertEqual(watcher.get('database', 'password'), 'pw%s' % inotify)
+
+
+if __name__ == '__main__':
+    unittest.main()